@@ -0,0 +1,342 @@
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Optional
+from loguru import logger
+from llm import get_llm
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'affiliations.json')
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_SEGMENT_SEP = re.compile(r'[,;/|()\[\]]|\s-\s')
+_STOPWORDS = {'the', 'at'}
+# 紧跟在别名后面时说明是另一个机构，例如Zhejiang University of Technology、Apple Daily、Stanford Health Care
+_QUALIFIERS = {'of', 'at', 'for', 'in', 'and', 'university', 'institute', 'college', 'academy', 'technology', 'tech', 'county',
+               'health', 'care', 'hospital', 'medical', 'daily', 'news', 'state', 'normal', 'city', 'polytechnic'}
+_ABBREVIATIONS = {'univ': 'university', 'uni': 'university', 'inst': 'institute', 'dept': 'department', 'lab': 'laboratory', 'labs': 'laboratory'}
+
+GLOBAL_SCORER = None
+
+
+def normalize(text: str) -> str:
+    """小写、去掉重音和标点、展开常见缩写，使同一机构的不同写法得到相同的键"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower().replace('&', ' and ')
+    tokens = [_ABBREVIATIONS.get(t, t) for t in _NON_ALNUM.split(text) if t and t not in _STOPWORDS]
+    return ' '.join(tokens)
+
+
+class Institution:
+    def __init__(self, name: str, group: str, score: float):
+        self.name = name
+        self.group = group
+        self.score = score
+
+    def __repr__(self) -> str:
+        return f'Institution({self.name!r}, {self.group!r}, {self.score})'
+
+
+class AffiliationScorer:
+    """根据配置中的机构偏好表在本地给论文打分，不需要请求LLM。
+
+    配置中每组机构按偏好从高到低排列，组内的分数在max_score和min_score之间线性递减。
+    机构的名称和别名经normalize后建立索引，affiliation先按整段和逗号分隔的片段精确匹配，
+    再在片段内查找包含的别名，最后对共享关键词的别名做模糊匹配。
+    片段内包含的别名后面紧跟_QUALIFIERS中的词时不算匹配；excludes列出名称相近但不同的机构，
+    affiliation的任一片段是或包含这些名称时不匹配任何机构。
+    模糊匹配出现分数相近的多个候选时，若开启tie_breaker则请LLM选择，否则取偏好更高的一个。
+    """
+    def __init__(self, config: dict, tie_breaker: bool = False, threshold: float = 0.88, margin: float = 0.03):
+        self.tie_breaker = tie_breaker
+        self.threshold = threshold
+        self.margin = margin
+        self.missing_score = float(config.get('missing_score', 1.0))
+        self.default_score = float(config.get('default_score', 2.0))
+        self.multi_bonus = float(config.get('multi_bonus', 0.5))
+        self.aliases: dict[str, Institution] = {}
+        self.excluded: set[str] = set()
+        self._postings: dict[str, set[str]] = {}
+        for group in config['groups']:
+            entries = group['institutions']
+            high, low = float(group['max_score']), float(group['min_score'])
+            for rank, entry in enumerate(entries):
+                if isinstance(entry, str):
+                    entry = {'name': entry}
+                score = high - (high - low) * rank / max(len(entries) - 1, 1)
+                institution = Institution(entry['name'], group['name'], score)
+                for alias in [entry['name']] + entry.get('aliases', []):
+                    key = normalize(alias)
+                    # 别名冲突时保留先出现也就是偏好更高的机构
+                    if key and key not in self.aliases:
+                        self.aliases[key] = institution
+                self.excluded.update(filter(None, map(normalize, entry.get('excludes', []))))
+        self._max_alias_len = max(len(k.split()) for k in self.aliases.keys() | self.excluded)
+        for key in self.aliases:
+            for token in key.split():
+                self._postings.setdefault(token, set()).add(key)
+        # 太常见的词不能用来筛选模糊匹配的候选
+        common = max(3, len(self.aliases) // 10)
+        self._postings = {t: keys for t, keys in self._postings.items() if len(keys) <= common}
+        self.match = lru_cache(maxsize=65536)(self._match)
+        self._lock = threading.Lock()
+        self.stats = {'exact': 0, 'contained': 0, 'fuzzy': 0, 'tie_broken': 0, 'excluded': 0, 'unmatched': 0}
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'AffiliationScorer':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), **kwargs)
+
+    def _record(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _contained(self, segment: str) -> Optional[Institution]:
+        """在片段中查找作为完整词组出现、后面没有限定词的最长别名"""
+        tokens = segment.split()
+        for n in range(min(self._max_alias_len, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                institution = self.aliases.get(' '.join(tokens[i:i + n]))
+                if institution is not None and (i + n == len(tokens) or tokens[i + n] not in _QUALIFIERS):
+                    return institution
+        return None
+
+    def _is_excluded(self, segment: str) -> bool:
+        tokens = segment.split()
+        return any(' '.join(tokens[i:i + n]) in self.excluded
+                   for n in range(min(self._max_alias_len, len(tokens)), 0, -1) for i in range(len(tokens) - n + 1))
+
+    def _fuzzy(self, segment: str) -> list[tuple[float, Institution]]:
+        candidates = set()
+        for token in segment.split():
+            candidates.update(self._postings.get(token, ()))
+        best: dict[str, tuple[float, Institution]] = {}
+        for key in candidates:
+            matcher = SequenceMatcher(None, segment, key, autojunk=False)
+            if matcher.real_quick_ratio() < self.threshold or matcher.quick_ratio() < self.threshold:
+                continue
+            ratio = matcher.ratio()
+            institution = self.aliases[key]
+            if ratio >= self.threshold and ratio > best.get(institution.name, (0.0,))[0]:
+                best[institution.name] = (ratio, institution)
+        return sorted(best.values(), key=lambda x: (x[0], x[1].score), reverse=True)
+
+    def _match(self, affiliation: str) -> Optional[Institution]:
+        full = normalize(affiliation)
+        segments = [full] + [normalize(s) for s in _SEGMENT_SEP.split(affiliation)]
+        segments = [s for s in dict.fromkeys(segments) if s]
+        if self.excluded and any(map(self._is_excluded, segments)):
+            self._record('excluded')
+            return None
+        for segment in segments:
+            if segment in self.aliases:
+                self._record('exact')
+                return self.aliases[segment]
+        contained = [i for i in map(self._contained, segments) if i is not None]
+        if contained:
+            self._record('contained')
+            return max(contained, key=lambda i: i.score)
+        candidates = sorted((c for s in segments for c in self._fuzzy(s)), key=lambda x: (x[0], x[1].score), reverse=True)
+        if not candidates:
+            self._record('unmatched')
+            return None
+        close = [institution for ratio, institution in candidates if candidates[0][0] - ratio <= self.margin]
+        close = list({i.name: i for i in close}.values())
+        if len(close) > 1 and self.tie_breaker:
+            choice = self._break_tie(affiliation, close)
+            self._record('tie_broken')
+            return choice
+        self._record('fuzzy')
+        return max(close, key=lambda i: i.score)
+
+    def _break_tie(self, affiliation: str, candidates: list[Institution]) -> Optional[Institution]:
+        options = '\n'.join(f'{i + 1}. {c.name}' for i, c in enumerate(candidates))
+        try:
+            res = get_llm().generate(
+                messages=[
+                    {'role': 'system', 'content': 'You are an assistant who identifies institutions. Given an affiliation and numbered candidate institutions, return only the number of the institution the affiliation belongs to, or 0 if it belongs to none of them.'},
+                    {'role': 'user', 'content': f'Affiliation: {affiliation}\nCandidates:\n{options}'},
+                ]
+            )
+            choice = int(re.search(r'\d+', res or '').group())
+        except Exception as e:
+            logger.debug(f'Failed to break the tie of {affiliation}: {e}')
+            return max(candidates, key=lambda i: i.score)
+        return candidates[choice - 1] if 0 < choice <= len(candidates) else None
+
+    def score(self, affiliations: Optional[list[str]]) -> float:
+        """最偏好的机构决定基础分，多个偏好机构合作时加multi_bonus，结果取0.5的整数倍"""
+        if not affiliations:
+            return self.missing_score
+        matched = {i.name: i.score for i in map(self.match, affiliations) if i is not None}
+        if not matched:
+            return self.default_score
+        score = max(matched.values())
+        if len(matched) > 1:
+            score += self.multi_bonus
+        return min(5.0, round(score * 2) / 2)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"Affiliation matching of distinct strings: {s['exact']} exact, {s['contained']} contained, {s['fuzzy']} fuzzy, "
+                f"{s['tie_broken']} tie-broken by LLM, {s['excluded']} excluded, {s['unmatched']} unmatched.")
+
+
+# 常见模板中携带机构信息的宏：acmart/revtex/elsarticle的\affiliation、llncs的\institute、
+# authblk的\affil、icml的\icmlaffiliation、elsarticle/amsart的\address和IEEEtran的\IEEEauthorblockA
+_AFFILIATION_MACRO = re.compile(r'\\(affiliation|institute|affil|icmlaffiliation|address|IEEEauthorblockA)\*?(?![a-zA-Z])')
+_DEFINITION = re.compile(r'\\(?:newcommand|renewcommand|providecommand|def|let)\*?\s*\{?\s*$')
+_DROPPED_MACRO = re.compile(r'\\(?:email|url|href|texttt|orcid|orcidlink|thanks|footnote|footnotemark|inst|textsuperscript|IEEEauthorrefmark|corref|fnref)\*?(?![a-zA-Z])')
+_AND = re.compile(r'\\(?:and|And|AND)(?![a-zA-Z])')
+_ORGANIZATION = re.compile(r'organization\s*=\s*')
+_ACCENT = re.compile(r'\\[`\'"^~=.]\s*\{?([a-zA-Z])\}?')
+_COMMAND = re.compile(r'\\[a-zA-Z]+\*?')
+_MATH = re.compile(r'\$[^$]*\$')
+_MARKER_PREFIX = re.compile(r'^[\s0-9*†‡§¶#,.:;]+')
+_PART_SEP = re.compile(r'[,;\n]')
+# 顶层机构的关键词，同一条affiliation中优先取大学，其次是研究所和公司
+_TOP_LEVEL = re.compile(r'universit|\buniv\b|college|polytechn|[eé]cole|\beth\b|\bepfl\b|institute of technology', re.IGNORECASE)
+_ORGANIZATION_WORD = re.compile(r'institut|academy|laborator|\blabs?\b|research|\binc\b|corporation|\bcorp\b|\bltd\b|\bgmbh\b|\bllc\b|company|hospital|foundation|center|centre', re.IGNORECASE)
+_SUBUNIT = re.compile(r'^(?:the\s+)?(?:department|dept|school|faculty|division|college of|graduate school|key laborator|state key|center for|centre for|program|group|chair)', re.IGNORECASE)
+
+_extract_lock = threading.Lock()
+EXTRACT_STATS = {'papers': 0, 'local': 0, 'seconds': 0.0}
+
+
+def _read_group(text: str, pos: int, open_char: str = '{', close_char: str = '}') -> Optional[tuple[str, int]]:
+    """读取pos处(跳过空白)的一个括号参数，返回内容和结束位置"""
+    while pos < len(text) and text[pos] in ' \t\n':
+        pos += 1
+    if pos >= len(text) or text[pos] != open_char:
+        return None
+    depth = 0
+    escaped = False
+    for i in range(pos, len(text)):
+        c = text[i]
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == open_char:
+            depth += 1
+        elif c == close_char:
+            depth -= 1
+            if depth == 0:
+                return text[pos + 1:i], i + 1
+    return None
+
+
+def _drop_macros(text: str) -> str:
+    """删除邮箱、链接、脚注、上标等宏及其全部参数"""
+    out, pos = [], 0
+    for m in _DROPPED_MACRO.finditer(text):
+        if m.start() < pos:
+            continue
+        out.append(text[pos:m.start()])
+        pos = m.end()
+        while True:
+            group = _read_group(text, pos, '[', ']') or _read_group(text, pos)
+            if group is None:
+                break
+            pos = group[1]
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def _plain(text: str) -> str:
+    text = _MATH.sub(' ', _drop_macros(text))
+    text = _ACCENT.sub(r'\1', text.replace('\\&', '&'))
+    text = _COMMAND.sub(' ', text).replace('{', '').replace('}', '').replace('~', ' ')
+    return text
+
+
+def _top_level(unit: str) -> Optional[str]:
+    """从"院系, 学校, 城市, 国家"式的一条affiliation中选出顶层机构，找不到机构时返回None"""
+    parts = []
+    for part in _PART_SEP.split(_plain(unit)):
+        part = _MARKER_PREFIX.sub('', ' '.join(part.split())).rstrip(' .')
+        if len(part) < 2 or '@' in part or re.search(r'\d{3,}', part) or len(part) > 120:
+            continue
+        parts.append(part)
+    for keyword in (_TOP_LEVEL, _ORGANIZATION_WORD):
+        # 层级一般从小到大排列，同一级别取最后一个
+        matched = [p for p in parts if keyword.search(p) and not _SUBUNIT.match(p)]
+        if matched:
+            return matched[-1]
+    # 没有机构关键词的部分多半是城市或国家，只接受偏好表中的机构名(如OpenAI)，否则交给LLM
+    aliases = get_scorer().aliases
+    known = [p for p in parts if normalize(p) in aliases]
+    return known[-1] if known else None
+
+
+def _units(arg: str) -> list[str]:
+    if '\\institution' in arg:
+        institutions = []
+        for m in re.finditer(r'\\institution(?![a-zA-Z])', arg):
+            group = _read_group(arg, m.end())
+            if group is not None:
+                institutions.append(group[0])
+        return [', '.join(institutions)]
+    m = _ORGANIZATION.search(arg)
+    if m is not None:
+        group = _read_group(arg, m.end())
+        if group is not None:
+            return [group[0]]
+        return [arg[m.end():].split(',')[0]]
+    return _AND.split(arg)
+
+
+def _extract(front_matter: str) -> list[str]:
+    affiliations = {}
+    for m in _AFFILIATION_MACRO.finditer(front_matter):
+        if _DEFINITION.search(front_matter, max(0, m.start() - 20), m.start()):
+            continue
+        pos = m.end()
+        optional = _read_group(front_matter, pos, '[', ']')
+        if optional is not None:
+            pos = optional[1]
+        group = _read_group(front_matter, pos)
+        if group is not None and m.group(1) == 'icmlaffiliation':
+            group = _read_group(front_matter, group[1])
+        if group is None:
+            continue
+        for unit in _units(group[0]):
+            affiliation = _top_level(unit)
+            if affiliation is not None:
+                affiliations.setdefault(affiliation.lower(), affiliation)
+    return list(affiliations.values())
+
+
+def extract_affiliations(front_matter: str) -> Optional[list[str]]:
+    """从常见模板的结构化宏中提取顶层机构，按出现顺序去重，找不到时返回None"""
+    start = time.perf_counter()
+    affiliations = _extract(front_matter)
+    with _extract_lock:
+        EXTRACT_STATS['papers'] += 1
+        EXTRACT_STATS['local'] += bool(affiliations)
+        EXTRACT_STATS['seconds'] += time.perf_counter() - start
+    return affiliations or None
+
+
+def extract_summary() -> str:
+    s = EXTRACT_STATS
+    coverage = s['local'] / s['papers'] if s['papers'] else 0.0
+    latency = s['seconds'] / s['papers'] * 1e6 if s['papers'] else 0.0
+    return (f"Affiliation extraction: {s['local']}/{s['papers']} papers ({coverage:.0%}) resolved from LaTeX macros "
+            f"in {latency:.0f}us per paper, the rest sent to the LLM.")
+
+
+def set_global_scorer(config_path: str = DEFAULT_CONFIG, tie_breaker: bool = False):
+    global GLOBAL_SCORER
+    GLOBAL_SCORER = AffiliationScorer.from_file(config_path, tie_breaker=tie_breaker)
+
+
+def get_scorer() -> AffiliationScorer:
+    # 打分不依赖任何凭据，未显式初始化时使用默认的偏好表
+    if GLOBAL_SCORER is None:
+        set_global_scorer()
+    return GLOBAL_SCORER
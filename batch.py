@@ -0,0 +1,111 @@
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+from tqdm import tqdm
+from loguru import logger
+from llm import get_llm
+from paper import ArxivPaper
+from structured import parse_dict
+from prompt import truncate, record
+
+BATCH_SYSTEM_PROMPT = """You are an assistant who extracts the affiliations of the authors of several papers from their author information in latex format.
+For each paper, extract the affiliations in author order. If an affiliation consists of multi-level affiliations, like 'Department of Computer Science, TsingHua University', keep the top-level affiliation 'TsingHua University' only. Do not contain duplicated affiliations, and use an empty list if no affiliation is found.
+
+Respond with a JSON object keyed by paper id, i.e., {"<paper id>": ["TsingHua University", "Peking University"]}. Include every paper id given by the user. Only return the JSON object."""
+
+# 单篇论文的作者信息最多保留的token数
+MAX_REGION_TOKENS = 1000
+
+
+def _pack(papers: list[ArxivPaper], counts: dict[str, int], max_batch_size: int, token_budget: int) -> list[list[ArxivPaper]]:
+    """按token预算贪心地把论文装进批次，超出预算或数量上限时另起一批"""
+    batches, current, used = [], [], 0
+    for paper in papers:
+        n = counts[paper.arxiv_id]
+        if current and (len(current) >= max_batch_size or used + n > token_budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(paper)
+        used += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_entry(entry) -> Optional[list[str]]:
+    if isinstance(entry, dict):
+        entry = entry.get('affiliations')
+    if not isinstance(entry, list):
+        return None
+    return list(set(str(a) for a in entry))
+
+
+def _run_batch(batch: list[ArxivPaper], regions: dict[str, str], counts: dict[str, int]) -> list[ArxivPaper]:
+    """处理一个批次，返回需要逐篇回退处理的论文"""
+    record('batch_affiliation', sum(counts[p.arxiv_id] for p in batch))
+    prompt = '\n\n'.join(f"### {p.arxiv_id}\n{regions[p.arxiv_id]}" for p in batch)
+    res = get_llm().generate(
+        messages=[
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        json_object=True,
+    )
+    results = parse_dict(res) or {}
+    fallback = []
+    for paper in batch:
+        parsed = _parse_entry(results.get(paper.arxiv_id))
+        if parsed is None:
+            fallback.append(paper)
+            continue
+        paper.affiliations = parsed if len(parsed) > 0 else None
+        paper.score = paper.get_score()
+    return fallback
+
+
+def _generate_one(paper: ArxivPaper):
+    paper.affiliations = paper.get_llm_affiliations()
+    paper.score = paper.get_score()
+
+
+def generate_base_properties_batched(papers: list[ArxivPaper], max_batch_size: int = 8, token_budget: int = 6000, max_workers: int = 5, progress: bool = True):
+    """把多篇论文的作者信息装进同一个请求，一次完成affiliations抽取，打分在本地进行。
+
+    能从LaTeX宏中直接提取affiliations的论文不进入批次，无法从批次结果中解析出的论文回退到逐篇请求。
+    """
+    log = logger.info if progress else logger.debug
+    regions, counts, batchable = {}, {}, []
+    for paper in papers:
+        affiliations = paper.get_local_affiliations()
+        if affiliations is not None:
+            paper.affiliations = affiliations
+            paper.score = paper.get_score()
+            continue
+        region = paper.index.author_region if paper.index is not None else None
+        if region is None:
+            paper.affiliations = None
+            paper.score = paper.get_score()
+            continue
+        regions[paper.arxiv_id], counts[paper.arxiv_id] = truncate(region, MAX_REGION_TOKENS)
+        batchable.append(paper)
+
+    batches = _pack(batchable, counts, max_batch_size, token_budget)
+    fallback = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_run_batch, batch, regions, counts): batch for batch in batches}
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Generating paper properties in batches", disable=not progress):
+            try:
+                fallback.extend(future.result())
+            except Exception as e:
+                logger.error(f"Error generating properties for a batch: {e}")
+                fallback.extend(futures[future])
+    if fallback:
+        log(f"{len(fallback)}/{len(batchable)} papers fall back to per-paper requests.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_generate_one, paper): paper for paper in fallback}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Error generating properties for {futures[future]}: {e}")
+    log(f"Generated base properties of {len(batchable)} papers with {len(batches)} batched requests.")
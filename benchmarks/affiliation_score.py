@@ -0,0 +1,48 @@
+"""Microseconds per paper of local affiliation scoring, cold (every string new) and warm (strings seen before).
+
+Usage: python benchmarks/affiliation_score.py --papers 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from affiliation import AffiliationScorer, DEFAULT_CONFIG
+
+SAMPLES = [
+    'Department of Computer Science, Carnegie Mellon University, Pittsburgh, PA',
+    'School of EECS, Peking University, Beijing, China',
+    'Tsinghua Univ.',
+    'Google DeepMind',
+    'Meta AI',
+    'Universty of Washington',
+    'Massachusetts Institue of Technology',
+    'Institute of Automation, Chinese Academy of Sciences',
+    'Microsoft Research Asia',
+    'University of Oxford',
+    'Washington University in St. Louis',
+    'Technical University of Munich',
+    'Lab {i}, Institute {i} of Advanced Studies',
+]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=10000)
+    parser.add_argument('--per_paper', type=int, default=4, help='Affiliations per paper')
+    parser.add_argument('--config', type=str, default=DEFAULT_CONFIG)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    papers = [[rng.choice(SAMPLES).format(i=i) + f' {i}' for _ in range(args.per_paper)] for i in range(args.papers)]
+    start = time.perf_counter()
+    scorer = AffiliationScorer.from_file(args.config)
+    print(f'index of {len(scorer.aliases)} aliases built in {(time.perf_counter() - start) * 1000:.1f}ms')
+    for name in ('cold', 'warm'):
+        start = time.perf_counter()
+        scores = [scorer.score(p) for p in papers]
+        elapsed = time.perf_counter() - start
+        print(f'{name:<5s} {elapsed / args.papers * 1e6:8.1f}us/paper, mean score {sum(scores) / len(scores):.2f}')
+    print(scorer.summary())
@@ -0,0 +1,95 @@
+"""Wall-clock time of resolving code links for the selected papers: the old per-paper lookup inside rendering vs
+the pooled resolver, cold and with a warm disk cache.
+
+A local stand-in serves the paperswithcode API with injected latency; a third of the papers have code.
+
+Usage: python benchmarks/code_links.py --papers 100 --latency 0.2
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from code_links import CodeLinkResolver
+
+
+def serve(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            m = re.search(r'arxiv_id=2501\.(\d+)', self.path)
+            if m is not None:
+                found = int(m.group(1)) % 3 == 0
+                body = {'count': 1, 'results': [{'id': f'paper-{m.group(1)}'}]} if found else {'count': 0, 'results': []}
+            else:
+                paper_id = re.search(r'/papers/([^/]+)/repositories', self.path).group(1)
+                body = {'count': 1, 'results': [{'url': f'https://github.com/example/{paper_id}'}]}
+            out = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy(api_base: str, arxiv_id: str) -> Optional[str]:
+    """原来的ArxivPaper.code_url: 每篇论文新建一个Session"""
+    s = requests.Session()
+    retries = Retry(total=5, backoff_factor=0.1)
+    s.mount('http://', HTTPAdapter(max_retries=retries))
+    paper_list = s.get(f'{api_base}/papers/?arxiv_id={arxiv_id}').json()
+    if paper_list.get('count', 0) == 0:
+        return None
+    repo_list = s.get(f"{api_base}/papers/{paper_list['results'][0]['id']}/repositories/").json()
+    if repo_list.get('count', 0) == 0:
+        return None
+    return repo_list['results'][0]['url']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    server = serve(args.latency)
+    api_base = f'http://127.0.0.1:{server.server_address[1]}'
+    ids = [f'2501.{i:05d}' for i in range(args.papers)]
+    print(f'{args.papers} papers, {args.latency}s per API request')
+
+    # 原来在渲染时由5个线程查询
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        expected = list(executor.map(lambda i: legacy(api_base, i), ids))
+    print(f'legacy   {time.perf_counter() - start:6.2f}s')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('cold', 'warm'):
+            resolver = CodeLinkResolver(os.path.join(tmp, 'code_links.sqlite'), max_workers=args.workers, api_base=api_base)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                urls = list(executor.map(resolver.resolve, ids))
+            print(f'{name:<8s} {time.perf_counter() - start:6.2f}s  same links: {urls == expected}  {resolver.summary()}')
+            resolver.close()
+    server.shutdown()
@@ -0,0 +1,111 @@
+"""Time to first paper and to all papers when building papers from the RSS feed vs re-querying the arXiv API.
+
+A local stand-in serves the arXiv API with injected latency. The client keeps the production pacing (the arxiv
+library waits --delay seconds between two API pages). --missing is the fraction of feed entries without a version
+number, which still need the API.
+
+Usage: python benchmarks/feed_metadata.py --papers 300 --delay 10
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arxiv
+from loguru import logger
+from main import iter_api_papers, iter_feed_papers
+
+API_ENTRY = """<entry>
+<id>http://arxiv.org/abs/{id}v1</id><updated>2025-01-02T00:00:00Z</updated><published>2025-01-02T00:00:00Z</published>
+<title>Paper {id}</title><summary>{abstract}</summary>
+<author><name>Author A</name></author><author><name>Author B</name></author>
+<link href="http://arxiv.org/abs/{id}v1" rel="alternate" type="text/html"/>
+<link title="pdf" href="http://arxiv.org/pdf/{id}v1" rel="related" type="application/pdf"/>
+<arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.AI" scheme="http://arxiv.org/schemas/atom"/>
+<category term="cs.AI" scheme="http://arxiv.org/schemas/atom"/>
+</entry>"""
+API_FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">
+<title>arXiv Query</title><opensearch:totalResults>{total}</opensearch:totalResults>
+<opensearch:startIndex>{start}</opensearch:startIndex><opensearch:itemsPerPage>{size}</opensearch:itemsPerPage>
+{entries}
+</feed>"""
+
+
+def serve(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            query = parse_qs(urlparse(self.path).query)
+            ids = [i for i in query.get('id_list', [''])[0].split(',') if i]
+            start = int(query.get('start', ['0'])[0])
+            size = int(query.get('max_results', ['100'])[0])
+            page = ids[start:start + size]
+            entries = '\n'.join(API_ENTRY.format(id=i.split('v')[0], abstract=escape('We study things. ' * 60)) for i in page)
+            body = API_FEED.format(total=len(ids), start=start, size=len(page), entries=entries).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def feed_entries(n: int, missing: float, rng: random.Random) -> list[dict]:
+    entries = []
+    for i in range(n):
+        short_id = f'2501.{i:05d}'
+        # 没有版本号的条目无法确定源码缓存的键，需要请求API
+        versioned = short_id if rng.random() < missing else f'{short_id}v1'
+        entries.append({
+            'id': f'oai:arXiv.org:{versioned}',
+            'title': f'Paper {short_id}',
+            'summary': f'arXiv:{versioned} Announce Type: new \nAbstract: ' + 'We study things. ' * 60,
+            'authors': [{'name': 'Author A, Author B'}],
+            'tags': [{'term': 'cs.AI'}],
+        })
+    return entries
+
+
+def measure(papers) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in papers:
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return first or 0.0, time.perf_counter() - start, count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=300)
+    parser.add_argument('--missing', type=float, default=0.0, help='Fraction of feed entries without complete metadata')
+    parser.add_argument('--delay', type=float, default=10.0, help='Seconds between two API pages, as configured in main.py')
+    parser.add_argument('--latency', type=float, default=1.0, help='Latency of one API request')
+    args = parser.parse_args()
+    logger.remove()
+
+    server = serve(args.latency)
+    entries = feed_entries(args.papers, args.missing, random.Random(0))
+    ids = [e['id'].removeprefix('oai:arXiv.org:') for e in entries]
+    print(f'{args.papers} papers, {args.missing:.0%} with incomplete feed metadata, {args.delay}s between API pages, {args.latency}s per API request')
+    for name, make in (('api', lambda c: iter_api_papers(c, ids)), ('feed', lambda c: iter_feed_papers(c, entries))):
+        client = arxiv.Client(num_retries=10, delay_seconds=args.delay)
+        client.query_url_format = f'http://127.0.0.1:{server.server_address[1]}/api/query?{{}}'
+        first, total, count = measure(make(client))
+        print(f'{name:<5s} first paper {first:7.3f}s, all papers {total:7.2f}s, {count} papers')
+    server.shutdown()
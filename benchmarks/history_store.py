@@ -0,0 +1,86 @@
+"""Storage and query cost of keeping every day's recommendations: the columnar history store vs keeping the
+rendered HTML pages and scanning them.
+
+--days days of --papers synthetic papers are appended one day at a time, as the daily runs would. The same
+query (the last 30 days with score >= 3 and a topic substring) then runs on both.
+
+Usage: python benchmarks/history_store.py --days 1000 --papers 50
+"""
+import argparse
+import datetime
+import html
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from construct_email import render_email
+from history import HistoryStore
+from render_email import make_paper
+
+_BLOCK = re.compile(r'<div class="paper-title">(.*?)</div>.*?<div class="paper-tag"><strong>Tag:</strong> (.*?)</div>\s*'
+                    r'<div class="paper-score"><strong>Score:</strong> (.*?)</div>', re.DOTALL)
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def scan_html(archive: str, start: datetime.date, min_score: float, topic: str) -> list[str]:
+    """没有结构化存储时，只能读取每天的HTML，从星级中数出分数"""
+    titles = []
+    for name in sorted(os.listdir(archive)):
+        if datetime.date.fromisoformat(name.removesuffix('.html')) < start:
+            continue
+        with open(os.path.join(archive, name), encoding='utf-8') as f:
+            for title, tag, stars in _BLOCK.findall(f.read()):
+                score = stars.count('full-star') + 0.5 * stars.count('half-star')
+                if score >= min_score and topic in html.unescape(tag).lower():
+                    titles.append(html.unescape(title))
+    return titles
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--papers', type=int, default=50)
+    args = parser.parse_args()
+    logger.remove()
+
+    rng = random.Random(0)
+    first = datetime.date(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, 'archive')
+        os.makedirs(archive)
+        store = HistoryStore(os.path.join(tmp, 'history.lance'))
+        append = 0.0
+        for d in range(args.days):
+            day = first + datetime.timedelta(days=d)
+            papers = [make_paper(rng, d * args.papers + i) for i in range(args.papers)]
+            with open(os.path.join(archive, f'{day.isoformat()}.html'), 'w', encoding='utf-8') as f:
+                f.write(render_email(papers))
+            start = time.perf_counter()
+            store.append(papers, day=day)
+            append += time.perf_counter() - start
+        # 重复运行同一天不会产生重复的记录
+        store.append(papers, day=day)
+        total = args.days * args.papers
+        print(f'{args.days} days x {args.papers} papers, {append / args.days * 1000:.1f}ms per daily append')
+        print(f'html archive   {directory_size(archive) / 2 ** 20:8.1f}MB')
+        print(f'history store  {directory_size(store.path) / 2 ** 20:8.1f}MB  {store.scan(columns=["id"]).num_rows} rows (expected {total})')
+
+        since = day - datetime.timedelta(days=29)
+        start = time.perf_counter()
+        expected = scan_html(archive, since, 3.0, 'model')
+        print(f'query html     {(time.perf_counter() - start) * 1000:8.1f}ms  {len(expected)} papers')
+        start = time.perf_counter()
+        table = store.scan(start=since, min_score=3.0, topic='Model', columns=['title'])
+        print(f'query store    {(time.perf_counter() - start) * 1000:8.1f}ms  {table.num_rows} papers, same titles: {sorted(table.column("title").to_pylist()) == sorted(expected)}')
+        start = time.perf_counter()
+        table = store.scan(min_score=4.5, topic='attention', columns=['id', 'date'])
+        print(f'all-time query {(time.perf_counter() - start) * 1000:8.1f}ms  {table.num_rows} papers with score >= 4.5 about attention')
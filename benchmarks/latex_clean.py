@@ -0,0 +1,84 @@
+"""Throughput (MB/s) of latex.clean_tex against the previous chain of re.sub passes.
+
+Usage:
+    python benchmarks/latex_clean.py --corpus path/to/tex/files
+    python benchmarks/latex_clean.py --ids 1706.03762 2005.14165
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from latex import clean_tex
+from source_reader import read_source
+
+
+def legacy_clean(content: str) -> str:
+    # fetch_tex中逐文件的清洗
+    content = re.sub(r'%.*\n', '\n', content)
+    content = re.sub(r'\\begin{comment}.*?\\end{comment}', '', content, flags=re.DOTALL)
+    content = re.sub(r'\\iffalse.*?\\fi', '', content, flags=re.DOTALL)
+    content = re.sub(r'\n+', '\n', content)
+    content = re.sub(r'\\\\', '', content)
+    content = re.sub(r'[ \t\r\f]{3,}', ' ', content)
+    # post_init中对全文的清洗
+    content = re.sub(r'~?\\cite.?\{.*?\}', '', content)
+    content = re.sub(r'\\begin\{figure\}.*?\\end\{figure\}', '', content, flags=re.DOTALL)
+    content = re.sub(r'\\begin\{table\}.*?\\end\{table\}', '', content, flags=re.DOTALL)
+    return content
+
+
+def load_corpus(corpus: str) -> list[str]:
+    texts = []
+    for root, _, files in os.walk(corpus):
+        for name in files:
+            if name.endswith('.tex'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    texts.append(f.read().decode('utf-8', errors='ignore'))
+    return texts
+
+
+def download_corpus(ids: list[str]) -> list[str]:
+    texts = []
+    for arxiv_id in ids:
+        with requests.get(f'https://export.arxiv.org/src/{arxiv_id}', stream=True, timeout=60) as response:
+            response.raise_for_status()
+            members = read_source(response.iter_content(chunk_size=1 << 16)) or {}
+        texts.extend(v.decode('utf-8', errors='ignore') for k, v in members.items() if k.endswith('.tex'))
+    return texts
+
+
+def measure(fn, texts: list[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', type=str, help='Directory containing .tex files')
+    parser.add_argument('--ids', type=str, nargs='+', help='arXiv ids whose sources are downloaded as the corpus')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    if args.corpus:
+        texts = load_corpus(args.corpus)
+    elif args.ids:
+        texts = download_corpus(args.ids)
+    else:
+        parser.error('one of --corpus or --ids is required')
+
+    size_mb = sum(len(t.encode('utf-8')) for t in texts) / 1024 / 1024
+    # clean_tex保留转义的\%并合并被删除环境留下的空行，因此输出与旧实现不必逐字相同
+    same = sum(legacy_clean(t) == clean_tex(t) for t in texts)
+    print(f'{len(texts)} tex files, {size_mb:.2f} MB, byte-identical output for {same}/{len(texts)} files')
+    for name, fn in [('legacy re.sub chain', legacy_clean), ('clean_tex', clean_tex)]:
+        elapsed = measure(fn, texts, args.repeat)
+        print(f'{name:<20s} {elapsed * 1000:8.1f} ms {size_mb / elapsed:8.1f} MB/s')
@@ -0,0 +1,95 @@
+"""Requests per paper and wall-clock time of batched vs per-paper affiliation extraction.
+
+A local stand-in for the chat completions API answers with fixed affiliations after an injected latency.
+
+Usage: python benchmarks/llm_batching.py --papers 200 --latency 0.5
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arxiv
+from loguru import logger
+from latex import TexIndex
+from llm import set_global_llm
+from paper import ArxivPaper
+from batch import generate_base_properties_batched
+
+
+def serve(latency: float, per_kchar: float) -> tuple[ThreadingHTTPServer, itertools.count]:
+    requests = itertools.count()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            next(requests)
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            system, user = body['messages'][0]['content'], body['messages'][-1]['content']
+            time.sleep(latency + per_kchar * (len(system) + len(user)) / 1000)
+            if 'keyed by paper id' in system:
+                ids = re.findall(r'^### (\S+)$', user, flags=re.MULTILINE)
+                content = json.dumps({i: ['Peking University'] for i in ids})
+            else:
+                content = "['Peking University']"
+            out = json.dumps({'choices': [{'message': {'content': content}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, requests
+
+
+def make_papers(n: int) -> list[ArxivPaper]:
+    papers = []
+    for i in range(n):
+        paper = ArxivPaper(arxiv.Result(entry_id=f'http://arxiv.org/abs/2501.{i:05d}v1'))
+        # NeurIPS风格的作者信息没有结构化的机构宏，必须交给LLM抽取
+        authors = ' \\And '.join(f'Author {j} \\\\ School of EECS, Peking University \\\\ Beijing, China' for j in range(6))
+        paper.index = TexIndex(f'\\begin{{document}}\n\\author{{{authors}}}\n\\maketitle\n\\section{{Introduction}}\ntext\n\\end{{document}}')
+        papers.append(paper)
+    return papers
+
+
+def per_paper(papers: list[ArxivPaper], workers: int):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda p: p.generate_base_properties(), papers))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5, help='Injected base latency per request in seconds')
+    parser.add_argument('--per_kchar', type=float, default=0.02, help='Injected latency per 1000 prompt characters in seconds')
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[4, 8, 16])
+    args = parser.parse_args()
+    logger.remove()
+
+    server, counter = serve(args.latency, args.per_kchar)
+    set_global_llm(api_key='benchmark', base_url=f'http://127.0.0.1:{server.server_address[1]}', model='benchmark', concurrency=args.concurrency)
+    modes = [('per-paper', lambda papers: per_paper(papers, args.concurrency))]
+    modes += [(f'batch={b}', lambda papers, b=b: generate_base_properties_batched(papers, max_batch_size=b, max_workers=args.concurrency)) for b in args.batch_sizes]
+    print(f'{args.papers} papers, {args.latency}s + {args.per_kchar}s/kchar injected latency, concurrency {args.concurrency}')
+    for name, fn in modes:
+        papers = make_papers(args.papers)
+        before = next(counter)
+        start = time.perf_counter()
+        fn(papers)
+        elapsed = time.perf_counter() - start
+        sent = next(counter) - before - 1
+        print(f'{name:<10s} requests/paper={sent / args.papers:5.2f} wall={elapsed:7.2f}s')
+    server.shutdown()
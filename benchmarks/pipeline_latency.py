@@ -0,0 +1,145 @@
+"""End-to-end wall-clock time of the streaming pipeline vs the old barrier-separated phases.
+
+Local stand-ins serve the paper sources and the chat completions API with injected latency, and papers arrive
+from a fake arXiv API in pages of 50 with a delay between pages. Half of the papers carry structured affiliation
+macros, the other half need the LLM.
+
+Usage: python benchmarks/pipeline_latency.py --papers 200 --top 50
+"""
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arxiv
+from loguru import logger
+from paper import ArxivPaper
+from llm import set_global_llm
+from source import SourceFetcher
+from batch import generate_base_properties_batched
+from construct_email import process_paper
+from pipeline import Pipeline, TopK
+from main import build_stages
+
+AUTHORS = [
+    '\\author{A}\\affiliation{\\institution{Peking University}\\country{China}}',
+    '\\author{A \\\\ Department of CS \\\\ Stanford University \\And B \\\\ University of Oxford}',
+]
+
+
+def make_source(i: int) -> bytes:
+    tex = (f'\\documentclass{{article}}\n\\begin{{document}}\n{AUTHORS[i % 2]}\n\\maketitle\n'
+           f'\\section{{Introduction}}\n{"Paper {i} introduces a method. " * 200}\n'
+           f'\\section{{Conclusion}}\nIt works.\n\\end{{document}}\n').encode()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        info = tarfile.TarInfo('main.tex')
+        info.size = len(tex)
+        tar.addfile(info, io.BytesIO(tex))
+    return buffer.getvalue()
+
+
+def serve(source_latency: float, llm_latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(source_latency)
+            body = make_source(int(re.search(r'2501\.(\d+)', self.path).group(1)))
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            system, user = body['messages'][0]['content'], body['messages'][-1]['content']
+            time.sleep(llm_latency)
+            if 'keyed by paper id' in system:
+                content = json.dumps({i: ['Stanford University'] for i in re.findall(r'^### (\S+)$', user, flags=re.MULTILINE)})
+            elif 'summarizes' in system:
+                content = json.dumps({'tldr': '一句话总结', 'topic': 'Benchmark'})
+            else:
+                content = "['Stanford University']"
+            out = json.dumps({'choices': [{'message': {'content': content}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def iter_papers(n: int, port: int, page_delay: float):
+    for i in range(n):
+        if i and i % 50 == 0:
+            time.sleep(page_delay)
+        short_id = f'2501.{i:05d}v1'
+        link = arxiv.Result.Link(f'http://127.0.0.1:{port}/pdf/{short_id}', title='pdf')
+        yield ArxivPaper(arxiv.Result(entry_id=f'http://arxiv.org/abs/{short_id}', title=f'Paper {i}', summary='Abstract.', links=[link]))
+
+
+def phased(args, fetcher: SourceFetcher, papers) -> list[ArxivPaper]:
+    papers = list(papers)
+    fetcher.fetch_all(papers)
+    generate_base_properties_batched(papers, max_batch_size=args.llm_batch_size, token_budget=args.llm_batch_tokens, max_workers=args.llm_concurrency, progress=False)
+    papers.sort(key=lambda x: x.score, reverse=True)
+    papers = papers[:args.max_paper_num]
+    with ThreadPoolExecutor(max_workers=args.llm_concurrency) as executor:
+        list(executor.map(lambda p: p.generate_extended_property(), papers))
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        list(executor.map(process_paper, papers))
+    return papers
+
+
+def streaming(args, fetcher: SourceFetcher, papers) -> list[ArxivPaper]:
+    order = {}
+    topk = TopK(args.max_paper_num, key=lambda p: (p.score, -order[p.arxiv_id]))
+
+    def source():
+        for i, paper in enumerate(papers):
+            order[paper.arxiv_id] = i
+            yield paper
+
+    Pipeline(build_stages(args, fetcher, topk, {})).run(source())
+    return topk.results()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=200)
+    parser.add_argument('--top', type=int, default=50)
+    parser.add_argument('--page_delay', type=float, default=1.0, help='Delay between two pages of 50 papers from the arXiv API')
+    parser.add_argument('--source_latency', type=float, default=0.3)
+    parser.add_argument('--llm_latency', type=float, default=0.5)
+    args = parser.parse_args()
+    logger.remove()
+
+    server = serve(args.source_latency, args.llm_latency)
+    port = server.server_address[1]
+    config = SimpleNamespace(download_workers=8, llm_concurrency=5, llm_batch_size=8, llm_batch_tokens=6000, max_paper_num=args.top)
+    set_global_llm(api_key='benchmark', base_url=f'http://127.0.0.1:{port}', model='benchmark', concurrency=config.llm_concurrency)
+    print(f'{args.papers} papers, top {args.top}, {args.page_delay}s between API pages, {args.source_latency}s per source, {args.llm_latency}s per LLM request')
+    selected = {}
+    for name, fn in (('phased', phased), ('streaming', streaming)):
+        fetcher = SourceFetcher(max_workers=config.download_workers, max_per_host=8, download_domain=None)
+        start = time.perf_counter()
+        papers = fn(config, fetcher, iter_papers(args.papers, port, args.page_delay))
+        elapsed = time.perf_counter() - start
+        selected[name] = [p.arxiv_id for p in papers]
+        print(f'{name:<10s} wall={elapsed:7.2f}s selected={len(papers)}')
+    print(f"same selection and order: {selected['phased'] == selected['streaming']}")
+    server.shutdown()
@@ -0,0 +1,103 @@
+"""Per-paper work of serving several users: one run per profile (the only option before) vs one shared
+multi-profile run.
+
+A synthetic daily feed spreads papers over a few categories, with cross-lists. Each profile asks for a different
+overlapping set of categories and uses its own preference list. The entries are routed and ranked with the real
+ProfileSet. The work is counted as source downloads plus affiliation requests (one per processed paper) and TLDR
+requests (one per paper in a top-K), and turned into a modelled run time.
+
+Usage: python benchmarks/profiles.py --profiles 8 --papers 600 --max_paper_num 30
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from affiliation import DEFAULT_CONFIG
+from profiles import ProfileSet
+
+CATEGORIES = ['cs.AI', 'cs.CL', 'cs.CV', 'cs.LG', 'cs.RO', 'stat.ML']
+
+
+def make_feed(rng: random.Random, n: int) -> list[dict]:
+    feed = []
+    for i in range(n):
+        categories = rng.sample(CATEGORIES, rng.choice([1, 1, 2, 3]))
+        feed.append({'id': f'oai:arXiv.org:2501.{i:05d}v1', 'title': f'Paper {i}', 'summary': 'Abstract.',
+                     'arxiv_announce_type': 'new', 'tags': [{'term': c} for c in categories]})
+    return feed
+
+
+def make_configs(rng: random.Random, tmp: str, n: int) -> list[dict]:
+    with open(DEFAULT_CONFIG, encoding='utf-8') as f:
+        config = json.load(f)
+    configs = []
+    for i in range(n):
+        # 每个用户的偏好表是默认偏好表打乱组内顺序得到的
+        for group in config['groups']:
+            rng.shuffle(group['institutions'])
+        path = os.path.join(tmp, f'affiliations{i}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+        configs.append({'name': f'user{i}', 'receiver': f'user{i}@example.com', 'affiliation_config': path,
+                        'arxiv_query': '+'.join(rng.sample(CATEGORIES, rng.randint(1, 3)))})
+    return configs
+
+
+def run(configs: list[dict], args, feed: list[dict], affiliations: dict[str, list[str]]) -> tuple[int, int, ProfileSet]:
+    """返回(处理的论文数, 生成TLDR的论文数)"""
+    order = {}
+    profiles = ProfileSet.from_config(configs, args, order)
+    query = set(profiles.query.split('+'))
+    # 与RSS一样，只返回合并后的查询覆盖的条目
+    entries = [e for e in feed if any(t['term'] in query for t in e['tags'])]
+    selected = profiles.select(entries, lambda e: SimpleNamespace(categories=[t['term'] for t in e['tags']]))
+    for i, entry in enumerate(selected):
+        paper = SimpleNamespace(arxiv_id=entry['id'].removeprefix('oai:arXiv.org:')[:-2], affiliations=affiliations[entry['id']])
+        order[paper.arxiv_id] = i
+        profiles.offer(paper)
+    tldr = {p.arxiv_id for profile in profiles.profiles for p in profile.results()}
+    return len(selected), len(tldr), profiles
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', type=int, default=8)
+    parser.add_argument('--papers', type=int, default=600)
+    parser.add_argument('--max_paper_num', type=int, default=30)
+    parser.add_argument('--paper_seconds', type=float, default=3.0, help='Modelled seconds to download, parse and extract affiliations of one paper')
+    parser.add_argument('--tldr_seconds', type=float, default=10.0, help='Modelled seconds of one TLDR request')
+    args = parser.parse_args()
+    logger.remove()
+
+    rng = random.Random(0)
+    feed = make_feed(rng, args.papers)
+    with open(DEFAULT_CONFIG, encoding='utf-8') as f:
+        names = [i['name'] for g in json.load(f)['groups'] for i in g['institutions']]
+    affiliations = {e['id']: rng.sample(names, rng.randint(0, 3)) or ['Unknown Institute'] for e in feed}
+    defaults = SimpleNamespace(receiver=None, arxiv_query=None, max_paper_num=args.max_paper_num, affiliation_config=DEFAULT_CONFIG,
+                               affiliation_tie_breaker=False, filter_query=None, filter_include=None, filter_exclude=None,
+                               filter_category_weights=None, filter_top_n=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = make_configs(rng, tmp, args.profiles)
+        separate = [run([config], defaults, feed, affiliations) for config in configs]
+        start = time.perf_counter()
+        shared = run(configs, defaults, feed, affiliations)
+        routing = time.perf_counter() - start
+
+    # 单独运行时每个用户各选自己的前K名，共享运行的每个用户应得到完全相同的结果
+    same = all(s[2].profiles[0].results() == p.results() for s, p in zip(separate, shared[2].profiles))
+    print(f'{args.profiles} profiles, {args.papers} papers in the feed, top {args.max_paper_num} each')
+    for name, (processed, tldr) in (('separate', [sum(s[i] for s in separate) for i in (0, 1)]), ('shared', shared[:2])):
+        modelled = processed * args.paper_seconds + tldr * args.tldr_seconds
+        print(f'{name:<9s} {processed:5d} papers processed, {tldr:4d} TLDRs, modelled {modelled / 60:6.1f}min')
+    print(f'same selection per profile: {same}, routing and ranking took {routing * 1000:.1f}ms')
+    print(shared[2].summary())
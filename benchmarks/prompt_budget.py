@@ -0,0 +1,80 @@
+"""CPU time per TLDR prompt of the token-budgeted builder vs the old encode-everything-then-cut round trip.
+
+The old version loaded the tokenizer and encoded the whole assembled prompt for every paper, which could also cut
+off the trailing output instructions. Sections are synthetic unless --corpus points to a directory of .tex files.
+
+Usage: python benchmarks/prompt_budget.py --papers 200
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken
+from latex import clean_tex, TexIndex
+from paper import TLDR_PROMPT, TLDR_SECTION_WEIGHTS, PROMPT_MAX_TOKENS
+from prompt import build_prompt, get_encoder
+
+WORDS = 'we propose model language training data results method network learning performance attention benchmark'.split()
+
+
+def synthetic(rng: random.Random) -> dict[str, str]:
+    def text(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+    return {
+        'TITLE': text(12),
+        'ABSTRACT': text(200),
+        'INTRODUCTION': '\\section{Introduction}\n' + text(rng.randint(800, 6000)),
+        'CONCLUSION': '\\section{Conclusion}\n' + text(rng.randint(0, 2000)),
+        'CATEGORY': "['cs.AI', 'cs.CL']",
+    }
+
+
+def from_corpus(path: str) -> list[dict[str, str]]:
+    sections = []
+    for file in sorted(glob.glob(os.path.join(path, '*.tex'))):
+        with open(file, encoding='utf-8', errors='ignore') as f:
+            index = TexIndex(clean_tex(f.read()))
+        sections.append({
+            'TITLE': os.path.basename(file),
+            'ABSTRACT': index.abstract_text or '',
+            'INTRODUCTION': index.section('introduction'),
+            'CONCLUSION': index.section('conclusion', 'concluding'),
+            'CATEGORY': "['cs.AI']",
+        })
+    return sections
+
+
+def legacy(sections: dict[str, str]) -> str:
+    prompt = TLDR_PROMPT
+    for name, text in sections.items():
+        prompt = prompt.replace(f'__{name}__', text)
+    enc = tiktoken.encoding_for_model('gpt-4o')
+    return enc.decode(enc.encode(prompt)[:PROMPT_MAX_TOKENS])
+
+
+def budgeted(sections: dict[str, str]) -> str:
+    return build_prompt(TLDR_PROMPT, sections, PROMPT_MAX_TOKENS, TLDR_SECTION_WEIGHTS, stage='tldr')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=200)
+    parser.add_argument('--corpus', type=str, default=None, help='Directory of .tex files used instead of synthetic sections')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    papers = from_corpus(args.corpus) if args.corpus else [synthetic(rng) for _ in range(args.papers)]
+    get_encoder()
+    instructions = TLDR_PROMPT.rsplit('\n', 1)[-1]
+    for name, fn in (('legacy', legacy), ('budgeted', budgeted)):
+        start = time.perf_counter()
+        prompts = [fn(p) for p in papers]
+        elapsed = time.perf_counter() - start
+        kept = sum(p.endswith(instructions) for p in prompts)
+        tokens = sum(len(get_encoder().encode(p)) for p in prompts) / len(prompts)
+        print(f'{name:<9s} {elapsed / len(papers) * 1000:7.2f}ms/prompt, {tokens:6.0f} tokens/prompt, instructions kept in {kept}/{len(papers)}')
@@ -0,0 +1,102 @@
+"""Time and peak memory of rendering the email for many papers: the old thread pool + str.format + str.replace
+renderer vs the precompiled single-pass template, returned as a string and streamed to a file.
+
+Usage: python benchmarks/render_email.py --papers 10000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from urllib.parse import quote_plus
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from construct_email import framework, get_empty_html, get_stars, render_email, write_email, KIMI_PROMPT, KIMI_SYSTEM_PROMPT
+
+WORDS = 'we propose model language training data results method network learning performance attention <b> & "'.split()
+
+
+def make_paper(rng: random.Random, i: int):
+    def text(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+    return SimpleNamespace(
+        arxiv_id=f'2501.{i:05d}', title=text(12), summary=text(200), tldr=text(30), topic=text(3),
+        authors=[SimpleNamespace(name=f'Author {j}') for j in range(rng.randint(1, 10))],
+        affiliations=[f'University {j}' for j in range(rng.randint(1, 7))], score=rng.uniform(0, 5),
+        pdf_url=f'https://arxiv.org/pdf/2501.{i:05d}v1', code_url=f'https://github.com/example/{i}' if i % 3 == 0 else None,
+    )
+
+
+def legacy_block(paper) -> str:
+    """原来的get_block_html + process_paper"""
+    title = paper.title.replace('&', '')
+    prompt = KIMI_PROMPT.format(title=title, pdf_url=paper.pdf_url)
+    ai_url = quote_plus(f'https://kimi.moonshot.cn/_prefill_chat?prefill_prompt={prompt}&system_prompt={KIMI_SYSTEM_PROMPT}&send_immediately=true&force_search=false', safe='/:?=&')
+    code = f"""<a href="javascript:void(0)" onclick="openModal('{paper.code_url}')" class="paper-actions">Code</a>""" if paper.code_url else ''
+    authors = ', '.join(a.name for a in paper.authors[:5]) + (', ...' if len(paper.authors) > 5 else '')
+    affiliations = ', '.join(paper.affiliations[:5]) + (', ...' if len(paper.affiliations) > 5 else '')
+    block_template = """
+    <div class="paper-block">
+        <div class="paper-title">{title}</div>
+        <div class="paper-authors">{authors}</div>
+        <div class="paper-affiliations">{affiliations}</div>
+        <div class="paper-tag"><strong>Tag:</strong> {topic}</div>
+        <div class="paper-score"><strong>Score:</strong> {rate}</div>
+        <div class="paper-abstract"><strong>Abstract:</strong> {abstract}</div>
+        <div class="paper-tldr"><strong>TLDR:</strong> {tldr}</div>
+        <div class="paper-actions">
+            <a href="javascript:void(0)" onclick="openModal('{pdf_url}')">PDF</a>
+            <a href="javascript:void(0)" onclick="openModal('{kimi}')">Kimi</a>
+            {code}
+        </div>
+    </div>
+    """
+    return block_template.format(title=title, authors=authors, rate=get_stars(paper.score), tldr=paper.tldr, abstract=paper.summary,
+                                 topic=paper.topic, pdf_url=paper.pdf_url, code=code, affiliations=affiliations, kimi=ai_url)
+
+
+def legacy(papers) -> str:
+    today = datetime.datetime.now()
+    html = framework.replace('__PREV_DATE_1__', (today - datetime.timedelta(days=1)).strftime('%Y-%m-%d'))
+    html = html.replace('__PREV_DATE_2__', (today - datetime.timedelta(days=2)).strftime('%Y-%m-%d'))
+    if len(papers) == 0:
+        return html.replace('__CONTENT__', get_empty_html())
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        parts = list(executor.map(legacy_block, papers))
+    return html.replace('__CONTENT__', '<br>' + '</br><br>'.join(parts) + '</br>')
+
+
+def to_file(papers) -> None:
+    with tempfile.TemporaryFile('w', encoding='utf-8') as f:
+        write_email(f, papers)
+
+
+def peak_memory(fn, papers) -> int:
+    tracemalloc.start()
+    fn(papers)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    papers = [make_paper(rng, i) for i in range(args.papers)]
+    print(f'{args.papers} papers, {len(render_email(papers)) / 2 ** 20:.1f}MB of HTML')
+    for name, fn in (('legacy', legacy), ('compiled', render_email), ('streamed', to_file)):
+        # tracemalloc会拖慢执行，耗时单独测量
+        start = time.perf_counter()
+        fn(papers)
+        elapsed = time.perf_counter() - start
+        peak = peak_memory(fn, papers)
+        print(f'{name:<9s} {elapsed:6.2f}s  {elapsed / args.papers * 1e6:6.1f}us/paper  peak memory {peak / 2 ** 20:7.2f}MB')
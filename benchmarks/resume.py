@@ -0,0 +1,82 @@
+"""Work redone after an interrupted run, with and without resuming from the run journal.
+
+The first attempt only gets through the first --done fraction of the papers, simulating a job cancelled midway.
+The second attempt processes all papers against the same local stand-ins as benchmarks/pipeline_latency.py.
+
+Usage: python benchmarks/resume.py --papers 200 --done 0.6
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from llm import set_global_llm, get_llm
+from source import SourceFetcher
+from pipeline import Pipeline, TopK
+from journal import RunJournal
+from main import build_stages
+from pipeline_latency import serve, iter_papers
+
+
+def attempt(config, port: int, n: int, journal_dir: str, resume: bool) -> tuple[float, dict[str, int]]:
+    counts = {'downloads': 0, 'llm': 0}
+    llm = get_llm()
+    generate = llm.generate
+
+    def counting_generate(*args, **kwargs):
+        counts['llm'] += 1
+        return generate(*args, **kwargs)
+
+    fetcher = SourceFetcher(max_workers=config.download_workers, max_per_host=8, download_domain=None)
+    fetch_members = fetcher.fetch_members
+
+    def counting_fetch(paper):
+        counts['downloads'] += 1
+        return fetch_members(paper)
+
+    llm.generate = counting_generate
+    fetcher.fetch_members = counting_fetch
+    journal = RunJournal(journal_dir, fingerprint='benchmark', resume=resume, run_date='benchmark')
+    order = {}
+    topk = TopK(config.max_paper_num, key=lambda p: (p.score, -order[p.arxiv_id]))
+
+    def source():
+        for i, paper in enumerate(iter_papers(n, port, 0.0)):
+            order[paper.arxiv_id] = i
+            yield paper
+
+    start = time.perf_counter()
+    Pipeline(build_stages(config, fetcher, topk, {}, journal)).run(source())
+    elapsed = time.perf_counter() - start
+    journal.close()
+    llm.generate = generate
+    return elapsed, counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=200)
+    parser.add_argument('--top', type=int, default=50)
+    parser.add_argument('--done', type=float, default=0.6, help='Fraction of the papers finished before the first attempt died')
+    parser.add_argument('--source_latency', type=float, default=0.3)
+    parser.add_argument('--llm_latency', type=float, default=0.5)
+    args = parser.parse_args()
+    logger.remove()
+
+    server = serve(args.source_latency, args.llm_latency)
+    port = server.server_address[1]
+    config = SimpleNamespace(download_workers=8, llm_concurrency=5, llm_batch_size=8, llm_batch_tokens=6000, max_paper_num=args.top)
+    # 不使用LLM缓存，重新运行时的请求数只取决于日志
+    set_global_llm(api_key='benchmark', base_url=f'http://127.0.0.1:{port}', model='benchmark', concurrency=config.llm_concurrency)
+    print(f'{args.papers} papers, first attempt finished {args.done:.0%} of them')
+    for resume in (False, True):
+        with tempfile.TemporaryDirectory() as journal_dir:
+            attempt(config, port, int(args.papers * args.done), journal_dir, resume=False)
+            elapsed, counts = attempt(config, port, args.papers, journal_dir, resume=resume)
+        print(f"{'resume' if resume else 'restart':<8s} second attempt wall={elapsed:6.2f}s downloads={counts['downloads']} llm requests={counts['llm']}")
+    server.shutdown()
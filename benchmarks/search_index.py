@@ -0,0 +1,88 @@
+"""Build time and size of the sharded search index as the archive grows, and the bytes a browser downloads per query.
+
+Synthetic papers draw title, topic and TLDR words from a Zipf-distributed vocabulary. For each archive length the
+index is built from scratch, as every daily run does. Queries are answered the way the JS searcher does it: the
+manifest, the shard of each query term, and the document files of the top 20 hits. Downloaded sizes are gzip sizes.
+
+Usage: python benchmarks/search_index.py --papers 50 --days 30,90,180,365,730
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import build_index, fnv1a, tokenize
+
+QUERIES = ['large language model', 'diffusion', 'graph neural network robustness', 'reinforcement learning robot', 'w123 w456']
+
+
+class Corpus:
+    def __init__(self, rng: random.Random, vocabulary: int = 20000):
+        self.rng = rng
+        common = ['large', 'language', 'model', 'diffusion', 'graph', 'neural', 'network', 'robustness', 'reinforcement',
+                  'learning', 'robot', 'vision', 'transformer', 'benchmark', 'reasoning', 'agent', 'efficient', 'training']
+        self.words = common + [f'w{i}' for i in range(vocabulary - len(common))]
+        self.weights = [1 / (rank + 1) for rank in range(vocabulary)]
+
+    def text(self, n: int) -> str:
+        return ' '.join(self.rng.choices(self.words, self.weights, k=n))
+
+    def row(self, day: datetime.date, n: int) -> dict:
+        return {'date': day, 'id': f'{2000 + n // 100000}.{n % 100000:05d}', 'title': self.text(10), 'topic': self.text(3), 'tldr': self.text(40),
+                'affiliations': [f'University {self.rng.randrange(500)}' for _ in range(self.rng.randint(0, 4))],
+                'score': self.rng.randint(2, 10) / 2, 'code_url': None}
+
+
+def gz(data: bytes) -> int:
+    return len(gzip.compress(data, 9))
+
+
+def query_bytes(manifest: dict, files: dict[str, bytes], query: str) -> tuple[int, int]:
+    """返回(下载的文件数, 压缩后的字节数)，与浏览器端的搜索过程相同"""
+    needed = ['manifest']
+    terms = list(dict.fromkeys(tokenize(query)))
+    shards = [manifest['term_files'][fnv1a(t) % len(manifest['term_files'])] for t in terms]
+    scores = None
+    for term, shard in zip(terms, shards):
+        hits, doc = {}, 0
+        for value in json.loads(files[shard]).get(term, []):
+            doc += value >> 1
+            hits[doc] = 2 if value & 1 else 1
+        scores = hits if scores is None else {d: s + hits[d] for d, s in scores.items() if d in hits}
+    ranked = sorted((scores or {}).items(), key=lambda x: (-x[1], -x[0]))[:20]
+    chunks = {manifest['doc_files'][d // manifest['chunk']] for d, _ in ranked}
+    needed += list(dict.fromkeys(shards)) + list(chunks)
+    size = gz(json.dumps(manifest).encode()) + sum(gz(files[name]) for name in needed[1:])
+    return len(needed), size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=50, help='Papers per day')
+    parser.add_argument('--days', type=str, default='30,90,180,365,730')
+    parser.add_argument('--shard_kb', type=float, default=32)
+    args = parser.parse_args()
+
+    corpus = Corpus(random.Random(0))
+    last = datetime.date(2026, 1, 1)
+    longest = max(int(d) for d in args.days.split(','))
+    rows = [corpus.row(last - datetime.timedelta(days=d), d * args.papers + i) for d in range(longest) for i in range(args.papers)]
+    print(f'{args.papers} papers per day, shards of about {args.shard_kb:.0f}KB')
+    print(f'{"days":>5s} {"papers":>7s} {"terms":>7s} {"build":>7s} {"shards":>6s} {"index gz":>9s} {"shard gz avg/max":>17s}  per query (files, gz KB)')
+    for days in (int(d) for d in args.days.split(',')):
+        subset = rows[:days * args.papers]
+        start = time.perf_counter()
+        manifest, files = build_index(subset, shard_kb=args.shard_kb)
+        elapsed = time.perf_counter() - start
+        shard_sizes = [gz(files[name]) for name in manifest['term_files']]
+        total = sum(gz(data) for data in files.values())
+        queries = [query_bytes(manifest, files, q) for q in QUERIES]
+        print(f'{days:5d} {manifest["docs"]:7d} {manifest["terms"]:7d} {elapsed:6.2f}s {len(shard_sizes):6d} {total / 2 ** 20:7.2f}MB '
+              f'{sum(shard_sizes) / len(shard_sizes) / 1024:7.1f}/{max(shard_sizes) / 1024:6.1f}KB  '
+              + ' '.join(f'{n}/{size / 1024:.0f}' for n, size in queries))
@@ -0,0 +1,82 @@
+"""Storage per paper and lookup time of the seen-paper index with years of history.
+
+The index is filled with --history synthetic papers, then one daily feed of --feed entries (a mix of already
+processed papers, cross-lists of them, new versions and new papers) is checked against it.
+
+Usage: python benchmarks/seen_index.py --history 1000000 --feed 1000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+import seen
+from seen import SeenIndex, content_hash
+
+
+class Paper:
+    def __init__(self, arxiv_id: str, version: int):
+        self.arxiv_id = arxiv_id
+        self.cache_key = f'{arxiv_id}v{version}'
+        self.title = f'Paper {arxiv_id}'
+        self.summary = f'Abstract of {arxiv_id} version {version}.'
+
+
+def short_id(n: int) -> str:
+    # 每月约2万篇论文
+    return f'{15 + n // 240000:02d}{1 + n // 20000 % 12:02d}.{n % 20000:05d}'
+
+
+def entry(n: int, version: int, announce_type: str) -> dict:
+    paper = Paper(short_id(n), version)
+    return {'id': f'oai:arXiv.org:{paper.cache_key}', 'title': paper.title,
+            'summary': f'arXiv:{paper.cache_key} Announce Type: {announce_type} \nAbstract: {paper.summary}',
+            'arxiv_announce_type': announce_type}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--history', type=int, default=1000000)
+    parser.add_argument('--feed', type=int, default=1000)
+    args = parser.parse_args()
+    logger.remove()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'seen.sqlite')
+        index = SeenIndex(path)
+        # 历史记录是之前几天处理的，当天处理过的论文会被重新选中
+        today = seen.today
+        seen.today = lambda: today() - 1
+        start = time.perf_counter()
+        for n in range(args.history):
+            index.add(Paper(short_id(n), 1))
+            if n % 100000 == 99999:
+                index.commit()
+        index.commit()
+        seen.today = today
+        print(f'{args.history} papers indexed in {time.perf_counter() - start:.1f}s, '
+              f'{os.path.getsize(path) / args.history:.1f} bytes/paper ({os.path.getsize(path) / 2 ** 20:.1f}MB)')
+
+        feed = []
+        for i in range(args.feed):
+            kind = rng.random()
+            if kind < 0.5:
+                feed.append(entry(args.history + i, 1, 'new'))
+            elif kind < 0.8:
+                feed.append(entry(rng.randrange(args.history), 1, 'cross'))
+            else:
+                feed.append(entry(rng.randrange(args.history), 2, 'replace'))
+        start = time.perf_counter()
+        selected = index.select(feed)
+        elapsed = time.perf_counter() - start
+        print(f'checked {args.feed} feed entries in {elapsed * 1000:.1f}ms ({elapsed / args.feed * 1e6:.1f}us/entry), '
+              f'{len(selected)} to process')
+        print(index.summary())
+        index.close()
+    assert content_hash('A  title', 'Abstract') == content_hash('a title', 'abstract ')
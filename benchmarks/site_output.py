@@ -0,0 +1,67 @@
+"""Bytes per day page and estimated load time on a throttled connection: the inline email page published as
+index.html vs the site output with shared fingerprinted assets.
+
+Load time is modelled as a request round trip plus the transfer time of the gzip-compressed page, plus one more
+round trip and transfer for the CSS/JS on a first visit (they are cached afterwards). CDN fonts and icons are the
+same for both and left out.
+
+Usage: python benchmarks/site_output.py --papers 50 --kbps 400 --rtt 0.4
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from construct_email import render_email
+from site_output import SiteWriter, brotli
+from render_email import make_paper
+
+
+def sizes(data: bytes) -> dict[str, int]:
+    out = {'raw': len(data), 'gz': len(gzip.compress(data, 9))}
+    if brotli is not None:
+        out['br'] = len(brotli.compress(data, quality=11))
+    return out
+
+
+def load_time(page: int, assets: int, kbps: float, rtt: float) -> float:
+    seconds = rtt + page * 8 / (kbps * 1000)
+    if assets:
+        seconds += rtt + assets * 8 / (kbps * 1000)
+    return seconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=50)
+    parser.add_argument('--kbps', type=float, default=400, help='Throttled bandwidth in kbit/s')
+    parser.add_argument('--rtt', type=float, default=0.4, help='Round trip time in seconds')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    papers = [make_paper(rng, i) for i in range(args.papers)]
+    inline = sizes(render_email(papers).encode('utf-8'))
+    with tempfile.TemporaryDirectory() as tmp:
+        site = SiteWriter(tmp)
+        site.write_day(papers)
+        with open(os.path.join(tmp, 'index.html'), 'rb') as f:
+            page = sizes(f.read())
+        assets = {}
+        for path in (site.css, site.js):
+            with open(os.path.join(tmp, path), 'rb') as f:
+                for k, v in sizes(f.read()).items():
+                    assets[k] = assets.get(k, 0) + v
+
+    def fmt(s):
+        return ', '.join(f'{k} {v / 1024:6.1f}KB' for k, v in s.items())
+    print(f'{args.papers} papers, {args.kbps:.0f}kbit/s, {args.rtt * 1000:.0f}ms RTT')
+    print(f'inline page   {fmt(inline)}')
+    print(f'site page     {fmt(page)}')
+    print(f'site assets   {fmt(assets)} (once, then cached)')
+    print(f"load inline         {load_time(inline['gz'], 0, args.kbps, args.rtt):5.2f}s")
+    print(f"load site, first    {load_time(page['gz'], assets['gz'], args.kbps, args.rtt):5.2f}s")
+    print(f"load site, cached   {load_time(page['gz'], 0, args.kbps, args.rtt):5.2f}s")
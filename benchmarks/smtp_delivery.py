@@ -0,0 +1,127 @@
+"""Wall-clock time of delivering the digest to a list of receivers: the old send_email, which opens and logs in
+a new connection per email, vs the connection pool with one and several connections.
+
+A local SMTP stand-in replies to every command after --latency seconds (the network round trip), takes --login
+extra seconds to authenticate, and answers every --fail_every-th DATA with a temporary 451 error.
+
+Usage: python benchmarks/smtp_delivery.py --receivers 20 --latency 0.05 --login 0.3
+"""
+import argparse
+import collections
+import os
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smtplib
+from loguru import logger
+from delivery import SMTPPool, build_message
+
+
+class StandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float, login: float, fail_every: int):
+        self.latency = latency
+        self.login = login
+        self.fail_every = fail_every
+        self.delivered = collections.Counter()
+        self.data_commands = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), Handler)
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def reply(self, *lines: str):
+        time.sleep(self.server.latency)
+        self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode())
+
+    def handle(self):
+        server = self.server
+        receivers = []
+        self.reply('220 localhost ESMTP stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-localhost', '250 AUTH PLAIN LOGIN')
+            elif verb == 'AUTH':
+                time.sleep(server.login)
+                self.reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                receivers = []
+                self.reply('250 2.1.0 OK')
+            elif verb == 'RCPT':
+                receivers.append(command.split(':', 1)[1].strip(' <>'))
+                self.reply('250 2.1.5 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.data_commands += 1
+                    fail = server.fail_every and server.data_commands % server.fail_every == 0
+                    if not fail:
+                        server.delivered.update(receivers)
+                self.reply('451 4.3.0 Try again later' if fail else '250 2.0.0 Queued')
+            elif verb == 'QUIT':
+                self.reply('221 2.0.0 Bye')
+                return
+            elif verb in ('RSET', 'NOOP', 'HELO'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 5.5.2 Command not recognized')
+
+
+def legacy(port: int, sender: str, receiver: str, html: str):
+    """原来的send_email：每封邮件新建连接并登录(这里没有TLS)"""
+    server = smtplib.SMTP('127.0.0.1', port)
+    server.login(sender, 'password')
+    server.sendmail(sender, [receiver], build_message(sender, receiver, html))
+    server.quit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--receivers', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds before each SMTP reply')
+    parser.add_argument('--login', type=float, default=0.3, help='Extra seconds to authenticate')
+    parser.add_argument('--fail_every', type=int, default=7, help='Every N-th email gets a 451 error, 0 for none')
+    parser.add_argument('--connections', type=int, default=4)
+    args = parser.parse_args()
+    logger.remove()
+
+    sender = 'bot@example.com'
+    receivers = [f'user{i}@example.com' for i in range(args.receivers)]
+    html = '<html><body>' + '<p>paper</p>' * 20000 + '</body></html>'
+    print(f'{args.receivers} receivers, {len(html) / 1024:.0f}KB digest, {args.latency * 1000:.0f}ms per reply, '
+          f'{args.login * 1000:.0f}ms login, 451 on every {args.fail_every}th email')
+
+    # 原来的send_email遇到错误就退出，这里测量时不注入错误
+    server = StandIn(args.latency, args.login, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start = time.perf_counter()
+    for receiver in receivers:
+        legacy(server.server_address[1], sender, receiver, html)
+    print(f'legacy          {time.perf_counter() - start:6.2f}s  (no injected errors)')
+    server.shutdown()
+
+    for connections in (1, args.connections):
+        server = StandIn(args.latency, args.login, args.fail_every)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        pool = SMTPPool('127.0.0.1', server.server_address[1], sender, 'password', connections=connections, security='plain')
+        start = time.perf_counter()
+        failures = pool.send_all([(receiver, html) for receiver in receivers])
+        elapsed = time.perf_counter() - start
+        pool.close()
+        exactly_once = all(server.delivered[receiver] == 1 for receiver in receivers)
+        print(f'pool x{connections:<2d}        {elapsed:6.2f}s  each delivered once: {exactly_once}, {len(failures)} failed')
+        print(f'                {pool.summary()}')
+        server.shutdown()
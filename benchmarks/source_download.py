@@ -0,0 +1,81 @@
+"""Wall-clock time of the source download stage against a local stand-in for export.arxiv.org.
+
+Usage: python benchmarks/source_download.py --papers 100 --latency 0.3
+"""
+import argparse
+import io
+import os
+import sys
+import tarfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arxiv
+from loguru import logger
+from paper import ArxivPaper
+from source import SourceFetcher
+
+
+def make_source() -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in [('main.tex', b'\\begin{document}\n\\section{Introduction}\nHello.\n\\end{document}\n'), ('main.bbl', b'')]:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def serve(latency: float) -> ThreadingHTTPServer:
+    body = make_source()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_papers(n: int, port: int) -> list[ArxivPaper]:
+    papers = []
+    for i in range(n):
+        short_id = f'2501.{i:05d}v1'
+        link = arxiv.Result.Link(f'http://127.0.0.1:{port}/pdf/{short_id}', title='pdf')
+        papers.append(ArxivPaper(arxiv.Result(entry_id=f'http://arxiv.org/abs/{short_id}', links=[link])))
+    return papers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--papers', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.3, help='Injected server latency per request in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--per_host', type=int, default=8)
+    args = parser.parse_args()
+    logger.remove()
+
+    server = serve(args.latency)
+    port = server.server_address[1]
+    print(f'{args.papers} papers, {args.latency}s injected latency')
+    for workers in args.workers:
+        papers = make_papers(args.papers, port)
+        fetcher = SourceFetcher(max_workers=workers, max_per_host=args.per_host, download_domain=None)
+        start = time.perf_counter()
+        fetcher.fetch_all(papers)
+        elapsed = time.perf_counter() - start
+        parsed = sum(p.tex is not None for p in papers)
+        print(f'workers={workers:<3d} per_host={min(workers, args.per_host):<3d} wall={elapsed:7.2f}s parsed={parsed}/{args.papers}')
+    server.shutdown()
@@ -0,0 +1,105 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from loguru import logger
+
+PAPERS_WITH_CODE_API = 'https://paperswithcode.com/api/v1'
+
+
+class CodeLinkResolver:
+    """通过paperswithcode查询论文代码仓库的链接。
+
+    所有请求共用一个带连接池的Session，同时进行的请求不超过max_workers个。
+    查询结果保存在SQLite中，找到链接的结果ttl秒内有效，没有代码的结果negative_ttl秒内有效(之后可能补充了代码)，
+    请求失败不缓存。
+    """
+    def __init__(self, cache_path: Optional[str] = None, ttl: float = 7 * 24 * 3600, negative_ttl: float = 24 * 3600,
+                 max_workers: int = 8, timeout: float = 10.0, api_base: str = PAPERS_WITH_CODE_API):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.api_base = api_base.rstrip('/')
+        self.stats = {'hits': 0, 'found': 0, 'missing': 0, 'errors': 0, 'seconds': 0.0}
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers,
+                              max_retries=Retry(total=5, backoff_factor=0.1, status_forcelist=(429, 500, 502, 503, 504)))
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._conn = None
+        if cache_path is not None:
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS code_links (id TEXT PRIMARY KEY, url TEXT, fetched REAL NOT NULL) WITHOUT ROWID')
+            self._conn.execute('DELETE FROM code_links WHERE fetched < ?', (time.time() - max(ttl, negative_ttl),))
+            self._conn.commit()
+
+    def _cached(self, arxiv_id: str) -> tuple[bool, Optional[str]]:
+        if self._conn is None:
+            return False, None
+        with self._lock:
+            row = self._conn.execute('SELECT url, fetched FROM code_links WHERE id = ?', (arxiv_id,)).fetchone()
+        if row is None or time.time() - row[1] > (self.ttl if row[0] is not None else self.negative_ttl):
+            return False, None
+        return True, row[0]
+
+    def _store(self, arxiv_id: str, url: Optional[str]):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO code_links (id, url, fetched) VALUES (?, ?, ?)', (arxiv_id, url, time.time()))
+            self._conn.commit()
+
+    def _query(self, arxiv_id: str) -> Optional[str]:
+        with self._slots:
+            paper_list = self._session.get(f'{self.api_base}/papers/', params={'arxiv_id': arxiv_id}, timeout=self.timeout).json()
+            if paper_list.get('count', 0) == 0:
+                return None
+            paper_id = paper_list['results'][0]['id']
+            repo_list = self._session.get(f'{self.api_base}/papers/{paper_id}/repositories/', timeout=self.timeout).json()
+        if repo_list.get('count', 0) == 0:
+            return None
+        return repo_list['results'][0]['url']
+
+    def lookup(self, arxiv_id: str) -> tuple[bool, Optional[str]]:
+        """返回(是否得到确定的结果, 代码链接)。网络或API出错时为(False, None)，结果不缓存，之后可以重试"""
+        hit, url = self._cached(arxiv_id)
+        if hit:
+            with self._lock:
+                self.stats['hits'] += 1
+            return True, url
+        start = time.perf_counter()
+        try:
+            url = self._query(arxiv_id)
+        except Exception as e:
+            logger.debug(f'Error when searching {arxiv_id}: {e}')
+            with self._lock:
+                self.stats['errors'] += 1
+            return False, None
+        self._store(arxiv_id, url)
+        with self._lock:
+            self.stats['found' if url is not None else 'missing'] += 1
+            self.stats['seconds'] += time.perf_counter() - start
+        return True, url
+
+    def resolve(self, arxiv_id: str) -> Optional[str]:
+        return self.lookup(arxiv_id)[1]
+
+    def summary(self) -> str:
+        s = self.stats
+        queried = s['found'] + s['missing']
+        latency = f", {s['seconds'] / queried * 1000:.0f}ms per lookup" if queried else ''
+        return (f"Code links: {s['hits']} cached, {s['found']} found, {s['missing']} without code, "
+                f"{s['errors']} errors{latency}.")
+
+    def close(self):
+        self._session.close()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
@@ -1,15 +1,10 @@
 from paper import ArxivPaper
-from tqdm import tqdm
-from email.header import Header
-from email.mime.text import MIMEText
-from email.utils import parseaddr, formataddr
-import smtplib
 import datetime
 from loguru import logger
-from typing import Optional
-from urllib.parse import quote_plus
-from concurrent.futures import ThreadPoolExecutor
-import concurrent.futures
+from typing import Callable, Optional, TextIO, Union
+from urllib.parse import urlencode, quote_plus
+import html
+import re
 
 framework = """
 <!DOCTYPE HTML>
@@ -533,35 +528,100 @@ def get_empty_html():
   """
   return block_template
 
-def get_block_html(title:str, authors:str, rate:str, arxiv_id:str, abstract:str, topic: Optional[str], tldr: Optional[str], pdf_url: Optional[str], code_url: Optional[str]=None, affiliations: Optional[str]=None):
-    title = title.replace('&', '')  # 移除特殊字符
-    ai_url = f'''https://kimi.moonshot.cn/_prefill_chat?prefill_prompt=请你阅读{title}这篇论文，链接是 {pdf_url} ，并回答以下问题：
+class Template:
+    """预编译的模板：按__NAME__占位符把模板切成字面量和字段名交替的列表，
+    渲染时依次写出，不再对整个模板反复replace，也不需要先拼出完整的字符串
+    """
+    _FIELD = re.compile(r'__([A-Z0-9_]+?)__')
+
+    def __init__(self, text: str):
+        parts = self._FIELD.split(text)
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+
+    def write(self, write: Callable[[str], object], values: dict[str, Union[str, Callable]]):
+        """values中的值可以是字符串，也可以是接收write的函数，用于流式写出很长的字段"""
+        for literal, field in zip(self.literals, self.fields):
+            write(literal)
+            value = values[field]
+            if callable(value):
+                value(write)
+            else:
+                write(value)
+        write(self.literals[-1])
+
+    def render(self, values: dict[str, str]) -> str:
+        out = []
+        self.write(out.append, values)
+        return ''.join(out)
+
+
+_PAGE = Template(framework)
+
+_BLOCK_HTML = """
+    <div class="paper-block">
+        <div class="paper-title">__TITLE__</div>
+        <div class="paper-authors">__AUTHORS__</div>
+        <div class="paper-affiliations">__AFFILIATIONS__</div>
+        <div class="paper-tag"><strong>Tag:</strong> __TOPIC__</div>
+        <div class="paper-score"><strong>Score:</strong> __RATE__</div>
+        <div class="paper-abstract"><strong>Abstract:</strong> __ABSTRACT__</div>
+        <div class="paper-tldr"><strong>TLDR:</strong> __TLDR__</div>
+        <div class="paper-actions">
+            <a href="javascript:void(0)" onclick="openModal('__PDF_URL__')">PDF</a>
+            <a href="javascript:void(0)" onclick="openModal('__KIMI__')">Kimi</a>
+            __CODE__
+        </div>
+    </div>
+    """
+_BLOCK = Template(_BLOCK_HTML)
+# 网页版的Kimi链接由共享的JS根据标题和PDF链接生成，不在每篇论文中重复近4KB的编码后的提示词
+_SITE_BLOCK = Template(_BLOCK_HTML.replace('''onclick="openModal('__KIMI__')"''', 'data-pdf="__PDF_DATA__" onclick="openKimi(this)"'))
+
+
+KIMI_PROMPT = """请你阅读{title}这篇论文，链接是 {pdf_url} ，并回答以下问题：
 **Q1. 这篇论文试图解决什么问题？**
 **Q2. 这是一个新问题吗？如果有相关研究，请给出并总结方法**
 **Q3. 本文试图验证的科学假设是什么？**
 **Q4. 这篇论文提出了什么新的想法、方法或模型？与以前的方法相比，有什么特点和优势？**
 **Q5. 论文中的实验是如何设计的？**
 **Q6. 实验和结果是否很好地支持了需要验证的科学假设**
-回答时请先重复问题，再进行对应的回答。&system_prompt=你是一个学术专家，请你仔细阅读后续链接中的论文，并对用户的问题进行专业的回答，不要出现第一人称，当涉及到分点回答时，鼓励你以markdown格式输出。对于引用的内容，你需要及时在引用内容后给出参考链接。&send_immediately=true&force_search=false'''
-    ai_url = quote_plus(ai_url, safe='/:?=&')
-    code = f"""<a href="javascript:void(0)" onclick="openModal('{code_url}')" class="paper-actions">Code</a>""" if code_url else ''
-    block_template = """
-    <div class="paper-block">
-        <div class="paper-title">{title}</div>
-        <div class="paper-authors">{authors}</div>
-        <div class="paper-affiliations">{affiliations}</div>
-        <div class="paper-tag"><strong>Tag:</strong> {topic}</div>
-        <div class="paper-score"><strong>Score:</strong> {rate}</div>
-        <div class="paper-abstract"><strong>Abstract:</strong> {abstract}</div>
-        <div class="paper-tldr"><strong>TLDR:</strong> {tldr}</div>
-        <div class="paper-actions">
-            <a href="javascript:void(0)" onclick="openModal('{pdf_url}')">PDF</a>
-            <a href="javascript:void(0)" onclick="openModal('{kimi}')">Kimi</a>
-            {code}
-        </div>
-    </div>
-    """
-    return block_template.format(title=title, authors=authors, rate=rate, arxiv_id=arxiv_id, tldr=tldr, abstract=abstract, topic=topic, pdf_url=pdf_url, code=code, affiliations=affiliations, kimi=ai_url)
+回答时请先重复问题，再进行对应的回答。"""
+
+KIMI_SYSTEM_PROMPT = "你是一个学术专家，请你仔细阅读后续链接中的论文，并对用户的问题进行专业的回答，不要出现第一人称，当涉及到分点回答时，鼓励你以markdown格式输出。对于引用的内容，你需要及时在引用内容后给出参考链接。"
+
+
+def _compile_kimi_url() -> tuple[str, str, str]:
+    """Kimi链接中只有标题和PDF链接随论文变化，其余部分只编码一次。quote_plus的结果不含需要HTML或JS转义的字符"""
+    before_title, rest = KIMI_PROMPT.split('{title}')
+    between, after_url = rest.split('{pdf_url}')
+    tail = urlencode({'system_prompt': KIMI_SYSTEM_PROMPT, 'send_immediately': 'true', 'force_search': 'false'})
+    head = 'https://kimi.moonshot.cn/_prefill_chat?prefill_prompt=' + quote_plus(before_title)
+    return html.escape(head), quote_plus(between), html.escape(quote_plus(after_url) + '&' + tail)
+
+
+_KIMI_HEAD, _KIMI_BETWEEN, _KIMI_TAIL = _compile_kimi_url()
+
+
+def _text(value) -> str:
+    return html.escape(str(value), quote=False)
+
+
+def _js_url(url) -> str:
+    """放进onclick="openModal('...')"的链接：先按JS字符串转义，再按HTML属性转义"""
+    return html.escape(str(url).replace('\\', '\\\\').replace("'", "\\'"), quote=True)
+
+
+def get_block_html(title:str, authors:str, rate:str, arxiv_id:str, abstract:str, topic: Optional[str], tldr: Optional[str], pdf_url: Optional[str], code_url: Optional[str]=None, affiliations: Optional[str]=None, site:bool=False):
+    """rate是已经生成好的HTML，其余字段都是纯文本，在这里转义。site为True时生成网页版的块"""
+    # 标题单独编码，其中的&等字符不会截断链接
+    ai_url = None if site else _KIMI_HEAD + quote_plus(title) + _KIMI_BETWEEN + quote_plus(str(pdf_url)) + _KIMI_TAIL
+    code = f"""<a href="javascript:void(0)" onclick="openModal('{_js_url(code_url)}')" class="paper-actions">Code</a>""" if code_url else ''
+    return (_SITE_BLOCK if site else _BLOCK).render({
+        'TITLE': _text(title), 'AUTHORS': _text(authors), 'AFFILIATIONS': _text(affiliations), 'TOPIC': _text(topic),
+        'RATE': rate, 'ABSTRACT': _text(abstract), 'TLDR': _text(tldr), 'PDF_URL': _js_url(pdf_url), 'KIMI': ai_url, 'CODE': code,
+        'PDF_DATA': html.escape(str(pdf_url), quote=True) if site else None,
+    })
 
 def get_stars(score:float):
     full_star = '<span class="full-star">⭐</span>'
@@ -577,9 +637,9 @@ def get_stars(score:float):
         half_star_num = int(2 * (score - full_star_num))
         return '<div class="star-wrapper">'+full_star * full_star_num + half_star * half_star_num + '</div>'
 
-def process_paper(paper:ArxivPaper):
-    """处理单个论文并返回HTML块"""
-    rate = get_stars(paper.score)
+def process_paper(paper:ArxivPaper, site:bool=False, score:Optional[float]=None):
+    """渲染单篇论文的HTML块，只做字符串处理，不发起网络请求。score为按其他偏好表得到的分数，默认使用paper.score"""
+    rate = get_stars(paper.score if score is None else score)
     authors = [a.name for a in paper.authors[:5]]
     authors = ', '.join(authors)
     if len(paper.authors) > 5:
@@ -593,52 +653,45 @@ def process_paper(paper:ArxivPaper):
         affiliations = 'Unknown Affiliation'
     return get_block_html(title = paper.title, authors = authors, 
                                     rate = rate, arxiv_id = paper.arxiv_id,
-                                    tldr = paper.tldr, abstract = paper.summary,
-                                    topic = paper.topic, pdf_url = paper.pdf_url, 
-                                    code_url = paper.code_url, affiliations = affiliations)
+                                    tldr = getattr(paper, 'tldr', None), abstract = paper.summary,
+                                    topic = getattr(paper, 'topic', None), pdf_url = paper.pdf_url, 
+                                    code_url = paper.code_url, affiliations = affiliations, site = site)
 
-def render_email(papers:list[ArxivPaper]):
-    parts = []
+def write_page(write:Callable[[str], object], page:Template, papers:list[ArxivPaper], blocks:Optional[dict[str,str]]=None, **fields:str):
+    """按page模板一次写出整个页面，fields为模板中除日期和内容以外的字段"""
     today = datetime.datetime.now()
-    prev_date_1 = (today - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
-    prev_date_2 = (today - datetime.timedelta(days=2)).strftime('%Y-%m-%d')
-    html = framework.replace('__PREV_DATE_1__', prev_date_1).replace('__PREV_DATE_2__', prev_date_2)
-    if len(papers) == 0 :
-        return html.replace('__CONTENT__', get_empty_html())
-    
-    # 使用线程池并行处理，但保持原始顺序
-    results = {}
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(process_paper, paper): i for i, paper in enumerate(papers)}
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(papers), desc='Rendering HTML'):
-            try:
-                index = futures[future]
-                results[index] = future.result()
-            except Exception as e:
-                logger.error(f"论文处理出错: {e}")
-    parts = [results[i] for i in range(len(papers)) if i in results]
-    content = '<br>' + '</br><br>'.join(parts) + '</br>'
-    return html.replace('__CONTENT__', content)
-
-def send_email(sender:str, receiver:str, password:str,smtp_server:str,smtp_port:int, html:str,):
-    def _format_addr(s):
-        name, addr = parseaddr(s)
-        return formataddr((Header(name, 'utf-8').encode(), addr))
-
-    msg = MIMEText(html, 'html', 'utf-8')
-    msg['From'] = _format_addr('Github Action <%s>' % sender)
-    msg['To'] = _format_addr('You <%s>' % receiver)
-    today = datetime.datetime.now().strftime('%Y/%m/%d')
-    msg['Subject'] = Header(f'Daily arXiv {today}', 'utf-8').encode()
-
-    try:
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-    except Exception as e:
-        logger.warning(f"Failed to use TLS. {e}")
-        logger.warning("Try to use SSL.")
-        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-
-    server.login(sender, password)
-    server.sendmail(sender, [receiver], msg.as_string())
-    server.quit()
+    blocks = blocks or {}
+
+    def content(write):
+        if len(papers) == 0:
+            write(get_empty_html())
+            return
+        write('<br>')
+        for i, paper in enumerate(papers):
+            if i:
+                write('</br><br>')
+            block = blocks.get(paper.arxiv_id)
+            if block is None:
+                try:
+                    block = process_paper(paper)
+                except Exception as e:
+                    logger.error(f"论文处理出错: {e}")
+                    continue
+            write(block)
+        write('</br>')
+
+    page.write(write, {
+        'PREV_DATE_1': (today - datetime.timedelta(days=1)).strftime('%Y-%m-%d'),
+        'PREV_DATE_2': (today - datetime.timedelta(days=2)).strftime('%Y-%m-%d'),
+        'CONTENT': content,
+        **fields,
+    })
+
+def write_email(out:TextIO, papers:list[ArxivPaper], blocks:Optional[dict[str,str]]=None):
+    """一次遍历把整封邮件写入out，不在内存中保留完整的HTML。blocks为已经渲染好的HTML块，按arxiv_id索引，其余论文在这里渲染"""
+    write_page(out.write, _PAGE, papers, blocks)
+
+def render_email(papers:list[ArxivPaper], blocks:Optional[dict[str,str]]=None) -> str:
+    parts = []
+    write_page(parts.append, _PAGE, papers, blocks)
+    return ''.join(parts)
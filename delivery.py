@@ -0,0 +1,213 @@
+import re
+import time
+import queue
+import smtplib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.header import Header
+from email.mime.text import MIMEText
+from email.utils import parseaddr, formataddr
+from typing import Optional
+from loguru import logger
+from rate_limit import backoff
+
+
+def parse_receivers(value: Optional[str]) -> list[str]:
+    """逗号或分号分隔的收件人地址，去掉空白和重复的地址"""
+    receivers = []
+    for addr in re.split(r'[,;]', value or ''):
+        addr = addr.strip()
+        if addr and addr not in receivers:
+            receivers.append(addr)
+    return receivers
+
+
+def _format_addr(s):
+    name, addr = parseaddr(s)
+    return formataddr((Header(name, 'utf-8').encode(), addr))
+
+
+def build_message(sender: str, receiver: str, html: str, subject: Optional[str] = None) -> str:
+    msg = MIMEText(html, 'html', 'utf-8')
+    msg['From'] = _format_addr('Github Action <%s>' % sender)
+    msg['To'] = _format_addr('You <%s>' % receiver)
+    if subject is None:
+        subject = f"Daily arXiv {datetime.datetime.now().strftime('%Y/%m/%d')}"
+    msg['Subject'] = Header(subject, 'utf-8').encode()
+    return msg.as_string()
+
+
+def _transient(e: Exception) -> bool:
+    """4xx响应、断开的连接和网络错误可以重试，认证失败、地址被拒绝等5xx错误重试也没有用"""
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in e.recipients.values())
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPException):
+        return False
+    return isinstance(e, OSError)
+
+
+class SMTPPool:
+    """复用已登录连接的SMTP发送池。
+
+    最多同时保持connections个连接，每个连接登录一次后连续发送多封邮件，发满messages_per_connection封后重新连接
+    (很多邮箱限制单个会话的邮件数)。任意两封邮件的发送间隔不少于interval秒。
+    临时错误会丢弃当前连接，退避后用新连接重试，最多重试max_retries次。
+    security为'auto'时与原来一样先尝试STARTTLS，失败后改用SSL，之后的连接直接使用第一次成功的方式；
+    'plain'不加密，只用于本地测试。
+    """
+    def __init__(self, server: str, port: int, sender: str, password: Optional[str], connections: int = 2,
+                 max_retries: int = 3, interval: float = 0.0, messages_per_connection: int = 50,
+                 timeout: float = 30.0, security: str = 'auto'):
+        self.server = server
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.connections = max(1, connections)
+        self.max_retries = max_retries
+        self.interval = interval
+        self.messages_per_connection = messages_per_connection
+        self.timeout = timeout
+        self.security = security
+        self.latencies: list[float] = []
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0, 'connections': 0}
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.connections)
+        self._lock = threading.Lock()
+        self._next_send = 0.0
+
+    def _set_security(self, security: str):
+        # 多个发送线程同时建立连接，只有仍为'auto'时才记录第一次成功的方式
+        with self._lock:
+            if self.security == 'auto':
+                self.security = security
+
+    def _connect(self) -> smtplib.SMTP:
+        server = None
+        with self._lock:
+            security = self.security
+        if security in ('auto', 'starttls'):
+            try:
+                server = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+                server.starttls()
+                self._set_security('starttls')
+            except Exception as e:
+                if server is not None:
+                    server.close()
+                if security == 'starttls':
+                    raise
+                logger.warning(f"Failed to use TLS. {e}")
+                logger.warning("Try to use SSL.")
+                self._set_security('ssl')
+                security = 'ssl'
+                server = None
+        if server is None:
+            if security == 'ssl':
+                server = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.password is not None:
+                server.login(self.sender, self.password)
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            self.stats['connections'] += 1
+        return server
+
+    def _throttle(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_send - now
+            self._next_send = max(now, self._next_send) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def send(self, receiver: str, html: str, subject: Optional[str] = None) -> float:
+        """发送一封邮件，返回包括重试在内的耗时，最终失败时抛出最后一次的异常"""
+        message = build_message(self.sender, receiver, html, subject)
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            with self._slots:
+                try:
+                    server, sent = self._idle.get_nowait()
+                except queue.Empty:
+                    server, sent = None, 0
+                try:
+                    if server is None:
+                        server = self._connect()
+                    self._throttle()
+                    server.sendmail(self.sender, [receiver], message)
+                except Exception as e:
+                    # 出错后连接的状态不确定，直接丢弃
+                    if server is not None:
+                        server.close()
+                    if attempt == self.max_retries or not _transient(e):
+                        raise
+                    error = e
+                else:
+                    if sent + 1 >= self.messages_per_connection:
+                        self._quit(server)
+                    else:
+                        self._idle.put((server, sent + 1))
+                    break
+            logger.debug(f"Failed to send the email to {receiver}: {error}, attempt {attempt + 1}/{self.max_retries + 1}.")
+            with self._lock:
+                self.stats['retries'] += 1
+            time.sleep(backoff(attempt))
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(latency)
+        return latency
+
+    def send_all(self, messages: list[tuple[str, str]], subject: Optional[str] = None) -> dict[int, Exception]:
+        """并行发送(收件人, HTML)列表中的邮件，每个收件人可以有不同的内容，同一地址可以出现多次(订阅了多个用户配置)。
+        返回发送失败的邮件在列表中的序号和异常
+        """
+        def send(item: tuple[str, str]) -> Optional[Exception]:
+            receiver, html = item
+            try:
+                latency = self.send(receiver, html, subject)
+            except Exception as e:
+                logger.error(f"Failed to send the email to {receiver}: {e}")
+                return e
+            logger.info(f"Sent the email to {receiver} in {latency:.2f}s.")
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.connections) as executor:
+            results = list(executor.map(send, messages))
+        failures = {i: e for i, e in enumerate(results) if e is not None}
+        self.stats['sent'] += len(messages) - len(failures)
+        self.stats['failed'] += len(failures)
+        return failures
+
+    def summary(self) -> str:
+        s = self.stats
+        latency = ''
+        if self.latencies:
+            values = sorted(self.latencies)
+            latency = f", latency median {values[len(values) // 2]:.2f}s max {values[-1]:.2f}s"
+        return (f"Email: {s['sent']} sent, {s['failed']} failed over {s['connections']} connections, "
+                f"{s['retries']} retries{latency}.")
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(server)
@@ -0,0 +1,46 @@
+import re
+from typing import Optional
+
+# RSS条目的摘要以"arXiv:<id> Announce Type: <type> Abstract:"开头
+_ABSTRACT_PREFIX = re.compile(r'^arXiv:(?P<id>\S+)\s+Announce Type:\s*\S+\s*Abstract:\s*', re.DOTALL)
+# "John Smith, Jr."中逗号后的后缀属于前一个作者
+_NAME_SUFFIX = re.compile(r'^(?:jr|sr|[ivx]+|\d+(?:st|nd|rd|th))\.?$', re.IGNORECASE)
+_VERSIONED_ID = re.compile(r'^(?:\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})v\d+$')
+
+
+def entry_id(entry) -> str:
+    """不带版本号的arXiv id"""
+    return re.sub(r'v\d+$', '', entry.get('id', '').removeprefix('oai:arXiv.org:'))
+
+
+def entry_versioned_id(entry) -> Optional[str]:
+    """带版本号的arXiv id，RSS条目中没有版本号时返回None"""
+    short_id = entry.get('id', '').removeprefix('oai:arXiv.org:')
+    if _VERSIONED_ID.match(short_id):
+        return short_id
+    m = _ABSTRACT_PREFIX.match(entry.get('summary', ''))
+    if m is not None and _VERSIONED_ID.match(m.group('id')):
+        return m.group('id')
+    return None
+
+
+def entry_abstract(entry) -> str:
+    return _ABSTRACT_PREFIX.sub('', entry.get('summary', '')).strip()
+
+
+def entry_authors(entry) -> list[str]:
+    # RSS中全部作者放在一个dc:creator里，用逗号分隔
+    authors = [a.get('name', '') for a in entry.get('authors', [])]
+    if len(authors) == 1 and ',' in authors[0]:
+        names, authors = authors[0].split(','), []
+        for name in names:
+            name = name.strip()
+            if authors and _NAME_SUFFIX.match(name):
+                authors[-1] = f'{authors[-1]}, {name}'
+            else:
+                authors.append(name)
+    return [a.strip() for a in authors if a.strip()]
+
+
+def entry_categories(entry) -> list[str]:
+    return [t['term'] for t in entry.get('tags', []) if t.get('term')]
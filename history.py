@@ -0,0 +1,107 @@
+import os
+import time
+import datetime
+from typing import Optional
+import lance
+import pyarrow as pa
+from loguru import logger
+
+# 只保存推荐结果需要的字段，摘要可以随时从arXiv取回，不占用空间
+SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('profile', pa.string()),
+    ('id', pa.string()),
+    ('title', pa.string()),
+    ('authors', pa.list_(pa.string())),
+    ('affiliations', pa.list_(pa.string())),
+    ('score', pa.float32()),
+    ('topic', pa.string()),
+    ('tldr', pa.string()),
+    ('pdf_url', pa.string()),
+    ('code_url', pa.string()),
+])
+
+
+def _literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _date(value: datetime.date) -> str:
+    return f"date '{value.isoformat()}'"
+
+
+class HistoryStore:
+    """每天推荐的论文按列存储在Lance数据集中，替代只保留三天的HTML存档。
+
+    每次运行追加一个片段，同一天同一用户重复运行时先删除之前的记录，结果不会重复；没有论文时保留之前的记录。
+    片段数超过compact_fragments时合并成大片段，旧版本只保留最新的一个，数据集的大小随论文数线性增长。
+    scan按日期范围、分数、主题和用户过滤，过滤条件下推到Lance中执行，只读取需要的列。
+    """
+    def __init__(self, path: str, compact_fragments: int = 32):
+        self.path = path
+        self.compact_fragments = compact_fragments
+        self.stats = {'appended': 0, 'seconds': 0.0}
+
+    def _dataset(self) -> Optional[lance.LanceDataset]:
+        if not os.path.exists(self.path):
+            return None
+        return lance.dataset(self.path)
+
+    def append(self, papers: list, day: Optional[datetime.date] = None, profile: str = '', scores: Optional[dict[str, float]] = None) -> int:
+        """记录某天推荐给某个用户的论文，scores按arxiv_id给出显示的分数，默认使用paper.score。
+        papers为空时不做任何修改，同一天再次运行没有得到论文时不会删除已记录的推荐
+        """
+        if not papers:
+            return 0
+        start = time.perf_counter()
+        day = day or datetime.date.today()
+        scores = scores or {}
+        rows = [{
+            'date': day, 'profile': profile, 'id': p.arxiv_id, 'title': p.title,
+            'authors': [a.name for a in p.authors], 'affiliations': p.affiliations,
+            'score': scores.get(p.arxiv_id, p.score), 'topic': getattr(p, 'topic', None), 'tldr': getattr(p, 'tldr', None),
+            'pdf_url': p.pdf_url, 'code_url': p.code_url,
+        } for p in papers]
+        dataset = self._dataset()
+        if dataset is not None:
+            dataset.delete(f"date = {_date(day)} AND profile = {_literal(profile)}")
+        table = pa.Table.from_pylist(rows, schema=SCHEMA)
+        dataset = lance.write_dataset(table, self.path, mode='append' if dataset is not None else 'create')
+        self._maintain(dataset)
+        self.stats['appended'] += len(rows)
+        self.stats['seconds'] += time.perf_counter() - start
+        return len(rows)
+
+    def _maintain(self, dataset: lance.LanceDataset):
+        if len(dataset.get_fragments()) > self.compact_fragments:
+            metrics = dataset.optimize.compact_files()
+            logger.debug(f"Compacted the history: {metrics.fragments_removed} fragments into {metrics.fragments_added}.")
+        # 不需要回溯历史版本，只保留最新版本
+        dataset.cleanup_old_versions(older_than=datetime.timedelta(0))
+
+    def scan(self, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None, min_score: Optional[float] = None,
+             topic: Optional[str] = None, profile: Optional[str] = None, columns: Optional[list[str]] = None,
+             limit: Optional[int] = None) -> pa.Table:
+        """返回start到end(都包含)之间的论文，topic为主题中包含的文字，不区分大小写"""
+        dataset = self._dataset()
+        if dataset is None:
+            return SCHEMA.empty_table() if columns is None else SCHEMA.empty_table().select(columns)
+        conditions = []
+        if start is not None:
+            conditions.append(f"date >= {_date(start)}")
+        if end is not None:
+            conditions.append(f"date <= {_date(end)}")
+        if min_score is not None:
+            conditions.append(f"score >= {float(min_score)}")
+        if topic:
+            conditions.append(f"strpos(lower(topic), {_literal(topic.lower())}) > 0")
+        if profile is not None:
+            conditions.append(f"profile = {_literal(profile)}")
+        return dataset.to_table(columns=columns, filter=' AND '.join(conditions) or None, limit=limit)
+
+    def summary(self) -> str:
+        dataset = self._dataset()
+        rows = dataset.count_rows() if dataset is not None else 0
+        size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(self.path) for f in files) if dataset is not None else 0
+        return (f"History: {self.stats['appended']} papers appended in {self.stats['seconds'] * 1000:.0f}ms, "
+                f"{rows} papers stored in {size / 1024:.1f}KB.")
@@ -0,0 +1,122 @@
+import os
+import json
+import zlib
+import base64
+import threading
+from datetime import date
+from typing import Optional
+from loguru import logger
+
+# 各阶段完成后记录的论文属性
+STAGE_FIELDS = {
+    'parse': ('tex',),
+    'affiliations': ('affiliations',),
+    'tldr': ('tldr', 'topic'),
+    'code_url': ('code_url',),
+}
+
+
+def _encode_tex(tex: Optional[dict[str, str]]) -> Optional[str]:
+    if tex is None:
+        return None
+    return base64.b64encode(zlib.compress(json.dumps(tex, ensure_ascii=False).encode('utf-8'))).decode('ascii')
+
+
+def _decode_tex(data: Optional[str]) -> Optional[dict[str, str]]:
+    if data is None:
+        return None
+    return json.loads(zlib.decompress(base64.b64decode(data)))
+
+
+class RunJournal:
+    """按运行日期记录每篇论文各阶段结果的追加式日志(JSON Lines)。
+
+    每完成一个阶段追加一行并立即flush，任务中途被取消时最多丢失正在写的那一行，读取时跳过不完整的行。
+    resume为False时清空当天的日志重新记录；为True时先读入已有记录，流水线据此跳过已完成的阶段。
+    第一行记录影响结果的配置，配置变化后旧记录不再使用。tex用zlib压缩后以base64保存。
+    """
+    def __init__(self, directory: str, fingerprint: str, resume: bool = False, run_date: Optional[str] = None, keep: int = 7):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{run_date or date.today().isoformat()}.jsonl")
+        self.fingerprint = fingerprint
+        self.resumed: dict[str, int] = {}
+        self._records: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._partial = False
+        if resume:
+            self._load()
+        self._file = open(self.path, 'a' if self._records else 'w', encoding='utf-8')
+        if not self._records:
+            self._write({'fingerprint': fingerprint})
+        elif self._partial:
+            # 上次中断时写了一半的行单独成行，不影响之后追加的记录
+            self._file.write('\n')
+        self._prune(directory, keep)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"No run journal at {self.path}, starting from scratch.")
+            return
+        with open(self.path, encoding='utf-8') as f:
+            content = f.read()
+        self._partial = bool(content) and not content.endswith('\n')
+        lines = content.splitlines()
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get('fingerprint') != self.fingerprint:
+            logger.warning(f"Run journal {self.path} was written with a different configuration, starting from scratch.")
+            return
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            record = self._records.setdefault(entry.pop('id'), {'stages': set()})
+            record['stages'].add(entry.pop('stage'))
+            record.update(entry)
+        logger.info(f"Resuming from {self.path} with {len(self._records)} papers.")
+
+    def _prune(self, directory: str, keep: int):
+        journals = sorted(f for f in os.listdir(directory) if f.endswith('.jsonl'))
+        for name in journals[:-keep]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def _write(self, entry: dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def save(self, paper, stage: str):
+        """记录论文在stage阶段的结果"""
+        entry = {'id': paper.cache_key, 'stage': stage}
+        for field in STAGE_FIELDS[stage]:
+            value = getattr(paper, field, None)
+            entry[field] = _encode_tex(value) if field == 'tex' else value
+        with self._lock:
+            self._write(entry)
+
+    def restore(self, paper, stage: str) -> bool:
+        """把已记录的stage阶段结果写回论文，有记录时返回True"""
+        with self._lock:
+            record = self._records.get(paper.cache_key)
+            if record is None or stage not in record['stages']:
+                return False
+            self.resumed[stage] = self.resumed.get(stage, 0) + 1
+        for field in STAGE_FIELDS[stage]:
+            value = record.get(field)
+            setattr(paper, field, _decode_tex(value) if field == 'tex' else value)
+        return True
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def summary(self) -> str:
+        if not self.resumed:
+            return f"Run journal: {self.path}, nothing resumed."
+        parts = ', '.join(f"{stage} {n}" for stage, n in self.resumed.items())
+        return f"Run journal: {self.path}, resumed {parts} papers."
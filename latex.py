@@ -0,0 +1,186 @@
+import re
+import posixpath
+from typing import Optional
+
+# 单遍扫描的LaTeX清洗规则。每个分支都以固定字符开头，re可以据此跳过无关字符，
+# 而不必在每个位置尝试所有分支:
+# esc: "\\"换行(删除)和转义的"\%"(保留)，先于注释匹配，因此"\%"不会被当作注释
+# cite/env/iffalse: 引用、comment/figure/table环境和\iffalse块(删除)，块内跳过转义字符和注释，
+#   注释中的"\end{figure}"或"\fi"不会提前结束块
+# gap/comment: 连续空行和注释行(合并为一个换行)
+# space: 3个及以上的连续空白(合并为一个空格)
+_CLEAN = re.compile(r"""
+    \\(?:
+        (?P<esc>[\\%])
+      | (?P<cite>cite[^\n]?\{[^\n]*?\})
+      | (?P<env>begin\{(?P<name>comment|figure|table)\}(?:[^\\%]++|\\.|%[^\n]*+)*?\\end\{(?P=name)\})
+      | (?P<iffalse>iffalse(?![a-zA-Z])(?:[^\\%]++|\\.|%[^\n]*+)*?\\fi(?![a-zA-Z]))
+    )
+  | ~(?P<tilde_cite>\\cite[^\n]?\{[^\n]*?\})
+  | \n(?P<gap>(?:\n|%[^\n]*(?:\n|\Z))+)
+  | %(?P<comment>[^\n]*(?:\n|\Z)(?:\n|%[^\n]*(?:\n|\Z))*)
+  | [ ](?P<space>[ \t\r\f]{2,})
+  | \t(?P<tab>[ \t\r\f]{2,})
+  | \r(?P<cr>[ \t\r\f]{2,})
+  | \f(?P<ff>[ \t\r\f]{2,})
+""", re.DOTALL | re.VERBOSE)
+_NEWLINE = {'gap', 'comment'}
+_SPACE = {'space', 'tab', 'cr', 'ff'}
+
+
+def clean_tex(content: str) -> str:
+    """一次扫描完成注释、comment/figure/table环境、\\iffalse块、引用、多余换行和空白的清理"""
+    out = []
+    last_newline = False
+    pos = 0
+    for m in _CLEAN.finditer(content):
+        text = content[pos:m.start()]
+        if text:
+            if last_newline and text[0] == '\n':
+                text = text.lstrip('\n')
+            if text:
+                out.append(text)
+                last_newline = text[-1] == '\n'
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'esc':
+            if m.group() == '\\%':
+                out.append('\\%')
+                last_newline = False
+        elif kind in _NEWLINE:
+            if not last_newline and '\n' in m.group():
+                out.append('\n')
+                last_newline = True
+        elif kind in _SPACE:
+            out.append(' ')
+            last_newline = False
+    text = content[pos:]
+    if last_newline and text[:1] == '\n':
+        text = text.lstrip('\n')
+    out.append(text)
+    return ''.join(out)
+
+
+_INCLUDE = re.compile(r'\\(?:input|include|subfile)\{([^{}\n]+?)\}')
+
+
+def _resolve_name(name: str, files: dict[str, str], base: str) -> Optional[str]:
+    name = name.strip()
+    candidates = [name, f"{name}.tex"]
+    if base:
+        candidates += [posixpath.join(base, c) for c in candidates]
+    for c in candidates:
+        c = posixpath.normpath(c)
+        if c in files:
+            return c
+    return None
+
+
+def resolve_includes(files: dict[str, str], main: str) -> str:
+    """展开main中(嵌套)的\\input/\\include/\\subfile。
+
+    每个文件只扫描一次并缓存展开结果，总耗时与展开后的文档长度成线性关系，
+    循环引用和找不到的文件会被替换为空串。
+    """
+    resolved: dict[str, str] = {}
+    visiting: set[str] = set()
+    base = posixpath.dirname(main)
+
+    def expand(name: str) -> str:
+        if name in resolved:
+            return resolved[name]
+        if name in visiting:
+            return ''
+        visiting.add(name)
+
+        def replace(m: re.Match) -> str:
+            child = _resolve_name(m.group(1), files, base)
+            return '' if child is None else expand(child)
+
+        resolved[name] = _INCLUDE.sub(replace, files[name])
+        visiting.discard(name)
+        return resolved[name]
+
+    return expand(main)
+
+
+# 建立结构索引所需的全部标记，一次扫描得到
+_MARKER = re.compile(r"""
+    \\(?:
+        (?P<section>section)\*?\s*(?:\[[^\]\n]*\])?\s*\{(?P<title>[^{}]*(?:\{[^{}]*\}[^{}]*)*)\}
+      | (?P<author>author)
+      | (?P<maketitle>maketitle)
+      | (?P<abstract_begin>begin\{abstract\})
+      | (?P<abstract_end>end\{abstract\})
+      | (?P<appendix>appendix)
+      | (?P<bibliography>bibliography|printbibliography)
+      | (?P<document_end>end\{document\})
+    )
+""", re.VERBOSE)
+_TITLE_COMMAND = re.compile(r'\\(?:label|ref)\{[^{}]*\}|\\[a-zA-Z]+\*?|[{}]')
+_TITLE_NUMBER = re.compile(r'^(?:[0-9]+(?:\.[0-9]+)*|[ivxlc]+|[a-z])[.):]\s+|^[0-9]+\s+')
+
+
+def _normalize_title(title: str) -> str:
+    title = _TITLE_COMMAND.sub(' ', title).lower()
+    title = ' '.join(title.split())
+    return _TITLE_NUMBER.sub('', title)
+
+
+class TexIndex:
+    """一篇论文的结构索引：各section、作者信息和摘要在全文中的偏移。
+
+    建立时只扫描一次全文，之后各个提取器直接按偏移切片。
+    """
+    def __init__(self, content: str):
+        self.content = content
+        self.sections: list[tuple[str, int, int]] = []
+        self.author: Optional[tuple[int, int]] = None
+        self.abstract: Optional[tuple[int, int]] = None
+        author_start = None
+        abstract_start = None
+        open_section = None
+        for m in _MARKER.finditer(content):
+            kind = m.lastgroup
+            if kind == 'title':
+                kind = 'section'
+            if kind in ('section', 'appendix', 'bibliography', 'document_end') and open_section is not None:
+                self.sections.append((open_section[0], open_section[1], m.start()))
+                open_section = None
+            if kind == 'section':
+                open_section = (_normalize_title(m.group('title')), m.start())
+            elif kind == 'author' and author_start is None:
+                author_start = m.start()
+            elif kind == 'maketitle' and author_start is not None and self.author is None:
+                self.author = (author_start, m.end())
+            elif kind == 'abstract_begin' and abstract_start is None:
+                abstract_start = m.end()
+            elif kind == 'abstract_end' and abstract_start is not None and self.abstract is None:
+                self.abstract = (abstract_start, m.start())
+        if open_section is not None:
+            self.sections.append((open_section[0], open_section[1], len(content)))
+
+    def section(self, *keywords: str) -> str:
+        """返回第一个标题包含任一关键词的section(含标题)，找不到时返回空串"""
+        for title, start, end in self.sections:
+            if any(k in title for k in keywords):
+                return self.content[start:end]
+        return ''
+
+    @property
+    def front_matter(self) -> str:
+        """第一个section之前的内容，包括导言区、标题、作者信息和摘要"""
+        end = self.sections[0][1] if self.sections else len(self.content)
+        return self.content[:end]
+
+    @property
+    def author_region(self) -> Optional[str]:
+        if self.author is None:
+            return None
+        return self.content[self.author[0]:self.author[1]]
+
+    @property
+    def abstract_text(self) -> Optional[str]:
+        if self.abstract is None:
+            return None
+        return self.content[self.abstract[0]:self.abstract[1]]
@@ -1,14 +1,27 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 from typing import Optional
+from loguru import logger
+from llm_cache import LLMCache
+from rate_limit import RateLimiter, parse_retry_after, backoff
 
 GLOBAL_LLM = None
 
 class LLM:
-    def __init__(self, api_key: str, base_url: str, model_name: str):
-        self.max_retries = 3
-        self.wait_time = 0.2 # 等待时间（秒）
+    def __init__(self, api_key: str, base_url: str, model_name: str, cache: Optional[LLMCache] = None, concurrency: int = 5,
+                 requests_per_minute: float = 0, tokens_per_minute: float = 0, max_retries: int = 5, timeout: float = 120.0, json_mode: bool = False):
+        self.max_retries = max_retries
+        self.json_mode = json_mode
+        self.timeout = timeout
+        self.cache = cache
+        self.concurrency = concurrency
+        # 所有调用LLM的阶段共享同一个连接池和限流器
+        self.limiter = RateLimiter(concurrency, requests_per_minute, tokens_per_minute)
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
+        self._session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=concurrency))
         self.model_name = model_name
         self.base_url = base_url + '/v1/chat/completions'
         self._api_key = api_key
@@ -18,37 +31,85 @@ class LLM:
         }
 
 
-    def generate(self, messages: list[dict]) -> Optional[str]:
+    def generate(self, messages: list[dict], use_cache: bool = True, json_object: bool = False) -> Optional[str]:
+        """json_object为True且服务端支持JSON mode时，要求模型直接返回JSON对象"""
         data = {
             'model': self.model_name,
-            'apiKey': self._api_key,
             "messages": messages,
             "temperature": 0.0
         }
-        retry_count = 0
-        while retry_count < self.max_retries:
-            try:
-                response = requests.post(self.base_url, headers=self._headers, data=json.dumps(data))
-                response.raise_for_status()  # 如果请求失败，将抛出HTTPError异常
-                response_data = response.json()
-                assistant_message = response_data.get('choices', [{}])[0].get('message', {}).get('content')
-                return assistant_message
-            except requests.exceptions.HTTPError as e:
-                if response.status_code == 429:
-                    print(f"遇到429错误，等待{self.wait_time}秒后重试...")
-                    time.sleep(self.wait_time)
-                    retry_count += 1
-                    if retry_count >= self.max_retries:
-                        print("达到最大重试次数，退出对话。")
-                        return None
-                else:
-                    print(f"请求失败: {e}")
+        if json_object and self.json_mode:
+            data['response_format'] = {'type': 'json_object'}
+        key = None
+        if self.cache is not None and use_cache:
+            key = LLMCache.make_key(data)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        res = self._request(dict(data, apiKey=self._api_key))
+        if key is not None and res is not None:
+            self.cache.put(key, self.model_name, res)
+        return res
+
+    def _request(self, data: dict) -> Optional[str]:
+        body = json.dumps(data)
+        # 粗略按4个字符一个token估计，响应返回usage后再修正
+        estimated_tokens = len(body) / 4
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.limiter.record('retries')
+            self.limiter.acquire(estimated_tokens)
+            retry_after = None
+            with self.limiter.concurrency:
+                start = time.monotonic()
+                try:
+                    response = self._session.post(self.base_url, headers=self._headers, data=body, timeout=self.timeout)
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                    logger.debug(f"LLM request failed: {e}")
+                    self.limiter.record('network_errors')
+                    self.limiter.concurrency.on_congestion()
+                    response = None
+            if response is not None:
+                if response.status_code == 429 or response.status_code >= 500:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if response.status_code == 429:
+                        self.limiter.record('throttled')
+                        self.limiter.concurrency.on_congestion()
+                    else:
+                        self.limiter.record('server_errors')
+                    logger.debug(f"LLM request got HTTP {response.status_code}, attempt {attempt + 1}/{self.max_retries + 1}.")
+                elif not response.ok:
+                    logger.warning(f"LLM request failed: HTTP {response.status_code} {response.text[:200]}")
+                    self.limiter.record('failed')
                     return None
+                else:
+                    self.limiter.concurrency.on_success(time.monotonic() - start)
+                    try:
+                        response_data = response.json()
+                    except ValueError as e:
+                        logger.warning(f"LLM response is not valid JSON: {e}")
+                        self.limiter.record('failed')
+                        return None
+                    # 部分服务商返回"usage": null或空的choices
+                    choices = response_data.get('choices') if isinstance(response_data, dict) else None
+                    if not choices or not isinstance(choices[0], dict):
+                        logger.warning(f"LLM response has no choices: {response.text[:200]}")
+                        self.limiter.record('failed')
+                        return None
+                    self.limiter.settle_tokens(estimated_tokens, (response_data.get('usage') or {}).get('total_tokens'))
+                    self.limiter.record('succeeded')
+                    return (choices[0].get('message') or {}).get('content')
+            if attempt < self.max_retries:
+                time.sleep(retry_after if retry_after is not None else backoff(attempt))
+        logger.warning(f"LLM request failed after {self.max_retries + 1} attempts.")
+        self.limiter.record('failed')
         return None
 
-def set_global_llm(api_key: str, base_url: str, model: str):
+def set_global_llm(api_key: str, base_url: str, model: str, cache: Optional[LLMCache] = None, concurrency: int = 5,
+                   requests_per_minute: float = 0, tokens_per_minute: float = 0, max_retries: int = 5, timeout: float = 120.0, json_mode: bool = False):
     global GLOBAL_LLM
-    GLOBAL_LLM = LLM(api_key=api_key, base_url=base_url, model_name=model)
+    GLOBAL_LLM = LLM(api_key=api_key, base_url=base_url, model_name=model, cache=cache, concurrency=concurrency,
+                     requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute, max_retries=max_retries, timeout=timeout, json_mode=json_mode)
 
 def get_llm() -> LLM:
     if GLOBAL_LLM is None:
@@ -1,48 +1,199 @@
-from construct_email import render_email, send_email
+from construct_email import render_email, process_paper
 import arxiv
 import argparse
+import datetime
 import os
 import sys
 from dotenv import load_dotenv
-from tqdm import tqdm
+from typing import Iterator, Optional, Union
 from loguru import logger
 from paper import ArxivPaper
-from llm import set_global_llm
+from llm import set_global_llm, get_llm
+from llm_cache import LLMCache
+import structured
+import prompt
+from source import SourceFetcher
+from pipeline import Pipeline, Stage, TopK
+from batch import generate_base_properties_batched
+from affiliation import set_global_scorer, get_scorer, extract_summary, DEFAULT_CONFIG
+from source_cache import set_global_source_cache, get_source_cache
+from prefilter import PreFilter, Metadata, parse_weights
+from journal import RunJournal
+from seen import SeenIndex
+from code_links import CodeLinkResolver
+from site_output import SiteWriter
+from delivery import SMTPPool, parse_receivers
+from profiles import ProfileSet, load_profiles
+from history import HistoryStore
+from search_index import SEARCH_COLUMNS
+from feed import entry_id
 import feedparser
 import shutil
-from concurrent.futures import ThreadPoolExecutor
-import concurrent.futures
 
 load_dotenv(override=True)
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 
-def get_arxiv_paper(query:str, debug:bool=False) -> list[ArxivPaper]:
+def iter_api_papers(client:arxiv.Client, paper_ids:list[str]) -> Iterator[ArxivPaper]:
+    """按50个id一批从arXiv API获取论文"""
+    for i in range(0,len(paper_ids),50):
+        search = arxiv.Search(id_list=paper_ids[i:i+50])
+        for p in client.results(search):
+            yield ArxivPaper(p)
+
+
+def iter_feed_papers(client:arxiv.Client, entries:list) -> Iterator[ArxivPaper]:
+    """直接用RSS条目构造论文，只为缺少字段的条目请求arXiv API，输出顺序与RSS一致"""
+    papers = [ArxivPaper.from_feed_entry(e) for e in entries]
+    missing = [entry_id(e) for e, p in zip(entries, papers) if p is None]
+    if missing:
+        logger.info(f"Retrieving {len(missing)}/{len(entries)} arxiv papers with incomplete feed metadata from the API.")
+    fetched = {}
+    requested = 0
+    for e, paper in zip(entries, papers):
+        if paper is None:
+            # 轮到缺字段的论文时才请求API，一次取之后50篇缺字段的论文，之前的论文不必等待
+            if requested < len(missing) and entry_id(e) not in fetched:
+                fetched.update((p.arxiv_id, p) for p in iter_api_papers(client, missing[requested:requested + 50]))
+                requested += 50
+            paper = fetched.pop(entry_id(e), None)
+            if paper is None:
+                logger.warning(f"Failed to retrieve {entry_id(e)} from the arXiv API.")
+                continue
+        yield paper
+
+
+def iter_arxiv_paper(query:str, debug:bool=False, prefilter:Optional[Union[PreFilter, ProfileSet]]=None, feed_metadata:bool=True,
+                     seen:Optional[SeenIndex]=None, announce_types:tuple[str, ...]=('new',)) -> Iterator[ArxivPaper]:
+    """获取论文并逐篇交给流水线。
+
+    只保留announce_types中的条目，给出seen时跳过之前已处理过的论文。
+    给出prefilter时再用RSS中的标题、摘要和分类筛选，未通过的论文不请求API，也不下载源码。多用户时prefilter为ProfileSet，保留任一用户需要的论文。
+    feed_metadata为True时直接用RSS中的元数据构造论文，否则全部通过arXiv API获取
+    """
     client = arxiv.Client(num_retries=10,delay_seconds=10)
     feed = feedparser.parse(f"https://rss.arxiv.org/atom/{query}")
     if 'Feed error for query' in feed.feed.title:
         raise Exception(f"Invalid ARXIV_QUERY: {query}.")
     if not debug:
-        papers = []
-        all_paper_ids = [i.id.removeprefix("oai:arXiv.org:") for i in feed.entries if i.arxiv_announce_type == 'new']
-        bar = tqdm(total=len(all_paper_ids),desc="Retrieving Arxiv papers")
-        for i in range(0,len(all_paper_ids),50):
-            search = arxiv.Search(id_list=all_paper_ids[i:i+50])
-            batch = [ArxivPaper(p) for p in client.results(search)]
-            bar.update(len(batch))
-            papers.extend(batch)
-        bar.close()
+        entries = [i for i in feed.entries if i.get('arxiv_announce_type') in announce_types]
+        if seen is not None:
+            entries = seen.select(entries)
+            logger.info(seen.summary())
+        if prefilter is not None:
+            entries = prefilter.select(entries, Metadata.from_entry)
+            logger.info(prefilter.summary())
+        logger.info(f"Retrieving {len(entries)} arxiv papers.")
+        if feed_metadata:
+            yield from iter_feed_papers(client, entries)
+        else:
+            yield from iter_api_papers(client, [i.id.removeprefix("oai:arXiv.org:") for i in entries])
 
     else:
         logger.debug("Retrieve 15 arxiv papers regardless of the date.")
-        search = arxiv.Search(query='cat:cs.AI', sort_by=arxiv.SortCriterion.SubmittedDate)
-        papers = []
-        for i in client.results(search):
-            papers.append(ArxivPaper(i))
-            if len(papers) == 15:
-                break
+        search = arxiv.Search(query='cat:cs.AI', sort_by=arxiv.SortCriterion.SubmittedDate, max_results=15)
+        results = list(client.results(search))
+        if prefilter is not None:
+            results = prefilter.select(results, Metadata.from_result)
+            logger.debug(prefilter.summary())
+        for i in results:
+            yield ArxivPaper(i)
+
+
+def build_stages(args, fetcher: SourceFetcher, topk: Union[TopK, ProfileSet], blocks: Optional[dict[str, str]], journal: Optional[RunJournal] = None,
+                 code_links: Optional[CodeLinkResolver] = None) -> list[Stage]:
+    """fetch -> parse -> affiliations/score -> top-K -> code links -> TLDR -> render，各级有独立的线程池。
+
+    没有给出code_links时跳过代码链接的查询。blocks为None时不渲染(多用户时各用户的分数不同，流水线结束后分别渲染)。给出journal时每完成一个阶段就记录论文的结果，journal中已有记录的阶段直接恢复结果，不再重复下载和请求LLM
+    """
+    members = {}
+
+    def restore(paper: ArxivPaper, stage: str) -> bool:
+        return journal is not None and journal.restore(paper, stage)
+
+    def save(paper: ArxivPaper, stage: str):
+        if journal is not None:
+            journal.save(paper, stage)
+
+    def fetch(paper: ArxivPaper) -> ArxivPaper:
+        if restore(paper, 'parse'):
+            paper.post_init()
+        elif not paper.load_cached_source():
+            members[paper.arxiv_id] = fetcher.fetch_members(paper)
+        return paper
+
+    def parse(paper: ArxivPaper) -> ArxivPaper:
+        if paper.arxiv_id in members:
+            paper.load_source(members.pop(paper.arxiv_id))
+            # 启用源码缓存时tex已经持久化，恢复时从缓存读取即可，日志中不再重复保存
+            if get_source_cache() is None:
+                save(paper, 'parse')
+        return paper
+
+    def restore_affiliations(paper: ArxivPaper) -> bool:
+        if not restore(paper, 'affiliations'):
+            return False
+        # 分数在本地计算，按当前的偏好表重新打分
+        paper.score = paper.get_score()
+        return True
+
+    def base_properties(papers: list[ArxivPaper]) -> list[ArxivPaper]:
+        todo = [p for p in papers if not restore_affiliations(p)]
+        generate_base_properties_batched(todo, max_batch_size=args.llm_batch_size, token_budget=args.llm_batch_tokens, max_workers=1, progress=False)
+        for p in todo:
+            save(p, 'affiliations')
+        return papers
+
+    def base_property(paper: ArxivPaper) -> ArxivPaper:
+        if not restore_affiliations(paper):
+            paper.generate_base_properties()
+            save(paper, 'affiliations')
+        return paper
 
-    return papers
+    def select(paper: ArxivPaper) -> Optional[ArxivPaper]:
+        return paper if topk.offer(paper) else None
+
+    def extended_property(paper: ArxivPaper) -> Optional[ArxivPaper]:
+        # 排队期间已被挤出前K名的论文不再生成TLDR
+        if paper not in topk:
+            return None
+        if not restore(paper, 'tldr'):
+            paper.generate_extended_property()
+            if getattr(paper, 'tldr', None) is not None:
+                save(paper, 'tldr')
+        return paper
+
+    def code_link(paper: ArxivPaper) -> Optional[ArxivPaper]:
+        if paper not in topk:
+            return None
+        if not restore(paper, 'code_url'):
+            resolved, paper.code_url = code_links.lookup(paper.arxiv_id)
+            # 查询出错时不记录，恢复运行时重新查询
+            if resolved:
+                save(paper, 'code_url')
+        return paper
+
+    def render(paper: ArxivPaper) -> None:
+        if paper in topk:
+            blocks[paper.arxiv_id] = process_paper(paper)
+
+    if args.llm_batch_size > 1:
+        scoring = Stage('affiliations', base_properties, workers=args.llm_concurrency, batch_size=args.llm_batch_size)
+    else:
+        scoring = Stage('affiliations', base_property, workers=args.llm_concurrency)
+    stages = [
+        Stage('fetch', fetch, workers=args.download_workers),
+        Stage('parse', parse, workers=2),
+        scoring,
+        Stage('top-k', select),
+    ]
+    if code_links is not None:
+        stages.append(Stage('code-links', code_link, workers=args.code_workers))
+    stages.append(Stage('tldr', extended_property, workers=args.llm_concurrency))
+    # 渲染只做字符串拼接，一个线程就够了
+    if blocks is not None:
+        stages.append(Stage('render', render))
+    return stages
 
 
 
@@ -76,7 +227,7 @@ if __name__ == '__main__':
     add_argument('--smtp_server', type=str, help='SMTP server')
     add_argument('--smtp_port', type=int, help='SMTP port')
     add_argument('--sender', type=str, help='Sender email address')
-    add_argument('--receiver', type=str, help='Receiver email address')
+    add_argument('--receiver', type=str, help='Receiver email addresses, separated by commas')
     add_argument('--sender_password', type=str, help='Sender email password')
     add_argument(
         "--openai_api_key",
@@ -96,6 +247,46 @@ if __name__ == '__main__':
         help="LLM Model Name",
         default="gpt-4o",
     )
+    add_argument('--download_workers', type=int, help='Number of concurrent source downloads', default=8)
+    add_argument('--download_per_host', type=int, help='Maximum concurrent source downloads per host', default=4)
+    add_argument('--download_interval', type=float, help='Minimum seconds between two downloads from the same host', default=0.0)
+    add_argument('--download_timeout', type=float, help='Timeout in seconds for downloading the source of one paper', default=60.0)
+    add_argument('--source_max_mb', type=float, help='Skip papers whose source archive is larger than this (MB)', default=50.0)
+    add_argument('--source_max_unpacked_mb', type=float, help='Skip papers whose unpacked source is larger than this (MB)', default=200.0)
+    add_argument('--cache_dir', type=str, help='Directory of the persistent caches', default='.cache')
+    add_argument('--source_cache_mb', type=int, help='Size limit of the paper source cache in MB, 0 to disable it', default=1024)
+    add_argument('--llm_concurrency', type=int, help='Maximum number of concurrent LLM requests', default=5)
+    add_argument('--llm_rpm', type=float, help='LLM requests per minute allowed by the provider, 0 for unlimited', default=0)
+    add_argument('--llm_tpm', type=float, help='LLM tokens per minute allowed by the provider, 0 for unlimited', default=0)
+    add_argument('--llm_max_retries', type=int, help='Retries of one LLM request on throttling, timeouts and server errors', default=5)
+    add_argument('--llm_timeout', type=float, help='Timeout in seconds of one LLM request', default=120.0)
+    add_argument('--llm_json_mode', type=bool, help='Request JSON objects via response_format if the API supports it', default=False)
+    add_argument('--llm_batch_size', type=int, help='Number of papers packed into one affiliation/score request, 1 to disable batching', default=8)
+    add_argument('--llm_batch_tokens', type=int, help='Token budget of the author information packed into one batched request', default=6000)
+    add_argument('--affiliation_config', type=str, help='JSON file of the preferred affiliations used for scoring', default=DEFAULT_CONFIG)
+    add_argument('--affiliation_tie_breaker', type=bool, help='Ask the LLM to choose when an affiliation fuzzily matches several preferred institutions', default=False)
+    add_argument('--announce_types', type=str, help='Comma separated announce types of the feed entries to process: new, cross, replace, replace-cross', default='new')
+    add_argument('--no_seen_index', type=bool, help='Process papers again even if an earlier run has processed them', default=False)
+    add_argument('--no_feed_metadata', type=bool, help='Retrieve all paper metadata from the arXiv API instead of the RSS feed', default=False)
+    add_argument('--filter_query', type=str, help='Boolean keyword query on title/abstract/authors/categories that papers must match before downloading, e.g. (llm OR "language model") -survey', default=None)
+    add_argument('--filter_include', type=str, help='Comma separated terms, papers must mention at least one in the title or abstract', default=None)
+    add_argument('--filter_exclude', type=str, help='Comma separated terms, papers mentioning any of them in the title or abstract are skipped', default=None)
+    add_argument('--filter_category_weights', type=str, help='Pre-score weights of arXiv categories, e.g. cs.CL:2,cs.LG:1', default=None)
+    add_argument('--filter_top_n', type=int, help='Only process the top N papers by pre-score, 0 for all papers passing the filter', default=0)
+    add_argument('--llm_cache_ttl', type=float, help='Hours a cached LLM response stays valid', default=168.0)
+    add_argument('--llm_cache_size', type=int, help='Maximum number of cached LLM responses', default=100000)
+    add_argument('--no_llm_cache', type=bool, help='Bypass the LLM response cache', default=False)
+    add_argument('--code_workers', type=int, help='Maximum number of concurrent paperswithcode lookups', default=8)
+    add_argument('--code_cache_ttl', type=float, help='Hours a cached code link stays valid', default=168.0)
+    add_argument('--code_negative_cache_ttl', type=float, help='Hours a cached "no code found" result stays valid', default=24.0)
+    add_argument('--site_dir', type=str, help='Write the web pages (index.html and archive/<date>.html) with shared static assets and precompressed copies to this directory', default=None)
+    add_argument('--smtp_connections', type=int, help='Maximum number of SMTP connections used to send the emails in parallel', default=2)
+    add_argument('--smtp_max_retries', type=int, help='Retries of one email on temporary SMTP errors and dropped connections', default=3)
+    add_argument('--smtp_interval', type=float, help='Minimum seconds between two emails, for providers that limit the sending rate', default=0.0)
+    add_argument('--profiles', type=str, help='JSON file (or inline JSON) of user profiles sharing one run, each with its own receiver, arxiv_query, affiliation_config, max_paper_num and filter_* settings', default=None)
+    add_argument('--no_history', type=bool, help='Do not record the recommended papers in the columnar history store', default=False)
+    add_argument('--search_days', type=int, help='Days of history covered by the search index of the web pages, 0 to disable it', default=365)
+    add_argument('--resume', type=bool, help="Resume today's interrupted run, skipping the downloads and LLM requests it has finished", default=False)
     parser.add_argument('--debug', action='store_true', help='Debug mode')
     args = parser.parse_args()
     if args.debug:
@@ -106,38 +297,131 @@ if __name__ == '__main__':
         logger.remove()
         logger.add(sys.stdout, level="INFO")
 
-    papers = get_arxiv_paper(args.arxiv_query, args.debug)
-    if len(papers) == 0:
+    logger.info("Using OpenAI API as global LLM.")
+    llm_cache = None
+    if not args.no_llm_cache:
+        llm_cache = LLMCache(os.path.join(args.cache_dir, 'llm.sqlite'), ttl=args.llm_cache_ttl * 3600, max_entries=args.llm_cache_size)
+    set_global_llm(api_key=args.openai_api_key, base_url=args.openai_api_base, model=args.model_name, cache=llm_cache, concurrency=args.llm_concurrency,
+                   requests_per_minute=args.llm_rpm, tokens_per_minute=args.llm_tpm, max_retries=args.llm_max_retries, timeout=args.llm_timeout,
+                   json_mode=args.llm_json_mode)
+    if args.source_cache_mb > 0:
+        set_global_source_cache(os.path.join(args.cache_dir, 'sources'), args.source_cache_mb)
+    set_global_scorer(args.affiliation_config, tie_breaker=args.affiliation_tie_breaker)
+    prefilter = PreFilter(query=args.filter_query, include=(args.filter_include or '').split(','), exclude=(args.filter_exclude or '').split(','),
+                          category_weights=parse_weights(args.filter_category_weights), top_n=args.filter_top_n)
+    fetcher = SourceFetcher(max_workers=args.download_workers, max_per_host=args.download_per_host,
+                            timeout=args.download_timeout, min_interval=args.download_interval,
+                            max_download_mb=args.source_max_mb, max_unpacked_mb=args.source_max_unpacked_mb)
+
+    code_links = CodeLinkResolver(os.path.join(args.cache_dir, 'code_links.sqlite'), ttl=args.code_cache_ttl * 3600,
+                                  negative_ttl=args.code_negative_cache_ttl * 3600, max_workers=args.code_workers)
+
+    # 调试模式每次都取同样的论文，不使用已处理论文的索引
+    seen = None if args.no_seen_index or args.debug else SeenIndex(os.path.join(args.cache_dir, 'seen.sqlite'))
+    announce_types = tuple(t.strip() for t in args.announce_types.split(',') if t.strip())
+
+    # 同分的论文按arXiv列表中的顺序排列，与整体排序的结果一致
+    order = {}
+    profiles = None
+    query = args.arxiv_query
+    if args.profiles:
+        # 多个用户共用一次运行，合并的查询只处理一次，每个用户单独排序
+        profiles = ProfileSet.from_config(load_profiles(args.profiles), args, order, announce_types)
+        query = profiles.query
+        logger.info(f"Serving {len(profiles.profiles)} profiles with the merged query {query}.")
+        topk = profiles
+        blocks = None
+    else:
+        topk = TopK(args.max_paper_num, key=lambda p: (p.score, -order[p.arxiv_id]))
+        blocks = {}
+
+    # 模型或查询变化后，之前记录的TLDR和论文列表不再适用
+    journal = RunJournal(os.path.join(args.cache_dir, 'runs'), fingerprint=f"{args.model_name}|{query}|{args.debug}", resume=args.resume)
+
+    def source() -> Iterator[ArxivPaper]:
+        selector = profiles if profiles is not None else prefilter if prefilter.active else None
+        papers = iter_arxiv_paper(query, args.debug, selector, not args.no_feed_metadata, seen, announce_types)
+        for i, paper in enumerate(papers):
+            order[paper.arxiv_id] = i
+            if seen is not None:
+                seen.add(paper)
+            yield paper
+
+    pipeline = Pipeline(build_stages(args, fetcher, topk, blocks, journal, code_links))
+    total = pipeline.run(source())
+    journal.close()
+    code_links.close()
+    if get_source_cache() is not None:
+        get_source_cache().flush()
+
+    # (名称, 收件人, 论文, 各论文显示的分数)，单用户时分数就是paper.score
+    if profiles is None:
+        digests = [('', parse_receivers(args.receiver), topk.results(), None)]
+    else:
+        digests = [(p.name, p.receivers, p.results(), p.scores) for p in profiles.profiles]
+
+    if total == 0:
         logger.info("No new papers found. Yesterday maybe a holiday and no one submit their work :). If this is not the case, please check the ARXIV_QUERY.")
         if not args.send_empty:
           shutil.copyfile('./assets/enjoy.html', 'index.html')
           exit(0)
     else:
-        logger.info("Using OpenAI API as global LLM.")
-        set_global_llm(api_key=args.openai_api_key, base_url=args.openai_api_base, model=args.model_name)
-    
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(paper.generate_base_properties): paper for paper in papers}
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Generating paper properties"):
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Error generating properties for {futures[future]}: {e}")
-    papers.sort(key=lambda x: x.score, reverse=True)
-    if args.max_paper_num != -1:
-        papers = papers[:args.max_paper_num]
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(paper.generate_extended_property): paper for paper in papers}
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Generating extended properties"):
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Error generating extended properties for {futures[future]}: {e}")
-
-    html = render_email(papers)
-    with open('index.html', 'w') as f:
-        f.write(html)
-    logger.info("Sending email...")
-    send_email(args.sender, args.receiver, args.sender_password, args.smtp_server, args.smtp_port, html)
+        logger.info(pipeline.summary())
+        for name, _, papers, _ in digests:
+            logger.info(f"Selected {len(papers)}/{total} papers" + (f" for {name}" if name else '') + '.')
+        logger.info(f"{topk.evicted} papers left the top-K after being selected.")
+        logger.info(get_llm().limiter.summary())
+        logger.info(structured.summary())
+        logger.info(prompt.summary())
+        logger.info(extract_summary())
+        logger.info(get_scorer().summary())
+        logger.info(code_links.summary())
+        logger.info(journal.summary())
+    if get_llm().cache is not None:
+        stats = get_llm().cache.stats()
+        logger.info(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries.")
+        get_llm().cache.close()
+
+    # 调试模式的论文不是当天的推荐，不记录
+    history = None if args.no_history or args.debug else HistoryStore(os.path.join(args.cache_dir, 'history.lance'))
+    messages = []
+    for i, (name, receivers, papers, scores) in enumerate(digests):
+        if history is not None:
+            history.append(papers, profile=name, scores=scores)
+        if profiles is not None:
+            blocks = {p.arxiv_id: process_paper(p, score=scores[p.arxiv_id]) for p in papers}
+        html = render_email(papers, blocks)
+        # 多用户时每个用户的网页写到site_dir下以名称命名的子目录，没有site_dir时index.html只保存第一个用户的结果
+        if args.site_dir:
+            search = history is not None and args.search_days > 0
+            site = SiteWriter(os.path.join(args.site_dir, name) if name else args.site_dir, search=search)
+            site.write_day(papers, scores=scores)
+            logger.info(site.summary())
+            if search:
+                since = datetime.date.today() - datetime.timedelta(days=args.search_days - 1)
+                rows = history.scan(start=since, profile=name, columns=SEARCH_COLUMNS).to_pylist()
+                manifest = site.write_search_index(rows)
+                logger.info(f"Search index: {manifest['docs']} papers since {since}, {manifest['terms']} terms in "
+                            f"{len(manifest['term_files'])} shards, {manifest['bytes'] / 1024:.1f}KB.")
+        elif i == 0:
+            with open('index.html', 'w') as f:
+                f.write(html)
+        if papers or args.send_empty:
+            messages.extend((receiver, html) for receiver in receivers)
+    if history is not None:
+        logger.info(history.summary())
+    logger.info(f"Sending {len(messages)} emails...")
+    smtp = SMTPPool(args.smtp_server, args.smtp_port, args.sender, args.sender_password, connections=args.smtp_connections,
+                    max_retries=args.smtp_max_retries, interval=args.smtp_interval)
+    failures = smtp.send_all(messages)
+    smtp.close()
+    logger.info(smtp.summary())
+    # 有收件人没有收到时不记录已处理的论文，重新运行后会再发给所有收件人
+    if failures:
+        raise RuntimeError(f"Failed to send the email to {', '.join(dict.fromkeys(messages[i][0] for i in failures))}.")
     logger.success("Email sent successfully! If you don't receive the email, please check the configuration and the junk box.")
+    # 邮件发出后才把本次的论文记为已处理，中途失败时重新运行仍会处理它们
+    if seen is not None:
+        seen.commit()
+        seen.close()
 
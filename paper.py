@@ -1,65 +1,119 @@
 from typing import Optional
 from functools import cached_property
-from tempfile import TemporaryDirectory
 import arxiv
-import tarfile
 import re
 from llm import get_llm
-import requests
-from requests.adapters import HTTPAdapter, Retry
+from affiliation import get_scorer, extract_affiliations
+from feed import entry_versioned_id, entry_abstract, entry_authors, entry_categories
+from source_cache import get_source_cache
+from source_reader import read_source, pack_members
+from latex import clean_tex, resolve_includes, TexIndex
+from structured import parse_or_repair_dict, parse_or_repair_list
+from prompt import build_prompt
 from loguru import logger
-import tiktoken
-from contextlib import ExitStack
-from ast import literal_eval
 
+# 解析结果格式发生变化时递增，使缓存中旧格式的tex失效
+TEX_CACHE_VERSION = 4
+
+# 单个请求中用户消息的token上限
+PROMPT_MAX_TOKENS = 4000
+
+TLDR_PROMPT = """Given the title, abstract, introduction and the conclusion (if any) of a paper in latex format, generate a one-sentence TLDR summary in Chinese. Additionally, propose one relevant search topic (e.g. LLM Position Embedding) related to the paper's category in English, __CATEGORY__.
+
+\\title{__TITLE__}
+\\begin{abstract}__ABSTRACT__\\end{abstract}
+__INTRODUCTION__
+__CONCLUSION__
+
+Respond with a JSON object with 'tldr' and 'topic' as keys, i.e., {"tldr": "...", "topic": "..."}. Only return the JSON object. Do not return any intermediate results."""
+
+# TLDR提示词中各部分分到的预算比例，标题和摘要较短，通常完整保留，主要截断引言和结论
+TLDR_SECTION_WEIGHTS = {'TITLE': 1.0, 'CATEGORY': 1.0, 'ABSTRACT': 2.0, 'INTRODUCTION': 4.0, 'CONCLUSION': 2.0}
+
+AFFILIATION_PROMPT = "Given the author information of a paper in latex format, extract the affiliations of the authors in a python list format, which is sorted by the author order. If there is no affiliation found, return an empty list '[]'. Following is the author information:\n__AUTHOR__"
+
+AFFILIATION_SYSTEM_PROMPT = "You are an assistant who perfectly extracts affiliations of authors from the author information of a paper. You should return a python list of affiliations sorted by the author order, like ['TsingHua University','Peking University']. If an affiliation is consisted of multi-level affiliations, like 'Department of Computer Science, TsingHua University', you should return the top-level affiliation 'TsingHua University' only. Do not contain duplicated affiliations. If there is no affiliation found, you should return an empty list [ ]. You should only return the final list of affiliations, and do not return any intermediate results."
 
 
 
 class ArxivPaper:
     def __init__(self,paper:arxiv.Result):
         self._paper = paper
-        self.introduction: str = ""
-        self.conclusion: str = ""
         self.tex: Optional[dict[str,str]] = None
+        self.index: Optional[TexIndex] = None
+        self.affiliations: Optional[list[str]] = None
+        self.score: float = 1.0
+        # 由流水线中的code-links阶段填充，渲染时不再发起网络请求
+        self.code_url: Optional[str] = None
+
+    @classmethod
+    def from_feed_entry(cls, entry) -> Optional['ArxivPaper']:
+        """直接用RSS条目中的元数据构造，不请求arXiv API。缺少必需字段时返回None，由调用方改用API获取"""
+        short_id = entry_versioned_id(entry)
+        title = ' '.join(entry.get('title', '').split())
+        abstract = entry_abstract(entry)
+        authors = entry_authors(entry)
+        categories = entry_categories(entry)
+        if short_id is None or not title or not abstract or not authors or not categories:
+            return None
+        return cls(arxiv.Result(
+            entry_id=f'http://arxiv.org/abs/{short_id}',
+            title=title,
+            summary=abstract,
+            authors=[arxiv.Result.Author(a) for a in authors],
+            primary_category=categories[0],
+            categories=categories,
+            links=[arxiv.Result.Link(f'http://arxiv.org/pdf/{short_id}', title='pdf')],
+        ))
+
+    def load_source(self, members:Optional[dict[str,bytes]]):
+        """解析已读取的源码文件，源码的下载和解包由source.py中的SourceFetcher负责"""
+        self.tex = self.fetch_tex(members)
+        cache = get_source_cache()
+        if cache is not None and members is not None:
+            cache.put_archive(self.cache_key, pack_members(members))
+            if self.tex is not None:
+                cache.put_tex(self.cache_key, self.tex, TEX_CACHE_VERSION)
+        self.post_init()
+
+    def load_cached_source(self) -> bool:
+        """从源码缓存中加载，命中时返回True"""
+        cache = get_source_cache()
+        if cache is None:
+            return False
+        tex = cache.get_tex(self.cache_key, TEX_CACHE_VERSION)
+        if tex is None:
+            archive = cache.get_archive(self.cache_key)
+            if archive is None:
+                return False
+            tex = self.fetch_tex(read_source([archive]))
+            if tex is not None:
+                cache.put_tex(self.cache_key, tex, TEX_CACHE_VERSION)
+        self.tex = tex
         self.post_init()
+        return True
     
     def post_init(self):
-        self.tex = self.fetch_tex()
+        self.index = None
         if self.tex is not None:
             content = self.tex.get("all")
             if content is None:
-                content = "\n".join(self.tex.values())
-            #remove cite
-            content = re.sub(r'~?\\cite.?\{.*?\}', '', content)
-            #remove figure
-            content = re.sub(r'\\begin\{figure\}.*?\\end\{figure\}', '', content, flags=re.DOTALL)
-            #remove table
-            content = re.sub(r'\\begin\{table\}.*?\\end\{table\}', '', content, flags=re.DOTALL)
-            #find introduction and conclusion
-            # end word can be \section or \end{document} or \bibliography or \appendix
-            match = re.search(r'\\section\{Introduction\}.*?(\\section|\\end\{document\}|\\bibliography|\\appendix|$)', content, flags=re.DOTALL)
-            if match:
-                self.introduction = match.group(0)
-            match = re.search(r'\\section\{Conclusion\}.*?(\\section|\\end\{document\}|\\bibliography|\\appendix|$)', content, flags=re.DOTALL)
-            if match:
-                self.conclusion = match.group(0)
+                content = "\n".join(v for v in self.tex.values() if v is not None)
+            self.index = TexIndex(content)
     
     def generate_base_properties(self):
         """生成affiliations, score等基本属性"""
         self.affiliations = self.get_affiliations()
-        self.score = 1.0
-        if self.affiliations is not None:
-            self.score = self.get_score()
+        self.score = self.get_score()
 
     def generate_extended_property(self):
         tldr_and_topic = self.get_tldr_and_topic()
         if tldr_and_topic is not None:
-            try:
-                res = literal_eval(tldr_and_topic)
-                if isinstance(res, dict):
-                    self.tldr = res.get('tldr', None)
-                    self.topic = res.get('topic', None)
-            except:
+            res = parse_or_repair_dict(tldr_and_topic, ['tldr', 'topic'])
+            if res is not None:
+                self.tldr = res.get('tldr', None)
+                self.topic = res.get('topic', None)
+            else:
                 logger.warning(f'Could not parse {tldr_and_topic} to dict, display it in tldr directly.')
                 self.tldr = tldr_and_topic
                 self.topic = None
@@ -72,6 +126,18 @@ class ArxivPaper:
     @property
     def summary(self) -> str:
         return self._paper.summary
+
+    @property
+    def introduction(self) -> str:
+        if self.index is None:
+            return ""
+        return self.index.section('introduction')
+
+    @property
+    def conclusion(self) -> str:
+        if self.index is None:
+            return ""
+        return self.index.section('conclusion', 'concluding')
     
     @property
     def authors(self):
@@ -80,236 +146,125 @@ class ArxivPaper:
     @cached_property
     def arxiv_id(self):
         return re.sub(r'v\d+$', '', self._paper.get_short_id())
+
+    @property
+    def cache_key(self) -> str:
+        # short id带版本号，新版本的源码不会命中旧缓存
+        return self._paper.get_short_id()
     
     @property
     def pdf_url(self):
         return self._paper.pdf_url.replace('http://', 'https://')
+
+    @property
+    def source_url(self) -> str:
+        return self._paper.pdf_url.replace('/pdf/', '/src/')
     
     
-    @cached_property
-    def code_url(self) -> Optional[str]:
-        s = requests.Session()
-        retries = Retry(total=5, backoff_factor=0.1)
-        s.mount('https://', HTTPAdapter(max_retries=retries))
-        try:
-            paper_list = s.get(f'https://paperswithcode.com/api/v1/papers/?arxiv_id={self.arxiv_id}').json()
-        except Exception as e:
-            logger.debug(f'Error when searching {self.arxiv_id}: {e}')
-            return None
-
-        if paper_list.get('count',0) == 0:
-            return None
-        paper_id = paper_list['results'][0]['id']
-
-        try:
-            repo_list = s.get(f'https://paperswithcode.com/api/v1/papers/{paper_id}/repositories/').json()
-        except Exception as e:
-            logger.debug(f'Error when searching {self.arxiv_id}: {e}')
+    def fetch_tex(self, members:Optional[dict[str,bytes]]) -> Optional[dict[str,str]]:
+        if members is None:
+            logger.debug(f"Failed to find main tex file of {self.arxiv_id}: Not a LaTeX source.")
             return None
-        if repo_list.get('count',0) == 0:
+        tex_files = [f for f in members if f.endswith('.tex')]
+        if len(tex_files) == 0:
+            logger.debug(f"Failed to find main tex file of {self.arxiv_id}: No tex file.")
             return None
-        return repo_list['results'][0]['url']
-    
-    def fetch_tex(self) -> Optional[dict[str,str]]:
-        with ExitStack() as stack:
-            tmpdirname = stack.enter_context(TemporaryDirectory())
-            file = self._paper.download_source(dirpath=tmpdirname)
-            try:
-                tar = stack.enter_context(tarfile.open(file))
-            except tarfile.ReadError:
-                logger.debug(f"Failed to find main tex file of {self.arxiv_id}: Not a tar file.")
-                return None
- 
-            tex_files = [f for f in tar.getnames() if f.endswith('.tex')]
-            if len(tex_files) == 0:
-                logger.debug(f"Failed to find main tex file of {self.arxiv_id}: No tex file.")
-                return None
-            
-            bbl_file = [f for f in tar.getnames() if f.endswith('.bbl')]
-            if len(bbl_file) == 0:
-                if len(tex_files) > 1:
-                    logger.debug(f"Cannot find main tex file of {self.arxiv_id} from bbl: There are multiple tex files while no bbl file.")
-                    main_tex = None
-                else:
-                    main_tex = tex_files[0]
-            elif len(bbl_file) == 1:
-                main_name = bbl_file[0].replace('.bbl', '')
-                main_tex = f"{main_name}.tex"
-                if main_tex not in tex_files:
-                    logger.debug(f"Cannot find main tex file of {self.arxiv_id} from bbl: The bbl file does not match any tex file.")
-                    main_tex = None
-            else:
-                logger.debug(f"Cannot find main tex file of {self.arxiv_id} from bbl: There are multiple bbl files.")
+        
+        bbl_file = [f for f in members if f.endswith('.bbl')]
+        if len(bbl_file) == 0:
+            if len(tex_files) > 1:
+                logger.debug(f"Cannot find main tex file of {self.arxiv_id} from bbl: There are multiple tex files while no bbl file.")
                 main_tex = None
-            if main_tex is None:
-                logger.debug(f"Trying to choose tex file containing the document block as main tex file of {self.arxiv_id}")
-            #read all tex files
-            file_contents = {}
-            for t in tex_files:
-                f = tar.extractfile(t)
-                if f is None:
-                    logger.debug(f"Failed to read {t} of {self.arxiv_id}")
-                    continue
-                content = f.read().decode('utf-8',errors='ignore')
-                #remove comments
-                content = re.sub(r'%.*\n', '\n', content)
-                content = re.sub(r'\\begin{comment}.*?\\end{comment}', '', content, flags=re.DOTALL)
-                content = re.sub(r'\\iffalse.*?\\fi', '', content, flags=re.DOTALL)
-                #remove redundant \n
-                content = re.sub(r'\n+', '\n', content)
-                content = re.sub(r'\\\\', '', content)
-                #remove consecutive spaces
-                content = re.sub(r'[ \t\r\f]{3,}', ' ', content)
-                if main_tex is None and re.search(r'\\begin\{document\}', content):
-                    main_tex = t
-                    logger.debug(f"Choose {t} as main tex file of {self.arxiv_id}")
-                file_contents[t] = content
-            
-            if main_tex is not None:
-                main_source:str = file_contents[main_tex]
-                #find and replace all included sub-files
-                include_files = re.findall(r'\\input\{(.+?)\}', main_source) + re.findall(r'\\include\{(.+?)\}', main_source)
-                for f in include_files:
-                    if not f.endswith('.tex'):
-                        file_name = f + '.tex'
-                    else:
-                        file_name = f
-                    main_source = main_source.replace(f'\\input{{{f}}}', file_contents.get(file_name, ''))
-                file_contents["all"] = main_source
             else:
-                logger.debug(f"Failed to find main tex file of {self.arxiv_id}: No tex file containing the document block.")
-                file_contents["all"] = None
+                main_tex = tex_files[0]
+        elif len(bbl_file) == 1:
+            main_name = bbl_file[0].replace('.bbl', '')
+            main_tex = f"{main_name}.tex"
+            if main_tex not in tex_files:
+                logger.debug(f"Cannot find main tex file of {self.arxiv_id} from bbl: The bbl file does not match any tex file.")
+                main_tex = None
+        else:
+            logger.debug(f"Cannot find main tex file of {self.arxiv_id} from bbl: There are multiple bbl files.")
+            main_tex = None
+        if main_tex is None:
+            logger.debug(f"Trying to choose tex file containing the document block as main tex file of {self.arxiv_id}")
+        #read all tex files
+        file_contents = {}
+        for t in tex_files:
+            #remove comments, cites, figures, tables, redundant \n and spaces in one pass
+            content = clean_tex(members[t].decode('utf-8',errors='ignore'))
+            if main_tex is None and '\\begin{document}' in content:
+                main_tex = t
+                logger.debug(f"Choose {t} as main tex file of {self.arxiv_id}")
+            file_contents[t] = content
+        
+        if main_tex is not None:
+            #find and replace all (nested) included sub-files
+            file_contents["all"] = resolve_includes(file_contents, main_tex)
+        else:
+            logger.debug(f"Failed to find main tex file of {self.arxiv_id}: No tex file containing the document block.")
+            file_contents["all"] = None
         return file_contents
     
     def get_tldr_and_topic(self) -> Optional[str]:
-        prompt = """Given the title, abstract, introduction and the conclusion (if any) of a paper in latex format, generate a one-sentence TLDR summary in Chinese. Additionally, propose one relevant search topic (e.g. LLM Position Embedding) related to the paper's category in English, __CATEGORY__.
-        
-        \\title{__TITLE__}
-        \\begin{abstract}__ABSTRACT__\\end{abstract}
-        __INTRODUCTION__
-        __CONCLUSION__
-
-        Response a python dict with 'tldr' and 'topic' as keys, i.e., "{'tldr': "...", 'topic': "..."}". Make sure your response could be directly parserd by python eval function. Only return plaint text. Do not return any intermediate results.
-        """
-        prompt = prompt.replace('__TITLE__', self.title)
-        prompt = prompt.replace('__ABSTRACT__', self.summary)
-        prompt = prompt.replace('__INTRODUCTION__', self.introduction)
-        prompt = prompt.replace('__CONCLUSION__', self.conclusion)
-        prompt = prompt.replace('__CATEGORY__', str(self._paper.categories))
-
-        # use gpt-4o tokenizer for estimation
-        enc = tiktoken.encoding_for_model("gpt-4o")
-        prompt_tokens = enc.encode(prompt)
-        prompt_tokens = prompt_tokens[:4000]  # truncate to 4000 tokens
-        prompt = enc.decode(prompt_tokens)
+        prompt = build_prompt(TLDR_PROMPT, {
+            'TITLE': self.title,
+            'ABSTRACT': self.summary,
+            'INTRODUCTION': self.introduction,
+            'CONCLUSION': self.conclusion,
+            'CATEGORY': str(self._paper.categories),
+        }, PROMPT_MAX_TOKENS, TLDR_SECTION_WEIGHTS, stage='tldr')
         llm = get_llm()
         res = llm.generate(
             messages=[
                 {
                     "role": "system",
-                    "content": "You are an assistant who perfectly summarizes scientific paper, and gives the core idea of the paper to the user. Make sure your response could be directly parserd by python eval function.",
+                    "content": "You are an assistant who perfectly summarizes scientific paper, and gives the core idea of the paper to the user. Your response must be a valid JSON object.",
                 },
                 {"role": "user", "content": prompt},
-            ]
+            ],
+            json_object=True,
         )
-        res = llm.generate(
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': "You are an python dict assistant. Check the python dict format and make sure it is a valid python dict with key \'tldr\' and \'topic\'. If it is not a valid python dict, try to fix it. If it is a valid python dict, just return it. Make sure your response could be directly parserd by python eval function.",
-                    },
-                    {'role': 'user', 'content': res},
-                ]
-            )
         return res
 
     def get_affiliations(self) -> Optional[list[str]]:
-        if self.tex is not None:
-            content = self.tex.get("all")
-            if content is None:
-                content = "\n".join(self.tex.values())
+        """先从模板的结构化宏中提取，找不到时才请求LLM"""
+        affiliations = self.get_local_affiliations()
+        if affiliations is not None:
+            return affiliations
+        return self.get_llm_affiliations()
+
+    def get_local_affiliations(self) -> Optional[list[str]]:
+        if self.index is None:
+            return None
+        return extract_affiliations(self.index.front_matter)
+
+    def get_llm_affiliations(self) -> Optional[list[str]]:
+        if self.index is not None:
             #search for affiliations
-            match = re.search(r'\\author.*?\\maketitle', content, flags=re.DOTALL)
-            if match:
-                information_region = match.group(0)
-            else:
+            information_region = self.index.author_region
+            if information_region is None:
                 logger.debug(f"Failed to extract affiliations of {self.arxiv_id}: No author information found.")
                 return None
-            prompt = f"Given the author information of a paper in latex format, extract the affiliations of the authors in a python list format, which is sorted by the author order. If there is no affiliation found, return an empty list '[]'. Following is the author information:\n{information_region}"
-            # use gpt-4o tokenizer for estimation
-            enc = tiktoken.encoding_for_model("gpt-4o")
-            prompt_tokens = enc.encode(prompt)
-            prompt_tokens = prompt_tokens[:4000]  # truncate to 4000 tokens
-            prompt = enc.decode(prompt_tokens)
+            prompt = build_prompt(AFFILIATION_PROMPT, {'AUTHOR': information_region}, PROMPT_MAX_TOKENS, {}, stage='affiliation')
             llm = get_llm()
             affiliations = llm.generate(
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are an assistant who perfectly extracts affiliations of authors from the author information of a paper. You should return a python list of affiliations sorted by the author order, like ['TsingHua University','Peking University']. If an affiliation is consisted of multi-level affiliations, like 'Department of Computer Science, TsingHua University', you should return the top-level affiliation 'TsingHua University' only. Do not contain duplicated affiliations. If there is no affiliation found, you should return an empty list [ ]. You should only return the final list of affiliations, and do not return any intermediate results.",
+                        "content": AFFILIATION_SYSTEM_PROMPT,
                     },
                     {"role": "user", "content": prompt},
                 ]
             )
-            affiliations = llm.generate(
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': 'You are an python list assistant. Check the python list format and make sure it is a valid python list. If it is not a valid python list, try to fix it. If it is a valid python list, just return it.',
-                    },
-                    {'role': 'user', 'content': affiliations},
-                ]
-            )
-            try:
-                affiliations = re.search(r'\[.*?\]', affiliations, flags=re.DOTALL).group(0)
-                affiliations = literal_eval(affiliations)
-                affiliations = list(set(affiliations))
-                affiliations = [str(a) for a in affiliations]
-            except Exception as e:
-                logger.debug(f"Failed to extract affiliations of {self.arxiv_id}: {e}")
+            affiliations = parse_or_repair_list(affiliations)
+            if affiliations is None:
+                logger.debug(f"Failed to extract affiliations of {self.arxiv_id}: Invalid list format.")
                 return None
+            affiliations = list(set(str(a) for a in affiliations))
             return affiliations
         return None
     
     def get_score(self) -> float:
-        prompt = """Given the author affiliations, generate a score for the paper. Only for reference, here are my affiliations preferences list, listed higher are the ones I prefer more.
-
-        USA University list: [
-            Carnegie Mellon University,
-            University of Illinois at Urbana-Champaign,
-            University of Maryland - College Park,
-            University of California - San Diego,
-            Cornell University,
-            University of Michigan,
-            Stanford University,
-            Georgia Institute of Technology,
-            Massachusetts Institute of Technology,
-            University of California - Los Angeles,
-            University of California - Berkeley,
-            University of Massachusetts Amherst,
-            New York University,
-            University of Washington]
-        China University list: [Peking University, Tsinghua University, Hong Kong University of Science and Technology, Shanghai Jiao Tong University, Zhejiang University, Chinese Academy of Sciences]
-        Lab list: [OpenAI, Deepseek-AI, DeepMind, Meta, Google, Alibaba, Tencent, ByteDance, Microsoft, Nvidia, Huawei, Facebook, Amazon, IBM Watson, Intel, Apple]
-        
-        The affiliations of this paper are as follows: __AFFILIATIONS__"""
-        prompt = prompt.replace('__AFFILIATIONS__', str(self.affiliations))
-
-        # use gpt-4o tokenizer for estimation
-        enc = tiktoken.encoding_for_model("gpt-4o")
-        prompt_tokens = enc.encode(prompt)
-        prompt_tokens = prompt_tokens[:4000]  # truncate to 4000 tokens
-        prompt = enc.decode(prompt_tokens)
-        llm = get_llm()
-        score = llm.generate(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an assistant who perfectly generates a score for the paper based on the affiliations of the authors. You prefer papers about knowledge and analysis rather than simply application. If the affiliations are not found, you should return 1. The score should be a number between 0 and 5, with 0.5 as the minimum step. Only retuen the score, do not return any intermediate results.",
-                },
-                {"role": "user", "content": prompt},
-            ]
-        )
-        if score is None:
-            return 1
-        return literal_eval(score)
+        """按配置的机构偏好表在本地打分"""
+        return get_scorer().score(self.affiliations)
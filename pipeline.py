@@ -0,0 +1,153 @@
+import time
+import heapq
+import queue
+import threading
+from typing import Any, Callable, Iterable, Optional
+from tqdm import tqdm
+from loguru import logger
+
+_DONE = object()
+
+
+class Stage:
+    """流水线中的一级：workers个线程从有界的输入队列取数据，处理后放入下一级的输入队列。
+
+    fn返回None表示丢弃该条数据。batch_size大于1时fn接收一个列表，
+    凑满batch_size条或等待linger秒后就开始处理，返回需要传给下一级的列表。
+    """
+    def __init__(self, name: str, fn: Callable, workers: int = 1, maxsize: Optional[int] = None, batch_size: int = 1, linger: float = 0.5):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.inbox: queue.Queue = queue.Queue(maxsize=maxsize if maxsize is not None else max(4, 2 * workers * batch_size))
+        self.outbox: Optional[queue.Queue] = None
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def _take_batch(self) -> tuple[list, bool]:
+        """取一批数据，返回(数据, 上游是否已结束)"""
+        item = self.inbox.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                item = self.inbox.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _process(self, batch: list) -> list:
+        start = time.perf_counter()
+        try:
+            if self.batch_size > 1:
+                outputs = self.fn(batch)
+            else:
+                outputs = [self.fn(batch[0])]
+        except Exception as e:
+            # 出错的数据原样传给下一级，与分阶段执行时单篇失败不影响其它论文的行为一致
+            logger.error(f"Error in stage {self.name}: {e}")
+            outputs = batch
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            self.items += len(batch)
+            self.busy += time.perf_counter() - start
+        return [o for o in outputs if o is not None]
+
+    def _work(self):
+        while True:
+            batch, done = self._take_batch()
+            for output in self._process(batch) if batch else []:
+                if self.outbox is not None:
+                    self.outbox.put(output)
+            if done:
+                # 放回结束标记，让同级的其它线程也能退出
+                self.inbox.put(_DONE)
+                return
+
+    def start(self) -> list[threading.Thread]:
+        threads = [threading.Thread(target=self._work, name=f'{self.name}-{i}', daemon=True) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        return threads
+
+
+class Pipeline:
+    """用有界队列串联的多级流水线。每条数据处理完一级就进入下一级，
+    总耗时接近最慢一级的耗时，而不是各级耗时之和；队列有界，上游过快时会被阻塞。
+    """
+    def __init__(self, stages: list[Stage]):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.outbox = downstream.inbox
+
+    def run(self, source: Iterable[Any], desc: str = 'Processing papers') -> int:
+        """把source中的数据送入流水线并等待全部处理完，返回送入的数据条数"""
+        threads = [stage.start() for stage in self.stages]
+        start = time.perf_counter()
+        count = 0
+        for item in tqdm(source, desc=desc):
+            self.stages[0].inbox.put(item)
+            count += 1
+        self.stages[0].inbox.put(_DONE)
+        for i, stage in enumerate(self.stages):
+            for t in threads[i]:
+                t.join()
+            if i + 1 < len(self.stages):
+                self.stages[i + 1].inbox.put(_DONE)
+        self.elapsed = time.perf_counter() - start
+        return count
+
+    def summary(self) -> str:
+        parts = [f"{s.name} {s.items} items/{s.busy:.1f}s busy/{s.workers} workers" + (f"/{s.errors} errors" if s.errors else '')
+                 for s in self.stages]
+        return f"Pipeline finished in {self.elapsed:.1f}s: " + ', '.join(parts) + '.'
+
+
+class TopK:
+    """增量维护key最大的k条数据，k为-1时保留全部。
+
+    新数据进入前k名时立即返回True，让下游提前开始处理；之后被挤出的数据在results中不再出现。
+    """
+    def __init__(self, k: int, key: Callable[[Any], Any]):
+        self.k = k
+        self.key = key
+        self.evicted = 0
+        self._heap: list = []
+        self._members: set[int] = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def offer(self, item) -> bool:
+        with self._lock:
+            entry = (self.key(item), self._seq, item)
+            self._seq += 1
+            if self.k < 0 or len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+                self._members.add(id(item))
+                return True
+            if self.k == 0 or entry[:2] <= self._heap[0][:2]:
+                return False
+            evicted = heapq.heapreplace(self._heap, entry)
+            self._members.discard(id(evicted[2]))
+            self._members.add(id(item))
+            self.evicted += 1
+            return True
+
+    def __contains__(self, item) -> bool:
+        """item当前是否仍在前k名中，下游可以据此跳过已被挤出的数据"""
+        with self._lock:
+            return id(item) in self._members
+
+    def results(self) -> list:
+        with self._lock:
+            return [entry[2] for entry in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
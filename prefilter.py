@@ -0,0 +1,221 @@
+import re
+import time
+from typing import Callable, Iterable, Optional, TypeVar
+import arxiv
+from feed import entry_abstract, entry_authors, entry_categories
+
+T = TypeVar('T')
+
+# 查询中可以用前缀限定匹配的字段，不带前缀时匹配标题和摘要
+FIELDS = {'title': 'title', 'ti': 'title', 'abstract': 'abstract', 'abs': 'abstract', 'author': 'authors', 'au': 'authors', 'cat': 'categories'}
+_TOKEN = re.compile(r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<term>(?:[a-zA-Z]+:)?(?:"[^"]*"|[^\s()"]+)))')
+
+
+class Metadata:
+    """预筛选用到的论文元数据，来自RSS条目或arxiv.Result"""
+    def __init__(self, title: str, abstract: str, authors: list[str], categories: list[str]):
+        # 统一转成小写，查询词也是小写，匹配时不需要IGNORECASE
+        self.fields = {
+            'title': ' '.join(title.split()).lower(),
+            'abstract': ' '.join(abstract.split()).lower(),
+            'authors': ', '.join(authors).lower(),
+            # 两侧加空格，使分类可以按整词匹配
+            'categories': ' ' + ' '.join(categories).lower() + ' ',
+        }
+        self.categories = categories
+
+    @classmethod
+    def from_entry(cls, entry) -> 'Metadata':
+        return cls(entry.get('title', ''), entry_abstract(entry), entry_authors(entry), entry_categories(entry))
+
+    @classmethod
+    def from_result(cls, result: arxiv.Result) -> 'Metadata':
+        return cls(result.title, result.summary, [a.name for a in result.authors], list(result.categories))
+
+
+def _term_pattern(term: str, field: Optional[str]) -> re.Pattern:
+    """把一个词或短语编译成正则。
+
+    正则以字面量开头时re模块会先用字符串查找定位候选位置，比以\\b开头的正则快一个数量级，
+    因此词首的边界用紧跟在字面量之后的后行断言检查。
+    """
+    term = term.lower()
+    if field == 'categories':
+        # cat:cs.* 匹配整个大类
+        body = re.escape(term).replace(r'\*', r'\S*')
+        return re.compile(rf'\s{body}\s')
+    words = [re.escape(w).replace(r'\*', r'\w*') for w in term.split()]
+    body = r'\s+'.join(words) + ('' if term.endswith('*') else r'(?!\w)')
+    literal = re.escape(term.split()[0].split('*')[0])
+    if not literal:
+        return re.compile(r'(?<!\w)' + body)
+    return re.compile(literal + rf'(?<!\w{literal})' + body[len(literal):])
+
+
+def compile_term(text: str) -> Callable[[dict], bool]:
+    field = None
+    m = re.match(r'([a-zA-Z]+):(.+)$', text)
+    if m is not None and m.group(1).lower() in FIELDS:
+        field, text = FIELDS[m.group(1).lower()], m.group(2)
+    text = text.strip('"')
+    if not text:
+        raise ValueError('Empty term in filter query.')
+    pattern = _term_pattern(text, field)
+    if field is not None:
+        return lambda fields: pattern.search(fields[field]) is not None
+    return lambda fields: pattern.search(fields['title']) is not None or pattern.search(fields['abstract']) is not None
+
+
+def compile_query(query: str) -> Callable[[dict], bool]:
+    """把布尔查询编译成一个判断函数。
+
+    支持AND、OR、NOT(或-前缀)、括号、"短语"、*通配符以及title:/abs:/author:/cat:字段前缀，
+    相邻的两项之间默认为AND，例如: (llm OR "language model") AND cat:cs.CL -survey
+    """
+    tokens = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = _TOKEN.match(query, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f'Invalid filter query near: {query[pos:]}')
+        pos = m.end()
+        tokens.append((m.lastgroup, m.group(m.lastgroup)))
+    i = 0
+
+    def peek() -> Optional[tuple[str, str]]:
+        return tokens[i] if i < len(tokens) else None
+
+    def parse_or():
+        nonlocal i
+        nodes = [parse_and()]
+        while peek() == ('term', 'OR'):
+            i += 1
+            nodes.append(parse_and())
+        return nodes[0] if len(nodes) == 1 else (lambda f: any(n(f) for n in nodes))
+
+    def parse_and():
+        nonlocal i
+        nodes = [parse_not()]
+        while peek() is not None and peek()[0] != 'close' and peek() != ('term', 'OR'):
+            if peek() == ('term', 'AND'):
+                i += 1
+            nodes.append(parse_not())
+        return nodes[0] if len(nodes) == 1 else (lambda f: all(n(f) for n in nodes))
+
+    def parse_not():
+        nonlocal i
+        token = peek()
+        if token == ('term', 'NOT'):
+            i += 1
+            node = parse_not()
+            return lambda f: not node(f)
+        if token is not None and token[0] == 'term' and token[1].startswith('-') and len(token[1]) > 1:
+            i += 1
+            node = compile_term(token[1][1:])
+            return lambda f: not node(f)
+        return parse_atom()
+
+    def parse_atom():
+        nonlocal i
+        token = peek()
+        if token is None:
+            raise ValueError('Unexpected end of filter query.')
+        i += 1
+        if token[0] == 'open':
+            node = parse_or()
+            if peek() is None or peek()[0] != 'close':
+                raise ValueError('Unbalanced parentheses in filter query.')
+            i += 1
+            return node
+        if token[0] == 'close' or token[1] in ('AND', 'OR'):
+            raise ValueError(f'Unexpected {token[1]} in filter query.')
+        return compile_term(token[1])
+
+    if not tokens:
+        raise ValueError('Empty filter query.')
+    node = parse_or()
+    if i != len(tokens):
+        raise ValueError(f'Unexpected {tokens[i][1]} in filter query.')
+    return node
+
+
+def _compile_terms(terms: Iterable[str]) -> list[re.Pattern]:
+    return [_term_pattern(t.strip(), None) for t in terms if t.strip()]
+
+
+class PreFilter:
+    """只用标题、摘要、作者和分类做的廉价预筛选，在下载源码和调用LLM之前剔除无关论文。
+
+    命中exclude词表、不满足query或一个include词都没命中的论文被剔除。
+    通过的论文按预评分(所属分类的权重之和加上命中的include词数，标题中命中的计两次)排序，top_n大于0时只保留前top_n篇。
+    """
+    def __init__(self, query: Optional[str] = None, include: Iterable[str] = (), exclude: Iterable[str] = (),
+                 category_weights: Optional[dict[str, float]] = None, top_n: int = 0):
+        self.query = compile_query(query) if query else None
+        self.include = _compile_terms(include)
+        self.exclude = _compile_terms(exclude)
+        self.category_weights = category_weights or {}
+        self.top_n = top_n
+        self.stats = {'seen': 0, 'excluded': 0, 'query': 0, 'include': 0, 'top_n': 0, 'kept': 0, 'seconds': 0.0}
+
+    @property
+    def active(self) -> bool:
+        return any([self.query, self.include, self.exclude, self.category_weights, self.top_n > 0])
+
+    def score(self, meta: Metadata) -> Optional[float]:
+        """返回预评分，被剔除时返回None"""
+        fields = meta.fields
+        if any(p.search(fields['title']) or p.search(fields['abstract']) for p in self.exclude):
+            self.stats['excluded'] += 1
+            return None
+        if self.query is not None and not self.query(fields):
+            self.stats['query'] += 1
+            return None
+        score = sum(self.category_weights.get(c, 0.0) for c in meta.categories)
+        if self.include:
+            hits = 0
+            for p in self.include:
+                if p.search(fields['title']):
+                    hits += 2
+                elif p.search(fields['abstract']):
+                    hits += 1
+            if not hits:
+                self.stats['include'] += 1
+                return None
+            score += hits
+        return score
+
+    def select(self, items: list[T], metadata: Callable[[T], Metadata]) -> list[T]:
+        """返回通过筛选的条目，保持原有顺序"""
+        start = time.perf_counter()
+        self.stats['seen'] += len(items)
+        scored = []
+        for i, item in enumerate(items):
+            score = self.score(metadata(item))
+            if score is not None:
+                scored.append((score, i, item))
+        if self.top_n > 0 and len(scored) > self.top_n:
+            self.stats['top_n'] += len(scored) - self.top_n
+            scored = sorted(scored, key=lambda x: (-x[0], x[1]))[:self.top_n]
+            scored.sort(key=lambda x: x[1])
+        self.stats['kept'] += len(scored)
+        self.stats['seconds'] += time.perf_counter() - start
+        return [item for _, _, item in scored]
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"Pre-filter kept {s['kept']}/{s['seen']} papers in {s['seconds'] * 1000:.1f}ms "
+                f"({s['excluded']} with excluded terms, {s['query']} not matching the query, {s['include']} without include terms, "
+                f"{s['top_n']} beyond top {self.top_n}).")
+
+
+def parse_weights(text: Optional[str]) -> dict[str, float]:
+    """解析"cs.CL:2,cs.LG:1"形式的分类权重"""
+    weights = {}
+    for item in (text or '').split(','):
+        if not item.strip():
+            continue
+        category, _, weight = item.partition(':')
+        weights[category.strip()] = float(weight) if weight.strip() else 1.0
+    return weights
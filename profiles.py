@@ -0,0 +1,163 @@
+import re
+import json
+from typing import Callable, Optional, TypeVar
+from loguru import logger
+from affiliation import AffiliationScorer
+from delivery import parse_receivers
+from feed import entry_id
+from pipeline import TopK
+from prefilter import Metadata, PreFilter, parse_weights
+
+T = TypeVar('T')
+
+# 每个用户可以单独设置的参数，没有设置的沿用命令行/环境变量中的值
+PROFILE_FIELDS = {
+    'name': str, 'receiver': str, 'arxiv_query': str, 'max_paper_num': int, 'affiliation_config': str,
+    'filter_query': str, 'filter_include': str, 'filter_exclude': str, 'filter_category_weights': str, 'filter_top_n': int,
+}
+
+
+def load_profiles(value: str) -> list[dict]:
+    """PROFILES可以是JSON文件的路径，也可以直接是JSON：用户配置的列表，或{"profiles": [...]}"""
+    text = value.strip()
+    if not text.startswith(('[', '{')):
+        with open(text, encoding='utf-8') as f:
+            text = f.read()
+    config = json.loads(text)
+    if isinstance(config, dict):
+        config = config.get('profiles')
+    if not isinstance(config, list) or not config:
+        raise ValueError('PROFILES must be a non-empty list of user profiles.')
+    names = set()
+    for i, profile in enumerate(config):
+        if not isinstance(profile, dict):
+            raise ValueError(f'Profile {i} is not a JSON object.')
+        unknown = set(profile) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields in profile {i}: {', '.join(sorted(unknown))}.")
+        for key, value in profile.items():
+            if value is not None:
+                profile[key] = PROFILE_FIELDS[key](value)
+        profile.setdefault('name', f'profile{i + 1}')
+        if profile['name'] in names:
+            raise ValueError(f"Duplicate profile name: {profile['name']}.")
+        names.add(profile['name'])
+    return config
+
+
+def query_categories(query: str) -> list[str]:
+    """ARXIV_QUERY中用+连接的分类，可以是cs.AI这样的分类，也可以是cs这样的整个学科"""
+    return [c.strip() for c in query.split('+') if c.strip()]
+
+
+def _item_id(item) -> str:
+    # RSS条目是dict，调试模式下是arxiv.Result
+    if isinstance(item, dict):
+        return entry_id(item)
+    return re.sub(r'v\d+$', '', item.get_short_id())
+
+
+class Profile:
+    """一个用户的查询、偏好表和推荐数量。论文的处理结果由所有用户共享，每个用户只单独排序和渲染"""
+    def __init__(self, name: str, receivers: list[str], query: str, max_paper_num: int, scorer: AffiliationScorer,
+                 prefilter: PreFilter, order: dict[str, int]):
+        self.name = name
+        self.receivers = receivers
+        self.query = query
+        self.categories = query_categories(query)
+        self.scorer = scorer
+        self.prefilter = prefilter
+        # 按本用户的偏好表得到的分数，渲染时也使用这些分数
+        self.scores: dict[str, float] = {}
+        self.wanted: set[str] = set()
+        self.topk = TopK(max_paper_num, key=lambda p: (self.scores[p.arxiv_id], -order[p.arxiv_id]))
+
+    def _covers(self, category: str) -> bool:
+        return any(category == c or category.startswith(c + '.') for c in self.categories)
+
+    def wants(self, categories: list[str], announce_type: Optional[str], announce_types: tuple[str, ...]) -> bool:
+        """合并后的RSS中，主分类不在本用户查询中的new/replace条目对本用户来说是cross/replace-cross。
+        announce_type为None(调试模式下的API结果)时不按分类筛选
+        """
+        if announce_type is None:
+            return True
+        if not any(self._covers(c) for c in categories):
+            return False
+        if announce_type in ('new', 'replace') and categories and not self._covers(categories[0]):
+            announce_type = 'cross' if announce_type == 'new' else 'replace-cross'
+        return announce_type in announce_types
+
+    def results(self) -> list:
+        return self.topk.results()
+
+
+class ProfileSet:
+    """多个用户共用一次运行：合并所有用户的查询只获取一次RSS，每篇论文只下载、解析、提取机构和生成TLDR一次。
+
+    select与PreFilter.select的接口相同，把条目分配给需要它的用户(分类匹配且通过该用户的预筛选)，返回至少一个用户需要的条目；
+    offer和in与TopK的接口相同，按各用户的偏好表打分并放入各自的前K名，任一用户的前K名包含的论文才继续生成TLDR。
+    因此总开销随不同论文的数量增长，而不是随用户数增长。
+    """
+    def __init__(self, profiles: list[Profile], announce_types: tuple[str, ...] = ('new',)):
+        self.profiles = profiles
+        self.announce_types = announce_types
+        self.active = True
+
+    @classmethod
+    def from_config(cls, configs: list[dict], args, order: dict[str, int], announce_types: tuple[str, ...] = ('new',)) -> 'ProfileSet':
+        """configs中没有设置的参数使用args中的值，使用同一偏好表的用户共用一个打分器"""
+        scorers: dict[str, AffiliationScorer] = {}
+        profiles = []
+        for config in configs:
+            value = lambda key: config[key] if config.get(key) is not None else getattr(args, key)
+            path = value('affiliation_config')
+            if path not in scorers:
+                scorers[path] = AffiliationScorer.from_file(path, tie_breaker=args.affiliation_tie_breaker)
+            prefilter = PreFilter(query=value('filter_query'), include=(value('filter_include') or '').split(','),
+                                  exclude=(value('filter_exclude') or '').split(','),
+                                  category_weights=parse_weights(value('filter_category_weights')), top_n=value('filter_top_n'))
+            profiles.append(Profile(config['name'], parse_receivers(value('receiver')), value('arxiv_query'),
+                                    value('max_paper_num'), scorers[path], prefilter, order))
+        return cls(profiles, announce_types)
+
+    @property
+    def query(self) -> str:
+        """所有用户查询的分类的并集，按首次出现的顺序"""
+        categories = []
+        for profile in self.profiles:
+            categories.extend(c for c in profile.categories if c not in categories)
+        return '+'.join(categories)
+
+    def select(self, items: list[T], metadata: Callable[[T], Metadata]) -> list[T]:
+        metas = {id(item): metadata(item) for item in items}
+        kept = set()
+        for profile in self.profiles:
+            candidates = [item for item in items if profile.wants(
+                metas[id(item)].categories, item.get('arxiv_announce_type') if isinstance(item, dict) else None, self.announce_types)]
+            if profile.prefilter.active:
+                candidates = profile.prefilter.select(candidates, lambda item: metas[id(item)])
+                logger.info(f"{profile.name}: {profile.prefilter.summary()}")
+            profile.wanted.update(_item_id(item) for item in candidates)
+            kept.update(id(item) for item in candidates)
+        return [item for item in items if id(item) in kept]
+
+    def offer(self, paper) -> bool:
+        accepted = False
+        for profile in self.profiles:
+            if paper.arxiv_id in profile.wanted:
+                profile.scores[paper.arxiv_id] = profile.scorer.score(paper.affiliations)
+                accepted = profile.topk.offer(paper) or accepted
+        return accepted
+
+    def __contains__(self, paper) -> bool:
+        return any(paper in profile.topk for profile in self.profiles)
+
+    @property
+    def evicted(self) -> int:
+        return sum(profile.topk.evicted for profile in self.profiles)
+
+    def summary(self) -> str:
+        wanted = set().union(*(profile.wanted for profile in self.profiles))
+        parts = [f"{profile.name} {len(profile.wanted)}" for profile in self.profiles]
+        return (f"Profiles: {len(wanted)} distinct papers to process for {sum(len(p.wanted) for p in self.profiles)} requested "
+                f"by {len(self.profiles)} profiles ({', '.join(parts)}).")
@@ -0,0 +1,133 @@
+import re
+import time
+import threading
+from functools import lru_cache
+from typing import Callable
+import tiktoken
+
+# 估算token数时使用的分词器
+ENCODING_MODEL = 'gpt-4o'
+# 单个token对应字符数的保守上限，常见文本约为其一半。按预算截断时只编码按字符数切出的前缀，避免对很长的章节整段编码
+CHARS_PER_TOKEN = 8
+
+_PLACEHOLDER = re.compile(r'__([A-Z_]+?)__')
+
+_lock = threading.Lock()
+STATS: dict[str, dict[str, float]] = {}
+
+
+@lru_cache(maxsize=None)
+def get_encoder() -> tiktoken.Encoding:
+    """进程内共享的分词器，只加载一次"""
+    return tiktoken.encoding_for_model(ENCODING_MODEL)
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=64)
+def _fixed_tokens(template: str) -> int:
+    return count_tokens(_PLACEHOLDER.sub('', template))
+
+
+def allocate(measure: Callable[[str, int], int], names: list[str], budget: int, weights: dict[str, float]) -> dict[str, int]:
+    """按权重把预算分给各个章节，用不完的份额再分给仍然不够的章节。
+
+    measure(name, share)返回章节token数与share + 1中的较小者，因此长章节只需编码到份额附近。
+    """
+    allocation = {}
+    pending = list(names)
+    while pending and budget > 0:
+        total_weight = sum(weights.get(k, 1.0) for k in pending)
+        shares = {k: int(budget * weights.get(k, 1.0) / total_weight) for k in pending}
+        satisfied = {k: n for k in pending if (n := measure(k, shares[k])) <= shares[k]}
+        if not satisfied:
+            allocation.update(shares)
+            return allocation
+        for k, n in satisfied.items():
+            allocation[k] = n
+            budget -= n
+            pending.remove(k)
+    for k in pending:
+        allocation[k] = 0
+    return allocation
+
+
+class _Section:
+    """按需编码的章节，只编码到足以判断是否超出份额的前缀"""
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens: list[int] = []
+        self.end = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.end >= len(self.text)
+
+    def measure(self, limit: int) -> int:
+        if not self.complete and len(self.tokens) <= limit:
+            # 先按常见的字符/token比例编码，不够时再按上限编码
+            for chars_per_token in (CHARS_PER_TOKEN // 2, CHARS_PER_TOKEN):
+                end = min(len(self.text), (limit + 1) * chars_per_token)
+                if end > self.end:
+                    self.end = end
+                    self.tokens = get_encoder().encode(self.text[:end], disallowed_special=())
+                if self.complete or len(self.tokens) > limit:
+                    break
+        return min(len(self.tokens), limit + 1)
+
+    def render(self, n: int) -> tuple[str, bool]:
+        """返回不超过n个token的文本以及是否被截断"""
+        if len(self.tokens) > n:
+            return get_encoder().decode(self.tokens[:n]), True
+        return self.text[:self.end], not self.complete
+
+
+def truncate(text: str, max_tokens: int) -> tuple[str, int]:
+    """截断到max_tokens个token以内，返回截断后的文本和token数。未超出预算时不做解码"""
+    part = _Section(text)
+    part.measure(max_tokens)
+    return part.render(max_tokens)[0], min(len(part.tokens), max_tokens)
+
+
+def build_prompt(template: str, sections: dict[str, str], max_tokens: int, weights: dict[str, float], stage: str) -> str:
+    """用各章节填充模板中的__NAME__占位符，总长度不超过max_tokens。
+
+    模板本身(指令部分)总是完整保留，剩余预算按weights分给各章节，只截断超出份额的章节。
+    """
+    start = time.perf_counter()
+    fixed = _fixed_tokens(template)
+    budget = max(0, max_tokens - fixed)
+    parts = {name: _Section(text) for name, text in sections.items()}
+    # 先按字符数粗估分配结果，一次编码出大致够用的前缀，精确分配时就很少需要重新编码
+    estimate = allocate(lambda k, share: min(len(sections[k]) // (CHARS_PER_TOKEN // 2), share + 1), list(parts), budget, weights)
+    for name, part in parts.items():
+        part.measure(estimate[name] + estimate[name] // 4)
+    allocation = allocate(lambda k, share: parts[k].measure(share), list(parts), budget, weights)
+    filled = {}
+    truncated = 0
+    used = fixed
+    for name, part in parts.items():
+        filled[name], cut = part.render(allocation[name])
+        truncated += cut
+        used += min(len(part.tokens), allocation[name])
+    prompt = _PLACEHOLDER.sub(lambda m: filled.get(m.group(1), m.group()), template)
+    record(stage, used, truncated, time.perf_counter() - start)
+    return prompt
+
+
+def record(stage: str, tokens: int, truncated: int = 0, seconds: float = 0.0):
+    with _lock:
+        s = STATS.setdefault(stage, {'prompts': 0, 'tokens': 0, 'truncated': 0, 'seconds': 0.0})
+        s['prompts'] += 1
+        s['tokens'] += tokens
+        s['truncated'] += truncated
+        s['seconds'] += seconds
+
+
+def summary() -> str:
+    parts = [f"{stage}: {s['prompts']} prompts, {s['tokens']} tokens (avg {s['tokens'] / s['prompts']:.0f}), "
+             f"{s['truncated']} sections truncated, {s['seconds'] * 1000:.0f}ms building"
+             for stage, s in STATS.items()]
+    return 'Prompt tokens: ' + ('; '.join(parts) if parts else 'none') + '.'
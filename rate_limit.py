@@ -0,0 +1,148 @@
+import time
+import random
+import threading
+from typing import Optional
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """每分钟补充rate_per_minute个令牌的令牌桶，capacity决定允许的突发量"""
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 10)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, n: float = 1.0) -> float:
+        """阻塞直到取得n个令牌，返回等待的秒数"""
+        n = min(n, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return waited
+                wait = (n - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, n: float):
+        """按实际用量修正预估的令牌数，n为正时额外扣除，为负时退还"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - n)
+
+
+class AdaptiveConcurrency:
+    """AIMD并发控制：成功时加性增加上限，遇到限流或超时时乘性减小。
+
+    平滑后的延迟超过最低延迟的latency_factor倍时说明服务端已经拥塞，此时暂停增加。
+    """
+    def __init__(self, maximum: int, minimum: int = 1, decrease_factor: float = 0.5, latency_factor: float = 3.0, cooldown: float = 5.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(maximum)
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.lowest_limit = maximum
+        self._active = 0
+        self._min_latency: Optional[float] = None
+        self._ewma_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _decrease(self):
+        now = time.monotonic()
+        # 同一波限流只减一次，避免并发请求同时失败时把上限压到最低
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+        self.lowest_limit = min(self.lowest_limit, int(self.limit))
+
+    def on_success(self, latency: float):
+        with self._cond:
+            self._min_latency = latency if self._min_latency is None else min(self._min_latency, latency)
+            self._ewma_latency = latency if self._ewma_latency is None else 0.8 * self._ewma_latency + 0.2 * latency
+            if self._ewma_latency <= self.latency_factor * self._min_latency:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def on_congestion(self):
+        with self._cond:
+            self._decrease()
+
+
+def parse_retry_after(value: Optional[str], cap: float = 300.0) -> Optional[float]:
+    """解析Retry-After头，支持秒数和HTTP日期两种格式，等待时间不超过cap秒，异常的头不会让线程长时间停住"""
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, OverflowError):
+            return None
+    if delay != delay:
+        return None
+    return min(cap, max(0.0, delay))
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 60.0) -> float:
+    """带完全抖动(full jitter)的指数退避"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimiter:
+    """LLM调用的全局限流器：请求数/令牌数的令牌桶加上自适应并发，并记录统计信息"""
+    def __init__(self, concurrency: int, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.concurrency = AdaptiveConcurrency(concurrency)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute, capacity=tokens_per_minute / 4) if tokens_per_minute > 0 else None
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'succeeded': 0, 'failed': 0, 'retries': 0, 'throttled': 0, 'server_errors': 0, 'network_errors': 0, 'wait_seconds': 0.0}
+
+    def record(self, key: str, value: float = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def acquire(self, estimated_tokens: float):
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire()
+        if self.tokens is not None:
+            waited += self.tokens.acquire(estimated_tokens)
+        self.record('requests')
+        self.record('wait_seconds', waited)
+
+    def settle_tokens(self, estimated_tokens: float, used_tokens: Optional[float]):
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.adjust(used_tokens - estimated_tokens)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"LLM limiter: {s['requests']} requests, {s['succeeded']} succeeded, {s['failed']} failed, "
+                f"{s['retries']} retries ({s['throttled']} throttled, {s['server_errors']} server errors, {s['network_errors']} network errors), "
+                f"{s['wait_seconds']:.1f}s waiting for quota, concurrency {int(self.concurrency.limit)}/{self.concurrency.maximum} "
+                f"(lowest {self.concurrency.lowest_limit}).")
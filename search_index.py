@@ -0,0 +1,251 @@
+import re
+import json
+import hashlib
+import datetime
+from typing import Iterable
+
+SEARCH_DIR = 'search'
+# 建立索引需要从历史记录中读取的列
+SEARCH_COLUMNS = ['date', 'id', 'title', 'affiliations', 'score', 'topic', 'tldr', 'code_url']
+
+# 英文高频词不进入索引，查询时同样丢弃
+STOPWORDS = frozenset('a an and are as at be by for from in into is it of on or our that the this to via we with without'.split())
+_WORD = re.compile(r'[^\W_]+')
+_CJK = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+)')
+# 结果中显示的TLDR只保留开头
+TLDR_CHARS = 240
+
+
+def tokenize(text: str) -> list[str]:
+    """小写后按字母和数字切词，去掉停用词，长于4个字符的词去掉复数的s；中日韩文字没有空格，按相邻两字切分。
+    浏览器端的查询用完全相同的规则切词
+    """
+    tokens = []
+    for word in _WORD.findall(text.lower()):
+        for i, run in enumerate(_CJK.split(word)):
+            if not run:
+                continue
+            if i % 2:
+                tokens.extend([run] if len(run) == 1 else [run[j:j + 2] for j in range(len(run) - 1)])
+            elif run not in STOPWORDS and (len(run) > 1 or run in '0123456789'):
+                if len(run) > 4 and run.endswith('s') and not run.endswith('ss'):
+                    run = run[:-1]
+                tokens.append(run)
+    return tokens
+
+
+def fnv1a(text: str) -> int:
+    """32位FNV-1a哈希，词按它分配到分片，浏览器端用同样的算法找到查询词所在的分片"""
+    h = 0x811c9dc5
+    for b in text.encode('utf-8'):
+        h = ((h ^ b) * 0x01000193) & 0xffffffff
+    return h
+
+
+def _dump(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _named(prefix: str, data: bytes) -> str:
+    # 文件名带内容哈希，内容不变的分片在重建后仍可以使用浏览器缓存
+    return f"{prefix}.{hashlib.sha256(data).hexdigest()[:10]}.json"
+
+
+def build_index(rows: Iterable[dict], shard_kb: float = 32, docs_per_chunk: int = 64) -> tuple[dict, dict[str, bytes]]:
+    """由历史记录建立倒排索引，返回(清单, {文件名: 内容})。
+
+    同一篇论文只保留最近的一条记录，按日期排序后的序号就是文档编号，较新的论文编号较大。
+    每个词的倒排表是递增的文档编号，存为差值左移一位再加上标题标记(词出现在标题中为1)，
+    按词的哈希分成2的幂个分片，使每个分片的平均大小不超过shard_kb；文档的显示信息每docs_per_chunk篇一个文件。
+    查询时只需要下载清单、查询词所在的分片和命中的文档所在的文件。
+    """
+    latest = {}
+    for row in rows:
+        if row['id'] not in latest or row['date'] >= latest[row['id']]['date']:
+            latest[row['id']] = row
+    docs = sorted(latest.values(), key=lambda r: (r['date'], r['id']))
+
+    postings: dict[str, list[int]] = {}
+    for doc, row in enumerate(docs):
+        title = set(tokenize(row['title'] or ''))
+        other = set(tokenize(' '.join(filter(None, [row.get('topic'), row.get('tldr')] + list(row.get('affiliations') or [])))))
+        for term in title | other:
+            postings.setdefault(term, []).append(doc << 1 | (term in title))
+
+    estimate = sum(len(term.encode('utf-8')) + 4 + 4 * len(p) for term, p in postings.items())
+    shards = 1
+    while estimate / shards > shard_kb * 1024:
+        shards *= 2
+    buckets: list[dict[str, list[int]]] = [{} for _ in range(shards)]
+    for term in sorted(postings):
+        encoded, previous = [], 0
+        for value in postings[term]:
+            doc = value >> 1
+            encoded.append((doc - previous) << 1 | (value & 1))
+            previous = doc
+        buckets[fnv1a(term) % shards][term] = encoded
+
+    files = {}
+    term_files = []
+    for i, bucket in enumerate(buckets):
+        data = _dump(bucket)
+        term_files.append(_named(f't{i}', data))
+        files[term_files[-1]] = data
+    doc_files = []
+    for start in range(0, len(docs), docs_per_chunk):
+        chunk = [[r['date'].isoformat() if isinstance(r['date'], datetime.date) else str(r['date']), r['id'], r['title'],
+                  r.get('score'), r.get('topic') or '', (r.get('tldr') or '')[:TLDR_CHARS], r.get('code_url') or '']
+                 for r in docs[start:start + docs_per_chunk]]
+        data = _dump(chunk)
+        doc_files.append(_named(f'd{start // docs_per_chunk}', data))
+        files[doc_files[-1]] = data
+    manifest = {
+        'version': 1, 'docs': len(docs), 'terms': len(postings), 'chunk': docs_per_chunk,
+        'first': docs[0]['date'].isoformat() if docs else None, 'last': docs[-1]['date'].isoformat() if docs else None,
+        'term_files': term_files, 'doc_files': doc_files,
+    }
+    return manifest, files
+
+
+SEARCH_STYLE = """
+.search-box {
+  position: relative;
+  max-width: 560px;
+  margin: 0 auto 16px;
+}
+.search-box input {
+  width: 100%;
+  box-sizing: border-box;
+  padding: 10px 14px;
+  border: 1px solid #ddd;
+  border-radius: 6px;
+  font-size: 15px;
+}
+.search-results {
+  text-align: left;
+}
+.search-result {
+  padding: 10px 0;
+  border-bottom: 1px solid #eee;
+}
+.search-result .meta {
+  color: #888;
+  font-size: 13px;
+}
+"""
+
+# 与tokenize和fnv1a保持一致
+SEARCH_SCRIPT = r"""
+(function () {
+  const base = document.currentScript.dataset.index;
+  const STOPWORDS = new Set(%s);
+  const WORD = /[\p{L}\p{N}]+/gu;
+  const CJK = /([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+)/;
+  const LIMIT = 20;
+  const files = new Map();
+  let manifest = null;
+
+  function tokenize(text) {
+    const tokens = [];
+    for (const word of text.toLowerCase().match(WORD) || []) {
+      word.split(CJK).forEach((run, i) => {
+        if (!run) return;
+        if (i %% 2) {
+          if (run.length === 1) tokens.push(run);
+          for (let j = 0; j + 1 < run.length; j++) tokens.push(run.slice(j, j + 2));
+        } else if (!STOPWORDS.has(run) && (run.length > 1 || /^\d$/.test(run))) {
+          if (run.length > 4 && run.endsWith('s') && !run.endsWith('ss')) run = run.slice(0, -1);
+          tokens.push(run);
+        }
+      });
+    }
+    return tokens;
+  }
+
+  function fnv1a(text) {
+    let h = 0x811c9dc5;
+    for (const b of new TextEncoder().encode(text)) h = Math.imul(h ^ b, 0x01000193) >>> 0;
+    return h;
+  }
+
+  function load(name, options) {
+    if (!files.has(name)) files.set(name, fetch(base + name, options).then(r => r.ok ? r.json() : Promise.reject(r.status)));
+    return files.get(name);
+  }
+
+  async function search(query) {
+    // 清单每次重建都会变化，不使用缓存；分片和文档文件名带哈希，可以长期缓存
+    manifest = manifest || await load('manifest.json', {cache: 'no-cache'});
+    const terms = [...new Set(tokenize(query))];
+    if (!terms.length || !manifest.docs) return [];
+    const shards = await Promise.all(terms.map(t => load(manifest.term_files[fnv1a(t) %% manifest.term_files.length])));
+    let scores = null;
+    terms.forEach((term, i) => {
+      const hits = new Map();
+      let doc = 0;
+      for (const value of shards[i][term] || []) {
+        doc += value >> 1;
+        hits.set(doc, value & 1 ? 2 : 1);
+      }
+      if (scores === null) {
+        scores = hits;
+      } else {
+        for (const [d, s] of scores) hits.has(d) ? scores.set(d, s + hits.get(d)) : scores.delete(d);
+      }
+    });
+    // 标题中命中的排在前面，其次是较新的论文
+    const ranked = [...scores].sort((a, b) => b[1] - a[1] || b[0] - a[0]).slice(0, LIMIT);
+    const chunks = await Promise.all(ranked.map(([d]) => load(manifest.doc_files[Math.floor(d / manifest.chunk)])));
+    return ranked.map(([d], i) => chunks[i][d %% manifest.chunk]);
+  }
+
+  function element(tag, className, text) {
+    const el = document.createElement(tag);
+    if (className) el.className = className;
+    if (text) el.textContent = text;
+    return el;
+  }
+
+  function show(container, query, docs) {
+    container.replaceChildren();
+    if (!query.trim()) return;
+    container.append(element('p', 'meta', docs.length ? `${docs.length}${docs.length === LIMIT ? '+' : ''} papers` : 'No papers found.'));
+    for (const [date, id, title, score, topic, tldr, code] of docs) {
+      const item = element('div', 'search-result');
+      const link = element('a', 'paper-title', title);
+      link.href = `https://arxiv.org/abs/${id}`;
+      link.target = '_blank';
+      item.append(link, element('div', 'meta', [date, topic, score === null ? '' : `Score ${score}`].filter(Boolean).join(' · ')));
+      if (tldr) item.append(element('div', '', tldr));
+      if (code) {
+        const repo = element('a', '', 'Code');
+        repo.href = code;
+        repo.target = '_blank';
+        item.append(repo);
+      }
+      container.append(item);
+    }
+  }
+
+  const input = document.getElementById('search-input');
+  const container = document.getElementById('search-results');
+  let timer = null;
+  input.addEventListener('input', () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => {
+      const query = input.value;
+      search(query).then(docs => {
+        if (input.value === query) show(container, query, docs);
+      }).catch(() => {
+        container.replaceChildren(element('p', 'meta', 'The search index is not available.'));
+      });
+    }, 200);
+  });
+})();
+""" % json.dumps(sorted(STOPWORDS))
+
+SEARCH_BOX = """<div class="search-box">
+      <input type="search" id="search-input" placeholder="Search past digests: title, topic, TLDR, affiliation" autocomplete="off">
+      <div class="search-results" id="search-results"></div>
+    </div>
+    """
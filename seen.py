@@ -0,0 +1,116 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from loguru import logger
+from feed import entry_id, entry_versioned_id, entry_abstract
+
+# 一次查询中id的个数，低于旧版SQLite对参数个数的限制(999)
+LOOKUP_CHUNK = 500
+
+
+def content_hash(title: str, abstract: str) -> int:
+    """标题和摘要的64位哈希，忽略空白和大小写的差异，RSS和API返回的同一篇论文哈希相同"""
+    text = ' '.join(f"{title}\n{abstract}".split()).lower()
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def today() -> int:
+    """按UTC计算的天数，与commit中记录的日期一致"""
+    return int(time.time() // 86400)
+
+
+def parse_version(short_id: Optional[str]) -> int:
+    m = re.search(r'v(\d+)$', short_id or '')
+    return int(m.group(1)) if m else 0
+
+
+class SeenIndex:
+    """跨天记录已处理论文的索引，保存在SQLite中。
+
+    每篇论文一行: 不带版本号的arXiv id(主键，WITHOUT ROWID表)、版本号、标题和摘要的64位哈希、最近处理的日期，
+    每行约40字节，保存数年的记录也只有几十MB。RSS中的论文按id批量查询，已处理过且内容未变的论文直接跳过，
+    无论它以new、cross还是replace的身份出现、出现在哪个分类的查询中。
+    当天处理过的论文不算已处理：同一天再次运行(手动触发或重新运行任务)时重新得到当天的完整结果，而不是空的推荐。
+    """
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS seen ('
+            'id TEXT PRIMARY KEY, version INTEGER NOT NULL, hash INTEGER NOT NULL, day INTEGER NOT NULL'
+            ') WITHOUT ROWID'
+        )
+        self._conn.commit()
+        self._pending: dict[str, tuple[int, int]] = {}
+        self.stats = {'duplicates': 0, 'skipped': 0, 'updated': 0, 'new': 0, 'rerun': 0}
+
+    def lookup(self, ids: list[str]) -> dict[str, tuple[int, int, int]]:
+        """返回已处理过的id到(版本号, 哈希, 处理的日期)的映射"""
+        found = {}
+        with self._lock:
+            for i in range(0, len(ids), LOOKUP_CHUNK):
+                chunk = ids[i:i + LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT id, version, hash, day FROM seen WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+                found.update((row[0], tuple(row[1:])) for row in rows)
+        return found
+
+    def select(self, entries: list) -> list:
+        """去掉RSS中重复的条目和已处理过的论文，只保留未处理过的论文和内容有更新的新版本"""
+        unique = {}
+        for entry in entries:
+            unique.setdefault(entry_id(entry), entry)
+        self.stats['duplicates'] += len(entries) - len(unique)
+        seen = self.lookup(list(unique))
+        day = today()
+        selected = []
+        for arxiv_id, entry in unique.items():
+            if arxiv_id not in seen:
+                self.stats['new'] += 1
+                selected.append(entry)
+                continue
+            version, digest, processed = seen[arxiv_id]
+            if processed >= day:
+                self.stats['rerun'] += 1
+                selected.append(entry)
+                continue
+            if parse_version(entry_versioned_id(entry)) > version and content_hash(entry.get('title', ''), entry_abstract(entry)) != digest:
+                self.stats['updated'] += 1
+                selected.append(entry)
+            else:
+                self.stats['skipped'] += 1
+        return selected
+
+    def add(self, paper):
+        """记录一篇进入流水线的论文，commit后才写入索引"""
+        with self._lock:
+            self._pending[paper.arxiv_id] = (parse_version(paper.cache_key), content_hash(paper.title, paper.summary))
+
+    def commit(self):
+        """本次运行成功结束后调用，中途失败时不会把未处理完的论文记为已处理"""
+        day = today()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO seen (id, version, hash, day) VALUES (?, ?, ?, ?)',
+                [(k, v, h, day) for k, (v, h) in self._pending.items()],
+            )
+            self._conn.commit()
+            logger.debug(f"Marked {len(self._pending)} papers as processed.")
+            self._pending.clear()
+
+    def summary(self) -> str:
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+        s = self.stats
+        return (f"Seen index: {s['new']} new, {s['updated']} updated, {s['rerun']} processed earlier today, {s['skipped']} already processed, "
+                f"{s['duplicates']} duplicated feed entries; {size} papers indexed.")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
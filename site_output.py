@@ -0,0 +1,141 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import datetime
+from textwrap import dedent
+from typing import Optional
+from loguru import logger
+from paper import ArxivPaper
+from construct_email import framework, Template, write_page, process_paper, KIMI_PROMPT, KIMI_SYSTEM_PROMPT
+from search_index import SEARCH_DIR, SEARCH_BOX, SEARCH_SCRIPT, SEARCH_STYLE, build_index
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = 'static'
+ARCHIVE_DIR = 'archive'
+
+_STYLE = re.compile(r'<style>(.*?)</style>', re.DOTALL)
+_SCRIPT = re.compile(r'<script>(.*?)</script>', re.DOTALL)
+_NAVIGATION = re.compile(r'(<div class="date-navigation">.*?</div>)', re.DOTALL)
+# 提前与字体和图标的CDN建立连接
+_PRECONNECT = ('<link rel="preconnect" href="https://fonts.googleapis.com">\n'
+               '  <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>\n'
+               '  <link rel="preconnect" href="https://cdnjs.cloudflare.com" crossorigin>\n  ')
+# 网页版的论文块不内联Kimi链接，点击时由这里根据标题和PDF链接生成
+_KIMI_SCRIPT = """
+const KIMI_PROMPT = %s;
+const KIMI_SYSTEM_PROMPT = %s;
+
+function openKimi(link) {
+  const title = link.closest('.paper-block').querySelector('.paper-title').textContent;
+  const prompt = KIMI_PROMPT.replace('{title}', () => title).replace('{pdf_url}', () => link.dataset.pdf);
+  const params = new URLSearchParams({
+    prefill_prompt: prompt, system_prompt: KIMI_SYSTEM_PROMPT, send_immediately: 'true', force_search: 'false'
+  });
+  openModal('https://kimi.moonshot.cn/_prefill_chat?' + params.toString());
+}
+""" % (json.dumps(KIMI_PROMPT, ensure_ascii=False), json.dumps(KIMI_SYSTEM_PROMPT, ensure_ascii=False))
+
+
+def split_framework(html: str) -> tuple[str, str, str]:
+    """把邮件模板中内联的CSS和JS换成对外部文件的引用，并在日期导航下留出搜索框的位置，返回(页面模板, CSS, JS)"""
+    css = dedent(_STYLE.search(html).group(1)).strip() + '\n'
+    js = dedent(_SCRIPT.search(html).group(1)).strip() + '\n'
+    page = _STYLE.sub(lambda m: '<link rel="stylesheet" href="__ASSET_CSS__">', html, count=1)
+    page = _SCRIPT.sub(lambda m: '<script src="__ASSET_JS__"></script>\n__SEARCH_SCRIPT__', page, count=1)
+    page = _NAVIGATION.sub(lambda m: m.group(1) + '\n    __SEARCH__', page, count=1)
+    page = page.replace('<link ', _PRECONNECT + '<link ', 1)
+    return page, css, js
+
+
+class SiteWriter:
+    """网页版的输出。与邮件不同，CSS和JS只在static目录下写一次，文件名带内容哈希，可以被浏览器长期缓存；
+    每天的页面只包含论文内容，同时写出预压缩的.gz和.br文件(需要安装brotli)，供支持预压缩文件的静态服务器直接使用。
+    search为True时页面带有搜索框，由write_search_index写出的分片索引在浏览器中搜索历史论文。
+    """
+    def __init__(self, site_dir: str, compress: bool = True, search: bool = False):
+        self.site_dir = site_dir
+        self.compress = compress
+        self.search = search
+        self.sizes: dict[str, dict[str, int]] = {}
+        page, css, js = split_framework(framework)
+        self.page = Template(page)
+        self.css = self._write_asset('digest', 'css', css + (SEARCH_STYLE.lstrip() if search else ''))
+        self.js = self._write_asset('digest', 'js', js + _KIMI_SCRIPT)
+        self.search_js = self._write_asset('search', 'js', SEARCH_SCRIPT.lstrip()) if search else None
+        if compress and brotli is None:
+            logger.debug("brotli is not installed, skipping .br files.")
+
+    def _write(self, path: str, data: bytes, record: bool = True):
+        full = os.path.join(self.site_dir, path)
+        os.makedirs(os.path.dirname(full) or '.', exist_ok=True)
+        variants = {'': data}
+        if self.compress:
+            # mtime固定为0，内容不变时压缩结果也不变
+            variants['.gz'] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, content in variants.items():
+            tmp = f"{full}{suffix}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, full + suffix)
+        if record:
+            self.sizes[path] = {suffix or 'raw': len(content) for suffix, content in variants.items()}
+
+    def _write_asset(self, name: str, ext: str, text: str) -> str:
+        data = text.encode('utf-8')
+        path = f"{STATIC_DIR}/{name}.{hashlib.sha256(data).hexdigest()[:10]}.{ext}"
+        # 带哈希的文件内容不会变化，已存在时不必重写，旧页面引用的旧版本也保留
+        if not os.path.exists(os.path.join(self.site_dir, path)):
+            self._write(path, data)
+        return path
+
+    def render_page(self, papers: list[ArxivPaper], blocks: dict[str, str], depth: int) -> str:
+        prefix = '../' * depth
+        parts = []
+        search, script = '', ''
+        if self.search:
+            search = SEARCH_BOX
+            script = f'<script src="{prefix}{self.search_js}" data-index="{prefix}{SEARCH_DIR}/" defer></script>\n'
+        write_page(parts.append, self.page, papers, blocks, ASSET_CSS=prefix + self.css, ASSET_JS=prefix + self.js,
+                   SEARCH=search, SEARCH_SCRIPT=script)
+        return ''.join(parts)
+
+    def write_day(self, papers: list[ArxivPaper], day: Optional[datetime.date] = None, scores: Optional[dict[str, float]] = None) -> list[str]:
+        """写出index.html和archive/<日期>.html，返回写出的页面路径。论文块与邮件中的不同，在这里渲染一次，两个页面共用。
+        scores按arxiv_id给出各论文显示的分数，默认使用paper.score
+        """
+        day = day or datetime.date.today()
+        scores = scores or {}
+        blocks = {paper.arxiv_id: process_paper(paper, site=True, score=scores.get(paper.arxiv_id)) for paper in papers}
+        paths = ['index.html', f"{ARCHIVE_DIR}/{day.isoformat()}.html"]
+        for path in paths:
+            self._write(path, self.render_page(papers, blocks, depth=path.count('/')).encode('utf-8'))
+        return paths
+
+    def write_search_index(self, rows: list[dict], shard_kb: float = 32, docs_per_chunk: int = 64) -> dict:
+        """由历史记录重建search目录下的索引，返回清单。
+        分片和文档文件名带内容哈希，已存在的不重写；清单最后写出，之后删除清单不再引用的旧文件
+        """
+        manifest, files = build_index(rows, shard_kb=shard_kb, docs_per_chunk=docs_per_chunk)
+        directory = os.path.join(self.site_dir, SEARCH_DIR)
+        for name, data in files.items():
+            if not os.path.exists(os.path.join(directory, name)):
+                self._write(f"{SEARCH_DIR}/{name}", data, record=False)
+        self._write(f"{SEARCH_DIR}/manifest.json", json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+        keep = set(files) | {'manifest.json'}
+        for name in os.listdir(directory):
+            if name.removesuffix('.gz').removesuffix('.br') not in keep:
+                os.remove(os.path.join(directory, name))
+        manifest['bytes'] = sum(len(data) for data in files.values())
+        return manifest
+
+    def summary(self) -> str:
+        parts = [f"{path} " + '/'.join(f"{k} {v / 1024:.1f}KB" for k, v in sizes.items()) for path, sizes in self.sizes.items()]
+        return 'Site output: ' + ('; '.join(parts) if parts else 'nothing written') + '.'
@@ -0,0 +1,96 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlparse, urlunparse
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import requests
+from requests.adapters import HTTPAdapter, Retry
+from tqdm import tqdm
+from loguru import logger
+from paper import ArxivPaper
+from source_reader import read_source, SourceBudget, BudgetExceeded
+
+
+class HostLimiter:
+    """限制对同一主机的并发连接数，并保证相邻两次请求之间的最小间隔"""
+    def __init__(self, max_per_host: int, min_interval: float = 0.0):
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._next_start: dict[str, float] = {}
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    @contextmanager
+    def acquire(self, host: str):
+        semaphore = self._semaphore(host)
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                self._next_start[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+class SourceFetcher:
+    def __init__(self, max_workers: int = 8, max_per_host: int = 4, timeout: float = 60.0, min_interval: float = 0.0,
+                 max_download_mb: Optional[float] = None, max_unpacked_mb: Optional[float] = None, download_domain: Optional[str] = 'export.arxiv.org'):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_download_bytes = None if max_download_mb is None else int(max_download_mb * 1024 * 1024)
+        self.max_unpacked_bytes = None if max_unpacked_mb is None else int(max_unpacked_mb * 1024 * 1024)
+        self.download_domain = download_domain
+        self.limiter = HostLimiter(max_per_host, min_interval)
+        self._session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(max_retries=retries, pool_connections=4, pool_maxsize=max(max_workers, max_per_host))
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def source_url(self, paper: ArxivPaper) -> str:
+        url = urlparse(paper.source_url)
+        if self.download_domain is not None:
+            url = url._replace(netloc=self.download_domain)
+        return urlunparse(url)
+
+    def download(self, paper: ArxivPaper) -> Optional[dict[str, bytes]]:
+        """流式下载并解包单篇论文的源码，超出字节或时间预算时抛出BudgetExceeded"""
+        url = self.source_url(paper)
+        budget = SourceBudget(self.max_download_bytes, self.max_unpacked_bytes, self.timeout)
+        with self.limiter.acquire(urlparse(url).netloc):
+            with self._session.get(url, stream=True, timeout=min(self.timeout, 30)) as response:
+                response.raise_for_status()
+                return read_source(response.iter_content(chunk_size=1 << 16), budget)
+
+    def fetch_members(self, paper: ArxivPaper) -> Optional[dict[str, bytes]]:
+        """只下载和解包，不解析。超出预算或下载失败时返回None"""
+        try:
+            return self.download(paper)
+        except BudgetExceeded as e:
+            logger.debug(f"Skip source of {paper.arxiv_id}: {e}")
+        except Exception as e:
+            logger.debug(f"Failed to fetch source of {paper.arxiv_id}: {e}")
+        return None
+
+    def fetch(self, paper: ArxivPaper):
+        if paper.load_cached_source():
+            return
+        paper.load_source(self.fetch_members(paper))
+
+    def fetch_all(self, papers: list[ArxivPaper]):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch, paper): paper for paper in papers}
+            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Downloading paper sources"):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.debug(f"Failed to fetch source of {futures[future].arxiv_id}: {e}")
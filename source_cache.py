@@ -0,0 +1,207 @@
+import os
+import json
+import atexit
+import time
+import hashlib
+import threading
+from typing import Optional
+from loguru import logger
+
+GLOBAL_SOURCE_CACHE = None
+
+
+class SourceCache:
+    """以内容哈希寻址的源码缓存。
+
+    索引以arXiv id+版本号为键，指向objects目录下以sha256命名的原始压缩包和解析后的tex字典。
+    读取时重新校验sha256，总大小超过max_bytes时按最近访问时间(LRU)淘汰。
+    索引按访问顺序排列，内存中维护对象的引用计数和总大小，写入时只淘汰最久未访问的条目；
+    索引每隔save_interval秒和flush时才写回磁盘，进程退出时也会写回；被强制结束时最近写入的对象不在索引中，
+    启动时删除索引中没有的对象文件，缓存不会超出大小限制。
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30, save_interval: float = 60.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.save_interval = save_interval
+        self._objects = os.path.join(cache_dir, 'objects')
+        self._index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = threading.Lock()
+        os.makedirs(self._objects, exist_ok=True)
+        self._index: dict[str, dict] = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Source cache index is broken, starting from an empty cache: {e}")
+        # dict保持插入顺序，最久未访问的条目在最前面
+        self._index = dict(sorted(self._index.items(), key=lambda kv: kv[1]['atime']))
+        # 同一对象可能被多个键引用，按去重后的对象统计大小，引用计数归零时才删除文件
+        self._sizes: dict[str, int] = {}
+        self._refs: dict[str, int] = {}
+        self._total = 0
+        for entry in self._index.values():
+            for field in ('archive', 'tex'):
+                if field in entry:
+                    self._ref(entry[field], entry[f"{field}_size"])
+        self._dirty = False
+        self._saved = time.monotonic()
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        removed = 0
+        for directory in os.scandir(self._objects):
+            if not directory.is_dir():
+                continue
+            for f in os.scandir(directory.path):
+                if f.name not in self._refs:
+                    try:
+                        os.remove(f.path)
+                        removed += 1
+                    except OSError:
+                        pass
+        if removed:
+            logger.info(f"Removed {removed} source cache objects missing from the index.")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], digest)
+
+    def _read_object(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._object_path(digest), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            logger.warning(f"Source cache object {digest} is corrupted, dropping it.")
+            os.remove(self._object_path(digest))
+            return None
+        return data
+
+    def _write_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def _save_index(self):
+        tmp = f"{self._index_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path)
+        self._dirty = False
+        self._saved = time.monotonic()
+
+    def _ref(self, digest: str, size: int):
+        if digest not in self._refs:
+            self._refs[digest] = 0
+            self._sizes[digest] = size
+            self._total += size
+        self._refs[digest] += 1
+
+    def _unref(self, digest: str, remove: bool = True):
+        self._refs[digest] -= 1
+        if self._refs[digest] == 0:
+            del self._refs[digest]
+            self._total -= self._sizes.pop(digest)
+            if remove:
+                try:
+                    os.remove(self._object_path(digest))
+                except OSError:
+                    pass
+
+    def _touch(self, key: str, entry: dict):
+        entry['atime'] = time.time()
+        # 移到末尾，保持索引按访问顺序排列
+        self._index[key] = self._index.pop(key)
+
+    def _drop(self, key: str, field: str):
+        entry = self._index.get(key)
+        if entry is not None and field in entry:
+            # 对象文件已损坏或丢失，已被删除
+            self._unref(entry.pop(field), remove=False)
+            entry.pop(f"{field}_size", None)
+            if 'archive' not in entry and 'tex' not in entry:
+                del self._index[key]
+            self._dirty = True
+
+    def _get(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or field not in entry:
+                return None
+            data = self._read_object(entry[field])
+            if data is None:
+                self._drop(key, field)
+                return None
+            self._touch(key, entry)
+            self._dirty = True
+            return data
+
+    def _put(self, key: str, field: str, data: bytes, **extra):
+        with self._lock:
+            digest = self._write_object(data)
+            entry = self._index.setdefault(key, {})
+            # 先增加新对象的引用，内容不变时旧对象不会被删除
+            self._ref(digest, len(data))
+            if field in entry:
+                self._unref(entry[field])
+            entry[field] = digest
+            entry[f"{field}_size"] = len(data)
+            entry.update(extra)
+            self._touch(key, entry)
+            self._evict(keep=key)
+            self._dirty = True
+            if time.monotonic() - self._saved >= self.save_interval:
+                self._save_index()
+
+    def _evict(self, keep: str):
+        while self._total > self.max_bytes:
+            key = next(iter(self._index))
+            if key == keep:
+                break
+            entry = self._index.pop(key)
+            for field in ('archive', 'tex'):
+                if field in entry:
+                    self._unref(entry[field])
+            logger.debug(f"Evicted {key} from source cache.")
+
+    def get_archive(self, key: str) -> Optional[bytes]:
+        return self._get(key, 'archive')
+
+    def put_archive(self, key: str, data: bytes):
+        self._put(key, 'archive', data)
+
+    def get_tex(self, key: str, version: int) -> Optional[dict[str, str]]:
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or entry.get('tex_version') != version:
+                return None
+        data = self._get(key, 'tex')
+        if data is None:
+            return None
+        return json.loads(data)
+
+    def put_tex(self, key: str, tex: dict[str, str], version: int):
+        self._put(key, 'tex', json.dumps(tex, sort_keys=True).encode('utf-8'), tex_version=version)
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+
+def set_global_source_cache(cache_dir: str, max_mb: int):
+    global GLOBAL_SOURCE_CACHE
+    GLOBAL_SOURCE_CACHE = SourceCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+    # 出错退出或被中断时也写回索引，已下载的源码在重新运行时可以复用
+    atexit.register(GLOBAL_SOURCE_CACHE.flush)
+
+
+def get_source_cache() -> Optional[SourceCache]:
+    return GLOBAL_SOURCE_CACHE
@@ -0,0 +1,129 @@
+import io
+import gzip
+import time
+import tarfile
+from typing import Iterable, Iterator, Optional, Callable
+
+GZIP_MAGIC = b'\x1f\x8b'
+KEEP_SUFFIXES = ('.tex', '.bbl')
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class SourceBudget:
+    """单篇论文源码的读取预算：下载字节数、解压后字节数和总耗时，None表示不限制"""
+    def __init__(self, max_download_bytes: Optional[int] = None, max_unpacked_bytes: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_download_bytes = max_download_bytes
+        self.max_unpacked_bytes = max_unpacked_bytes
+        self.deadline = None if max_seconds is None else time.monotonic() + max_seconds
+        self.download_bytes = 0
+        self.unpacked_bytes = 0
+
+    def _check_time(self):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded("time budget exceeded")
+
+    def charge_download(self, n: int):
+        self.download_bytes += n
+        if self.max_download_bytes is not None and self.download_bytes > self.max_download_bytes:
+            raise BudgetExceeded(f"download exceeds {self.max_download_bytes} bytes")
+        self._check_time()
+
+    def charge_unpacked(self, n: int):
+        self.unpacked_bytes += n
+        if self.max_unpacked_bytes is not None and self.unpacked_bytes > self.max_unpacked_bytes:
+            raise BudgetExceeded(f"unpacked source exceeds {self.max_unpacked_bytes} bytes")
+        self._check_time()
+
+
+class _ChunkReader(io.RawIOBase):
+    """把bytes迭代器(如requests的iter_content)包装成只读流"""
+    def __init__(self, chunks: Iterator[bytes], charge: Callable[[int], None]):
+        self._chunks = chunks
+        self._charge = charge
+        self._pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._charge(len(chunk))
+            self._pending = chunk
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+class _CountingReader(io.RawIOBase):
+    def __init__(self, head: bytes, stream, charge: Callable[[int], None]):
+        self._head = head
+        self._stream = stream
+        self._charge = charge
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._stream.read(len(b))
+        self._charge(len(data))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _is_tar_header(block: bytes) -> bool:
+    if len(block) < tarfile.BLOCKSIZE:
+        return False
+    try:
+        tarfile.TarInfo.frombuf(block[:tarfile.BLOCKSIZE], tarfile.ENCODING, 'surrogateescape')
+    except tarfile.HeaderError:
+        return False
+    return True
+
+
+def read_source(chunks: Iterable[bytes], budget: Optional[SourceBudget] = None) -> Optional[dict[str, bytes]]:
+    """单遍流式读取arXiv源码，只在内存中保留.tex和.bbl文件。
+
+    支持tar、tar.gz以及单个(gzip压缩的)tex文件，其余成员直接跳过而不缓存。
+    源码不是LaTeX(如只提交了PDF)时返回None，超出预算时抛出BudgetExceeded。
+    """
+    budget = budget or SourceBudget()
+    raw = io.BufferedReader(_ChunkReader(iter(chunks), budget.charge_download), 1 << 16)
+    stream = gzip.GzipFile(fileobj=raw) if raw.peek(2)[:2] == GZIP_MAGIC else raw
+    head = stream.read(tarfile.BLOCKSIZE)
+    if not head:
+        return None
+    budget.charge_unpacked(len(head))
+    unpacked = io.BufferedReader(_CountingReader(head, stream, budget.charge_unpacked), 1 << 16)
+    if _is_tar_header(head):
+        members = {}
+        with tarfile.open(fileobj=unpacked, mode='r|') as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(KEEP_SUFFIXES):
+                    members[member.name] = tar.extractfile(member).read()
+        return members
+    if head.startswith(b'%PDF'):
+        return None
+    return {'main.tex': unpacked.read()}
+
+
+def pack_members(members: dict[str, bytes]) -> bytes:
+    """把保留的成员重新打包成精简的tar.gz，供源码缓存存储"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
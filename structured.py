@@ -0,0 +1,172 @@
+import re
+import json
+import threading
+from ast import literal_eval
+from typing import Any, Callable, Optional
+from loguru import logger
+from llm import get_llm
+
+_FENCE = re.compile(r'```(?:json|python)?\s*(.*?)```', re.DOTALL)
+_TRAILING_COMMA = re.compile(r',\s*([\]}])')
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+_JSON_LITERALS = re.compile(r'\b(?:true|false|null)\b')
+_PYTHON_LITERALS = {'true': 'True', 'false': 'False', 'null': 'None'}
+
+_lock = threading.Lock()
+STATS = {'parsed': 0, 'llm_repaired': 0, 'failed': 0}
+
+
+def _record(key: str):
+    with _lock:
+        STATS[key] += 1
+
+
+def _balanced_span(text: str, open_char: str, close_char: str) -> Optional[str]:
+    """返回第一个括号配对完整的片段，忽略字符串内的括号"""
+    start = text.find(open_char)
+    while start != -1:
+        depth = 0
+        quote = None
+        escaped = False
+        for i in range(start, len(text)):
+            c = text[i]
+            if quote is not None:
+                if escaped:
+                    escaped = False
+                elif c == '\\':
+                    escaped = True
+                elif c == quote:
+                    quote = None
+            elif c in '"\'':
+                quote = c
+            elif c == open_char:
+                depth += 1
+            elif c == close_char:
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        start = text.find(open_char, start + 1)
+    return None
+
+
+def _outside_strings(text: str, fn: Callable[[str], str]) -> str:
+    """只对字符串字面量以外的部分应用fn，字符串中的内容保持不变"""
+    parts = []
+    start = 0
+    quote = None
+    escaped = False
+    for i, c in enumerate(text):
+        if quote is not None:
+            if escaped:
+                escaped = False
+            elif c == '\\':
+                escaped = True
+            elif c == quote:
+                parts.append(text[start:i + 1])
+                start = i + 1
+                quote = None
+        elif c in '"\'':
+            parts.append(fn(text[start:i]))
+            start = i
+            quote = c
+    parts.append(text[start:] if quote is not None else fn(text[start:]))
+    return ''.join(parts)
+
+
+def _fix_literals(segment: str) -> str:
+    segment = _TRAILING_COMMA.sub(r'\1', segment)
+    return _JSON_LITERALS.sub(lambda m: _PYTHON_LITERALS[m.group()], segment)
+
+
+def _loads(candidate: str) -> Any:
+    for fn in (json.loads, literal_eval):
+        try:
+            return fn(candidate)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            pass
+    # 常见的小错误：结尾多余的逗号、JSON字面量写成Python字面量或相反，只修改字符串以外的部分
+    try:
+        return literal_eval(_outside_strings(candidate, _fix_literals))
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return None
+
+
+def _parse_text(text: str, expected: type, open_char: str, close_char: str) -> Any:
+    candidates = [m.group(1) for m in _FENCE.finditer(text)] + [text]
+    for candidate in candidates:
+        candidate = candidate.strip()
+        value = _loads(candidate)
+        if isinstance(value, expected):
+            return value
+        span = _balanced_span(candidate, open_char, close_char)
+        if span is not None:
+            value = _loads(span)
+            if isinstance(value, expected):
+                return value
+    return None
+
+
+def _parse(text: Optional[str], expected: type, open_char: str, close_char: str) -> Any:
+    if not text:
+        return None
+    value = _parse_text(text, expected, open_char, close_char)
+    if value is None:
+        # 模型有时用中文引号包裹键和值，只替换字符串以外的中文引号，字符串中的引号是内容
+        normalized = _outside_strings(text, lambda segment: segment.translate(_SMART_QUOTES))
+        if normalized != text:
+            value = _parse_text(normalized, expected, open_char, close_char)
+    return value
+
+
+def parse_dict(text: Optional[str]) -> Optional[dict]:
+    """从模型输出中解析出dict，兼容JSON、Python字面量、代码块包裹和前后多余文字"""
+    return _parse(text, dict, '{', '}')
+
+
+def parse_list(text: Optional[str]) -> Optional[list]:
+    """从模型输出中解析出list，兼容JSON、Python字面量、代码块包裹和前后多余文字"""
+    return _parse(text, list, '[', ']')
+
+
+def _repair(text: str, instruction: str) -> Optional[str]:
+    logger.debug(f"Asking the LLM to repair an unparsable output: {text[:100]!r}")
+    llm = get_llm()
+    return llm.generate(
+        messages=[
+            {'role': 'system', 'content': instruction},
+            {'role': 'user', 'content': text},
+        ]
+    )
+
+
+def parse_or_repair_dict(text: Optional[str], keys: list[str]) -> Optional[dict]:
+    """先在本地解析，失败时才请求模型修复格式"""
+    value = parse_dict(text)
+    if value is None and text:
+        keys_desc = ', '.join(f"'{k}'" for k in keys)
+        value = parse_dict(_repair(text, f"You are a JSON assistant. Convert the user's text into a valid JSON object with keys {keys_desc}. Only return the JSON object."))
+        if value is not None:
+            _record('llm_repaired')
+    elif value is not None:
+        _record('parsed')
+    if value is None:
+        _record('failed')
+    return value
+
+
+def parse_or_repair_list(text: Optional[str]) -> Optional[list]:
+    """先在本地解析，失败时才请求模型修复格式"""
+    value = parse_list(text)
+    if value is None and text:
+        value = parse_list(_repair(text, "You are a JSON assistant. Convert the user's text into a valid JSON list. If it is already a valid list, just return it. Only return the JSON list."))
+        if value is not None:
+            _record('llm_repaired')
+    elif value is not None:
+        _record('parsed')
+    if value is None:
+        _record('failed')
+    return value
+
+
+def summary() -> str:
+    return f"Structured output: {STATS['parsed']} parsed locally, {STATS['llm_repaired']} repaired by LLM, {STATS['failed']} failed."
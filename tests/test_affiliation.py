@@ -0,0 +1,64 @@
+import pytest
+from affiliation import AffiliationScorer, DEFAULT_CONFIG, extract_affiliations
+from latex import clean_tex
+
+
+@pytest.fixture(scope='module')
+def scorer():
+    return AffiliationScorer.from_file(DEFAULT_CONFIG)
+
+
+def name(scorer, affiliation):
+    institution = scorer.match(affiliation)
+    return institution.name if institution is not None else None
+
+
+@pytest.mark.parametrize('affiliation', [
+    'Zhejiang University of Technology',
+    'College of Computer Science, Zhejiang University of Technology, Hangzhou',
+    'University of Maryland, Baltimore County',
+    'Apple Daily',
+    'Stanford Health Care',
+])
+def test_distinct_institutions_do_not_match(scorer, affiliation):
+    # 名称相近的其他机构不能得到偏好机构的分数
+    assert name(scorer, affiliation) is None
+    assert scorer.score([affiliation]) == scorer.default_score
+
+
+@pytest.mark.parametrize('affiliation, expected', [
+    ('Department of Computer Science, Stanford University', 'Stanford University'),
+    ('Stanford University School of Medicine', 'Stanford University'),
+    ('College of Computer Science and Technology, Zhejiang University, Hangzhou, China', 'Zhejiang University'),
+    ('University of Maryland, College Park', 'University of Maryland - College Park'),
+    ('Apple Inc.', 'Apple'),
+])
+def test_preferred_institutions_still_match(scorer, affiliation, expected):
+    assert name(scorer, affiliation) == expected
+
+
+def test_qualifier_after_contained_alias():
+    # 没有配置excludes时，别名后紧跟限定词也不算匹配
+    config = {'groups': [{'name': 'Lab', 'max_score': 5.0, 'min_score': 4.0, 'institutions': ['Acme', 'Acme Research']}]}
+    scorer = AffiliationScorer(config)
+    assert name(scorer, 'Acme Health Systems') is None
+    assert name(scorer, 'Acme Institute of Technology') is None
+    assert name(scorer, 'Acme Research Europe') == 'Acme Research'
+
+
+@pytest.mark.parametrize('front_matter', [
+    r'\address{Beijing 100084, China}',
+    clean_tex(r'\IEEEauthorblockA{\textit{Dept. of EE} \\ \textit{Zhejiang University}\\ Hangzhou, China}'),
+])
+def test_location_only_units_fall_back_to_llm(front_matter):
+    # 只有城市和国家时返回None，由LLM提取，而不是把国家当作机构
+    assert extract_affiliations(front_matter) is None
+
+
+@pytest.mark.parametrize('front_matter, expected', [
+    (r'\affiliation{OpenAI}', ['OpenAI']),
+    (r'\affiliation{Google DeepMind, London, UK}', ['Google DeepMind']),
+    (r'\address{Beijing 100084, China} \affiliation{Department of CS, Tsinghua University, Beijing, China}', ['Tsinghua University']),
+])
+def test_macro_affiliations(front_matter, expected):
+    assert extract_affiliations(front_matter) == expected
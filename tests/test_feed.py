@@ -0,0 +1,21 @@
+from feed import entry_authors
+
+
+def entry(creator):
+    return {'authors': [{'name': creator}]}
+
+
+def test_comma_separated_creator():
+    assert entry_authors(entry('Alice Smith, Bob Jones,  Carol Li')) == ['Alice Smith', 'Bob Jones', 'Carol Li']
+
+
+def test_name_suffixes_stay_with_their_author():
+    assert entry_authors(entry('John Smith, Jr., Jane Doe')) == ['John Smith, Jr.', 'Jane Doe']
+    assert entry_authors(entry('Alice Smith, Robert Brown, III, Carol Li, Sr')) == ['Alice Smith', 'Robert Brown, III', 'Carol Li, Sr']
+    # 名字本身不会被当作后缀
+    assert entry_authors(entry('Ivan Petrov, Xi Chen, Vi Tran')) == ['Ivan Petrov', 'Xi Chen', 'Vi Tran']
+
+
+def test_separate_author_elements():
+    assert entry_authors({'authors': [{'name': 'Alice Smith'}, {'name': 'Bob Jones'}]}) == ['Alice Smith', 'Bob Jones']
+    assert entry_authors({}) == []
@@ -0,0 +1,38 @@
+import datetime
+from types import SimpleNamespace
+from history import HistoryStore
+
+DAY = datetime.date(2026, 1, 5)
+
+
+def make_paper(i, score=4.0):
+    return SimpleNamespace(arxiv_id=f'2601.{i:05d}', title=f'Paper {i}', authors=[SimpleNamespace(name='Alice Smith')],
+                           affiliations=['Tsinghua University'], score=score, topic='LLM', tldr=f'TLDR {i}.',
+                           pdf_url=f'https://arxiv.org/pdf/2601.{i:05d}', code_url=None)
+
+
+def ids(store, **kwargs):
+    return sorted(store.scan(columns=['id'], **kwargs).column('id').to_pylist())
+
+
+def test_empty_rerun_keeps_the_day(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.lance'))
+    assert store.append([make_paper(1), make_paper(2)], day=DAY) == 2
+    # 同一天再次运行没有得到论文时，当天已记录的推荐不能被删除
+    assert store.append([], day=DAY) == 0
+    assert ids(store, start=DAY, end=DAY) == ['2601.00001', '2601.00002']
+
+
+def test_rerun_replaces_the_day_of_the_same_profile(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.lance'))
+    store.append([make_paper(1), make_paper(2)], day=DAY)
+    store.append([make_paper(9)], day=DAY, profile='other')
+    store.append([make_paper(2), make_paper(3)], day=DAY)
+    assert ids(store, profile='') == ['2601.00002', '2601.00003']
+    assert ids(store, profile='other') == ['2601.00009']
+
+
+def test_empty_store(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history.lance'))
+    assert store.append([], day=DAY) == 0
+    assert store.scan().num_rows == 0
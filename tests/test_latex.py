@@ -0,0 +1,48 @@
+import random
+import pytest
+from benchmarks.latex_clean import legacy_clean
+from latex import clean_tex
+
+# 旧实现先删除注释再删除环境；转义的\%和被删除环境留下的空行两者处理不同，比较时忽略空白
+FRAGMENTS = [
+    'Plain text with words.\n',
+    'We follow prior work~\\cite{smith2020} and \\citep{doe21}.\n',
+    '% a full-line comment\n',
+    'Inline text % trailing comment\n',
+    '\\begin{figure}\n\\includegraphics{a.png}\n% \\end{figure}\n\\caption{Leaked caption}\n\\end{figure}\n',
+    '\\begin{table}[t]\n% \\end{table} commented out\ncell & cell \\\\\n\\end{table}\n',
+    '\\begin{comment}\nhidden % \\end{comment}\nstill hidden\n\\end{comment}\n',
+    '\\iffalse\ndisabled % \\fi\nstill disabled\n\\fi\n',
+    '\\iffalse draft text \\fi\n',
+    'Line break here \\\\\nnext line\n',
+    '\n\n\n',
+    '   spaced     out\t\t\ttext\n',
+    '\\section{Method}\n',
+]
+
+
+def normalized(text: str) -> list[str]:
+    return text.split()
+
+
+@pytest.mark.parametrize('fragment', FRAGMENTS)
+def test_fragment_matches_legacy(fragment):
+    assert normalized(clean_tex(fragment)) == normalized(legacy_clean(fragment))
+
+
+def test_commented_terminators_do_not_end_blocks():
+    cleaned = clean_tex(FRAGMENTS[4] + FRAGMENTS[7] + 'After.\n')
+    assert 'Leaked caption' not in cleaned
+    assert 'still disabled' not in cleaned
+    assert cleaned.split() == ['After.']
+
+
+def test_random_documents_match_legacy():
+    rng = random.Random(0)
+    for _ in range(300):
+        document = ''.join(rng.choices(FRAGMENTS, k=rng.randint(1, 12)))
+        assert normalized(clean_tex(document)) == normalized(legacy_clean(document)), document
+
+
+def test_escaped_percent_is_kept():
+    assert clean_tex('Accuracy of 95\\% % comment\n') == 'Accuracy of 95\\% \n'
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+import seen as seen_module
+from seen import SeenIndex
+
+
+def make_entry(i, version=1):
+    return {'id': f'oai:arXiv.org:2501.{i:05d}v{version}', 'title': f'Paper {i}',
+            'summary': f'arXiv:2501.{i:05d}v{version} Announce Type: new Abstract: Abstract {i}.'}
+
+
+def run(index, entries):
+    """模拟一次运行：选出论文，全部进入流水线，发送成功后commit"""
+    selected = index.select(entries)
+    for e in selected:
+        short_id = e['id'].removeprefix('oai:arXiv.org:')
+        index.add(SimpleNamespace(arxiv_id=short_id[:-2], cache_key=short_id, title=e['title'], summary=f'Abstract {short_id[:-2][5:].lstrip("0")}.'))
+    index.commit()
+    return selected
+
+
+def test_same_day_rerun_selects_the_same_papers(tmp_path, monkeypatch):
+    monkeypatch.setattr(seen_module, 'today', lambda: 20000)
+    entries = [make_entry(i) for i in range(1, 6)]
+    index = SeenIndex(str(tmp_path / 'seen.sqlite'))
+    assert run(index, entries) == entries
+    # 同一天再次运行(手动触发或重新运行任务)得到同样的论文，而不是空的推荐
+    assert run(index, entries) == entries
+    assert index.stats['rerun'] == len(entries)
+    index.close()
+
+
+def test_papers_from_earlier_days_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(seen_module, 'today', lambda: 20000)
+    index = SeenIndex(str(tmp_path / 'seen.sqlite'))
+    run(index, [make_entry(i) for i in range(1, 4)])
+    monkeypatch.setattr(seen_module, 'today', lambda: 20001)
+    assert run(index, [make_entry(i) for i in range(1, 6)]) == [make_entry(4), make_entry(5)]
+    assert index.stats['skipped'] == 3
+    index.close()
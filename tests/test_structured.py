@@ -0,0 +1,24 @@
+from structured import parse_dict, parse_list
+
+
+def test_smart_quotes_inside_values():
+    # 中文TLDR中的引号是内容，不能被替换成字符串的分隔符
+    text = '{"tldr": "本文提出“XX”方法，提升了性能。", "topic": "LLM"}'
+    assert parse_dict(text) == {'tldr': '本文提出“XX”方法，提升了性能。', 'topic': 'LLM'}
+    assert parse_dict("{'tldr': 'It’s ‘robust’.'}") == {'tldr': 'It’s ‘robust’.'}
+
+
+def test_smart_quotes_as_delimiters():
+    assert parse_dict('{“tldr”: “简短”, “topic”: “LLM”}') == {'tldr': '简短', 'topic': 'LLM'}
+    assert parse_dict('{"tldr": "本文提出“XX”方法", “topic”: “LLM”}') == {'tldr': '本文提出“XX”方法', 'topic': 'LLM'}
+
+
+def test_literals_outside_strings_only():
+    text = '{"tldr": "The null hypothesis is true, false alarms drop", "code": null, "ok": true,}'
+    assert parse_dict(text) == {'tldr': 'The null hypothesis is true, false alarms drop', 'code': None, 'ok': True}
+
+
+def test_fenced_and_surrounding_text():
+    assert parse_dict('Sure! Here’s the JSON:\n```json\n{"topic": "Vision"}\n```') == {'topic': 'Vision'}
+    assert parse_list("The list is ['MIT', 'Tsinghua University',] as requested.") == ['MIT', 'Tsinghua University']
+    assert parse_dict('not a dict') is None